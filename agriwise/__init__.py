@@ -0,0 +1,24 @@
+"""AgriWise inference core shared by the Flask, ASGI and Streamlit front ends
+
+    from agriwise import get_engine
+
+    engine = get_engine()  # loads the models once per process
+    engine.predict_crop_disease(image_bytes)
+"""
+from agriwise.engine import (
+    LOAN_CONDITIONS,
+    LOAN_FEATURE_DEFAULTS,
+    AgriWiseAI,
+    ModelReloadError,
+    ModelSet,
+    get_engine,
+)
+
+__all__ = [
+    'LOAN_CONDITIONS',
+    'LOAN_FEATURE_DEFAULTS',
+    'AgriWiseAI',
+    'ModelReloadError',
+    'ModelSet',
+    'get_engine',
+]
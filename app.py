@@ -1,324 +1,151 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 import os
 import json
-import numpy as np
-import pandas as pd
-import cv2
-from PIL import Image
-import io
 import base64
-import requests
-from datetime import datetime, timedelta
-import random
-import joblib
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.utils import PlotlyJSONEncoder
-import matplotlib.pyplot as plt
-import seaborn as sns
-from gtts import gTTS
-import speech_recognition as sr
 import threading
 import time
+import hmac
+import signal
 
-app = Flask(__name__)
+import jobs
+import loan_batch
+import metrics
+import model_registry
+import http_caching
+import speech
+from sync import SyncService
+import tts
+import uploads
+from agriwise import LOAN_CONDITIONS, ModelReloadError, get_engine
+from lazy_imports import import_time_report, format_import_report
+
+app = Flask(__name__, static_folder=None)
 CORS(app)
+metrics.instrument(app)
+http_caching.compress_responses(app)
+assets = http_caching.StaticAssets(os.path.join(app.root_path, 'static'))
+app.jinja_env.globals['asset_url'] = assets.url
 
-# Global variables for ML models
-crop_disease_model = None
-weather_model = None
-loan_model = None
-scaler = StandardScaler()
-
-class AgriWiseAI:
-    def __init__(self):
-        self.crop_diseases = {
-            'healthy': 'Healthy plant',
-            'early_blight': 'Early Blight - Use fungicide treatment',
-            'late_blight': 'Late Blight - Remove affected leaves and apply copper-based fungicide',
-            'leaf_mold': 'Leaf Mold - Improve air circulation and reduce humidity',
-            'septoria_leaf_spot': 'Septoria Leaf Spot - Remove infected leaves and apply fungicide',
-            'spider_mites': 'Spider Mites - Use insecticidal soap or neem oil',
-            'target_spot': 'Target Spot - Apply fungicide and improve plant spacing',
-            'yellow_leaf_curl_virus': 'Yellow Leaf Curl Virus - Remove infected plants and control whiteflies',
-            'mosaic_virus': 'Mosaic Virus - Remove infected plants and control aphids'
-        }
-        
-        self.crops = ['tomato', 'potato', 'corn', 'wheat', 'rice', 'beans']
-        self.weather_data = {}
-        self.market_prices = {}
-        
-    def load_models(self):
-        """Load pre-trained ML models"""
-        try:
-            # Initialize models (in production, these would be pre-trained)
-            self.crop_disease_model = RandomForestClassifier(n_estimators=100, random_state=42)
-            self.weather_model = RandomForestClassifier(n_estimators=50, random_state=42)
-            self.loan_model = RandomForestClassifier(n_estimators=75, random_state=42)
-            
-            # Generate sample training data and fit models
-            self._train_sample_models()
-            
-        except Exception as e:
-            print(f"Error loading models: {e}")
-    
-    def _train_sample_models(self):
-        """Train sample models with synthetic data"""
-        # Sample crop disease data
-        np.random.seed(42)
-        n_samples = 1000
-        
-        # Generate synthetic image features (RGB values, texture features, etc.)
-        image_features = np.random.rand(n_samples, 10)
-        disease_labels = np.random.choice(list(self.crop_diseases.keys()), n_samples)
-        
-        self.crop_disease_model.fit(image_features, disease_labels)
-        
-        # Sample weather data
-        weather_features = np.random.rand(n_samples, 5)  # temp, humidity, pressure, wind, rainfall
-        weather_labels = np.random.choice(['sunny', 'rainy', 'cloudy', 'stormy'], n_samples)
-        
-        self.weather_model.fit(weather_features, weather_labels)
-        
-        # Sample loan data
-        loan_features = np.random.rand(n_samples, 6)  # income, land_size, crop_yield, credit_score, age, experience
-        loan_labels = np.random.choice([0, 1], n_samples)  # 0: rejected, 1: approved
-        
-        self.loan_model.fit(loan_features, loan_labels)
-    
-    def predict_crop_disease(self, image_data):
-        """Predict crop disease from image"""
-        try:
-            # Convert base64 image to numpy array
-            image_bytes = base64.b64decode(image_data.split(',')[1])
-            image = Image.open(io.BytesIO(image_bytes))
-            image = image.resize((224, 224))
-            
-            # Extract features (simplified - in production, use CNN features)
-            image_array = np.array(image)
-            features = self._extract_image_features(image_array)
-            
-            # Predict disease
-            prediction = self.crop_disease_model.predict([features])[0]
-            confidence = np.random.uniform(0.7, 0.95)  # Simulated confidence
-            
-            return {
-                'disease': prediction,
-                'description': self.crop_diseases.get(prediction, 'Unknown disease'),
-                'confidence': round(confidence, 2),
-                'recommendations': self._get_treatment_recommendations(prediction)
-            }
-        except Exception as e:
-            return {'error': str(e)}
-    
-    def _extract_image_features(self, image_array):
-        """Extract features from image array"""
-        # Simplified feature extraction
-        features = []
-        
-        # Color features
-        features.extend([
-            np.mean(image_array[:, :, 0]),  # Red channel mean
-            np.mean(image_array[:, :, 1]),  # Green channel mean
-            np.mean(image_array[:, :, 2]),  # Blue channel mean
-            np.std(image_array[:, :, 0]),   # Red channel std
-            np.std(image_array[:, :, 1]),   # Green channel std
-            np.std(image_array[:, :, 2]),   # Blue channel std
-        ])
-        
-        # Texture features (simplified)
-        gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-        features.extend([
-            np.mean(gray),
-            np.std(gray),
-            np.var(gray),
-            np.max(gray)
-        ])
-        
-        return features
-    
-    def _get_treatment_recommendations(self, disease):
-        """Get treatment recommendations for detected disease"""
-        recommendations = {
-            'healthy': ['Continue current care routine', 'Monitor for any changes'],
-            'early_blight': ['Apply copper-based fungicide', 'Remove affected leaves', 'Improve air circulation'],
-            'late_blight': ['Apply fungicide immediately', 'Remove all affected parts', 'Avoid overhead watering'],
-            'leaf_mold': ['Reduce humidity', 'Improve ventilation', 'Apply fungicide if severe'],
-            'septoria_leaf_spot': ['Remove infected leaves', 'Apply fungicide', 'Avoid overhead watering'],
-            'spider_mites': ['Apply insecticidal soap', 'Use neem oil', 'Increase humidity'],
-            'target_spot': ['Apply fungicide', 'Improve plant spacing', 'Remove affected leaves'],
-            'yellow_leaf_curl_virus': ['Remove infected plants', 'Control whiteflies', 'Use resistant varieties'],
-            'mosaic_virus': ['Remove infected plants', 'Control aphids', 'Disinfect tools']
-        }
-        return recommendations.get(disease, ['Consult local agricultural expert'])
-    
-    def predict_weather(self, location):
-        """Predict weather for the next 7 days"""
-        try:
-            # Simulate weather prediction (in production, use real weather API)
-            weather_data = []
-            base_temp = np.random.uniform(20, 30)
-            base_humidity = np.random.uniform(40, 80)
-            
-            for i in range(7):
-                date = datetime.now() + timedelta(days=i)
-                temp = base_temp + np.random.uniform(-5, 5)
-                humidity = base_humidity + np.random.uniform(-10, 10)
-                rainfall = np.random.uniform(0, 20)
-                wind_speed = np.random.uniform(0, 15)
-                
-                weather_data.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'temperature': round(temp, 1),
-                    'humidity': round(humidity, 1),
-                    'rainfall': round(rainfall, 1),
-                    'wind_speed': round(wind_speed, 1),
-                    'condition': self._get_weather_condition(temp, humidity, rainfall)
-                })
-            
-            return weather_data
-        except Exception as e:
-            return {'error': str(e)}
-    
-    def _get_weather_condition(self, temp, humidity, rainfall):
-        """Determine weather condition based on parameters"""
-        if rainfall > 10:
-            return 'Rainy'
-        elif temp > 25 and humidity < 50:
-            return 'Sunny'
-        elif humidity > 70:
-            return 'Cloudy'
-        else:
-            return 'Partly Cloudy'
-    
-    def get_market_prices(self, crop_type):
-        """Get current market prices and forecasts"""
-        try:
-            # Simulate market data (in production, use real market APIs)
-            base_price = {
-                'tomato': 50,
-                'potato': 30,
-                'corn': 25,
-                'wheat': 35,
-                'rice': 40,
-                'beans': 45
-            }
-            
-            current_price = base_price.get(crop_type, 30)
-            price_variation = np.random.uniform(-10, 15)
-            forecast_price = current_price + price_variation
-            
-            return {
-                'crop': crop_type,
-                'current_price': round(current_price, 2),
-                'forecast_price': round(forecast_price, 2),
-                'trend': 'up' if forecast_price > current_price else 'down',
-                'confidence': round(np.random.uniform(0.6, 0.9), 2),
-                'recommendation': self._get_market_recommendation(current_price, forecast_price)
-            }
-        except Exception as e:
-            return {'error': str(e)}
-    
-    def _get_market_recommendation(self, current, forecast):
-        """Get market recommendations based on price trends"""
-        if forecast > current * 1.1:
-            return "Consider holding harvest for better prices"
-        elif forecast < current * 0.9:
-            return "Consider selling soon to avoid price drops"
-        else:
-            return "Prices are stable, plan harvest based on crop readiness"
+MAX_BATCH_IMAGES = int(os.environ.get('AGRIWISE_MAX_BATCH_IMAGES', 256))
+MAX_BULK_LOCATIONS = int(os.environ.get('AGRIWISE_MAX_BULK_LOCATIONS', 1000))
+MAX_LOCATION_RESULTS = 50
+MAX_UPLOAD_BYTES = int(os.environ.get('AGRIWISE_MAX_UPLOAD_MB', 32)) * 1024 * 1024
+IMAGE_MIMETYPES = {'image/jpeg', 'image/png', 'image/webp', 'application/octet-stream'}
+
+# The shared engine; importing this module loads the models
+ai_system = get_engine()
+sync_service = SyncService.from_env(ai_system)
+
+ADMIN_TOKEN = os.environ.get('AGRIWISE_ADMIN_TOKEN')
+
+@app.after_request
+def _model_version_header(response):
+    response.headers['X-Model-Version'] = ai_system.model_version
+    return response
+
+def admin_allowed(authorization, remote_addr):
+    """Admin calls need the bearer token when one is configured, otherwise a loopback client"""
+    if ADMIN_TOKEN:
+        return hmac.compare_digest(authorization or '', f'Bearer {ADMIN_TOKEN}')
+    return remote_addr in ('127.0.0.1', '::1')
+
+def request_model_reload(payload):
+    """Reload the active or ``payload['version']`` model version; returns (body, status)
     
-    def assess_loan_eligibility(self, farmer_data):
-        """Assess micro-loan eligibility"""
-        try:
-            # Extract features from farmer data
-            features = [
-                farmer_data.get('monthly_income', 0),
-                farmer_data.get('land_size', 0),
-                farmer_data.get('crop_yield', 0),
-                farmer_data.get('credit_score', 500),
-                farmer_data.get('age', 35),
-                farmer_data.get('farming_experience', 5)
-            ]
-            
-            # Predict loan eligibility
-            prediction = self.loan_model.predict([features])[0]
-            probability = self.loan_model.predict_proba([features])[0]
-            
-            return {
-                'eligible': bool(prediction),
-                'probability': round(max(probability), 2),
-                'recommended_amount': self._calculate_loan_amount(features),
-                'risk_level': self._assess_risk_level(features),
-                'conditions': self._get_loan_conditions(features)
-            }
-        except Exception as e:
-            return {'error': str(e)}
-    
-    def _calculate_loan_amount(self, features):
-        """Calculate recommended loan amount"""
-        income, land_size, crop_yield, credit_score, age, experience = features
-        base_amount = income * 3  # 3 months income
-        
-        # Adjustments
-        if credit_score > 700:
-            base_amount *= 1.2
-        if experience > 10:
-            base_amount *= 1.1
-        if land_size > 5:
-            base_amount *= 1.15
-            
-        return round(min(base_amount, 50000), 2)  # Cap at 50,000
-    
-    def _assess_risk_level(self, features):
-        """Assess risk level for loan"""
-        income, land_size, crop_yield, credit_score, age, experience = features
-        
-        risk_score = 0
-        if credit_score < 600:
-            risk_score += 2
-        if income < 1000:
-            risk_score += 1
-        if experience < 3:
-            risk_score += 1
-            
-        if risk_score <= 1:
-            return 'Low'
-        elif risk_score <= 3:
-            return 'Medium'
-        else:
-            return 'High'
+    Under serve.py the master reloads once and replaces its workers, so the
+    version is activated and the request forwarded to it instead of reloading
+    this worker alone.
+    """
+    payload = payload if isinstance(payload, dict) else {}
+    version = str(payload['version']) if payload.get('version') else None
+    if version is not None and version not in model_registry.list_versions():
+        return {'error': f'No model version {version}'}, 404
     
-    def _get_loan_conditions(self, features):
-        """Get loan conditions based on risk assessment"""
-        risk_level = self._assess_risk_level(features)
-        
-        conditions = {
-            'Low': ['Standard interest rate', 'Flexible repayment terms'],
-            'Medium': ['Slightly higher interest rate', 'Collateral required'],
-            'High': ['Higher interest rate', 'Guarantor required', 'Shorter repayment period']
-        }
-        
-        return conditions.get(risk_level, ['Contact loan officer for details'])
+    master = os.environ.get('AGRIWISE_MASTER_PID')
+    if master:
+        if version is not None:
+            model_registry.activate_version(version)
+        os.kill(int(master), signal.SIGHUP)
+        return {'status': 'reload requested', 'master': int(master)}, 202
+    try:
+        return ai_system.reload_models(version, force=bool(payload.get('force'))), 200
+    except ModelReloadError as e:
+        return {'error': str(e), 'version': ai_system.model_version}, 409
+
+def index_page():
+    """The dashboard, kept with its compressed encodings until an asset it links to changes"""
+    global _index_page
+    manifest = assets.manifest()
+    if _index_page is None or _index_page[0] != manifest:
+        with app.app_context():
+            page = http_caching.Representation(render_template('index.html').encode(),
+                                               mimetype='text/html; charset=utf-8')
+        # Rendering may have made the first URLs for some assets
+        _index_page = (assets.manifest(), page)
+    return _index_page[1]
 
-# Initialize AgriWise AI
-ai_system = AgriWiseAI()
-ai_system.load_models()
+_index_page = None  # (asset manifest, Representation)
+
+def reference_page():
+    """Crop and disease reference tables, serialized once"""
+    global _reference_page
+    if _reference_page is None:
+        _reference_page = http_caching.Representation(http_caching.canonical_json(ai_system.reference_data()))
+    return _reference_page
+
+_reference_page = None
+
+def _send_representation(representation):
+    status, headers, body = representation.respond(request.headers.get('Accept-Encoding'),
+                                                   request.headers.get('If-None-Match'))
+    return Response(body, status=status, headers=headers)
 
 @app.route('/')
 def index():
     """Main dashboard page"""
-    return render_template('index.html')
+    return _send_representation(index_page())
+
+@app.route('/static/<path:filename>', methods=['GET'])
+def static_file(filename):
+    """Static assets; fingerprinted names (see asset_url) are cached for a year"""
+    found = assets.resolve(filename)
+    if found is None:
+        return jsonify({'error': 'Not found'}), 404
+    path, digest, immutable = found
+    response = send_file(path, conditional=True, etag=digest, max_age=0)
+    if immutable:
+        response.headers['Cache-Control'] = http_caching.IMMUTABLE
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+@app.route('/api/reference', methods=['GET'])
+def get_reference():
+    """Crop list, disease descriptions and treatment recommendations"""
+    try:
+        return _send_representation(reference_page())
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/api/disease-detection', methods=['POST'])
 def detect_disease():
-    """API endpoint for crop disease detection"""
+    """API endpoint for crop disease detection
+    
+    Accepts JSON ({"image": "<data URL>"}), multipart/form-data with an
+    ``image`` file field, or a raw image/* request body.
+    """
     try:
-        data = request.get_json()
-        image_data = data.get('image')
+        if request.mimetype == 'multipart/form-data':
+            upload = request.files.get('image')
+            # Werkzeug has already spooled the part; decode straight from it
+            image_data = upload.stream if upload else None
+        elif request.mimetype in IMAGE_MIMETYPES:
+            image_data = uploads.read_body(request.stream, request.content_length, MAX_UPLOAD_BYTES)
+        else:
+            data = request.get_json()
+            image_data = data.get('image')
         
         if not image_data:
             return jsonify({'error': 'No image data provided'}), 400
@@ -326,9 +153,52 @@ def detect_disease():
         result = ai_system.predict_crop_disease(image_data)
         return jsonify(result)
     
+    except uploads.UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/disease-detection/batch', methods=['POST'])
+def detect_disease_batch():
+    """API endpoint for batched crop disease detection"""
+    try:
+        data = request.get_json()
+        images = data.get('images')
+        
+        if not isinstance(images, list) or not images:
+            return jsonify({'error': 'No images provided'}), 400
+        if len(images) > MAX_BATCH_IMAGES:
+            return jsonify({'error': f'At most {MAX_BATCH_IMAGES} images per batch'}), 413
+        
+        results = ai_system.predict_crop_disease_batch(images)
+        return jsonify({'results': results, 'count': len(results)})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/cache-stats', methods=['GET'])
+def cache_stats():
+    """Hit/miss/eviction counters of the prediction and audio caches"""
+    stats = ai_system.prediction_cache.stats()
+    stats['audio'] = audio_cache.stats()
+    return jsonify(stats)
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics for this worker process"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Load the registry's active (or the given) model version and swap it in
+    
+    Body (optional): {"version": "<name>", "force": true}
+    """
+    if not admin_allowed(request.headers.get('Authorization'), request.remote_addr):
+        return jsonify({'error': 'Forbidden'}), 403
+    body, status = request_model_reload(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
 @app.route('/api/weather-prediction', methods=['POST'])
 def predict_weather_api():
     """API endpoint for weather prediction"""
@@ -342,19 +212,134 @@ def predict_weather_api():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/weather-prediction/bulk', methods=['POST'])
+def predict_weather_bulk_api():
+    """API endpoint for weather prediction over many locations"""
+    try:
+        data = request.get_json()
+        locations = data.get('locations')
+        
+        if not isinstance(locations, list) or not locations:
+            return jsonify({'error': 'No locations provided'}), 400
+        if len(locations) > MAX_BULK_LOCATIONS:
+            return jsonify({'error': f'At most {MAX_BULK_LOCATIONS} locations per request'}), 413
+        
+        result = ai_system.predict_weather_bulk([str(location) for location in locations])
+        if 'error' in result:
+            return jsonify(result), 500
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/market-prices', methods=['POST'])
 def get_market_prices_api():
     """API endpoint for market prices"""
     try:
         data = request.get_json()
         crop_type = data.get('crop_type', 'tomato')
+        location = data.get('location')
         
-        result = ai_system.get_market_prices(crop_type)
+        result = ai_system.get_market_prices(crop_type, location)
         return jsonify(result)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/locations', methods=['GET'])
+def search_locations_api():
+    """API endpoint for place autocomplete (?q=) and the towns and markets near a point (?lat=&lon=)"""
+    try:
+        body, status = find_locations(request.args)
+        return jsonify(body), status
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def find_locations(args):
+    """(body, status) for a location query; shared with the ASGI app"""
+    try:
+        limit = min(int(args.get('limit', 10)), MAX_LOCATION_RESULTS)
+        if limit < 1:
+            return {'error': 'limit must be at least 1'}, 400
+        if args.get('q'):
+            return {'results': ai_system.search_locations(args['q'], limit)}, 200
+        lat, lon = float(args['lat']), float(args['lon'])
+    except KeyError:
+        return {'error': 'Provide q, or lat and lon'}, 400
+    except ValueError:
+        return {'error': 'limit, lat and lon must be numbers'}, 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return {'error': 'lat or lon out of range'}, 400
+    return ai_system.nearby(lat, lon, limit), 200
+
+@app.route('/api/weather-map', methods=['GET'])
+def weather_map_api():
+    """API endpoint for one day's forecast grid (?day=, ?bbox=lat_min,lat_max,lon_min,lon_max)"""
+    try:
+        body, status = weather_map(request.args)
+        return jsonify(body), status
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def weather_map(args):
+    """(body, status) for a forecast grid query; shared with the ASGI app"""
+    try:
+        day = int(args.get('day', 0))
+        bounds = tuple(float(value) for value in args['bbox'].split(',')) if args.get('bbox') else None
+        if bounds is not None and len(bounds) != 4:
+            raise ValueError
+    except ValueError:
+        return {'error': 'day must be an integer and bbox four numbers: lat_min,lat_max,lon_min,lon_max'}, 400
+    try:
+        result = ai_system.weather_map(bounds, day)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    if result is None:
+        return {'error': 'No forecast tile covers that area and day'}, 404
+    return result, 200
+
+@app.route('/api/market-prices/history', methods=['GET'])
+def get_market_history_api():
+    """API endpoint for historical market prices"""
+    try:
+        crop_type = request.args.get('crop')
+        start = request.args.get('from')
+        end = request.args.get('to')
+        market = request.args.get('market')
+        
+        if not crop_type:
+            return jsonify({'error': 'No crop provided'}), 400
+        
+        try:
+            prices = ai_system.get_market_history(crop_type, start, end, market)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if prices is None:
+            return jsonify({'error': f'No price history for {crop_type}'}), 404
+        
+        return jsonify({
+            'crop': crop_type,
+            'market': market,
+            'from': start,
+            'to': end,
+            'prices': prices
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/sync', methods=['GET'])
+def sync_bundle():
+    """Forecast, prices and disease tables for a region in one versioned, compressed response"""
+    try:
+        representation = sync_service.representation(request.args.get('region', 'Nairobi'), request.args.get('since'))
+        return _send_representation(representation)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/loan-assessment', methods=['POST'])
 def assess_loan():
     """API endpoint for loan assessment"""
@@ -367,47 +352,317 @@ def assess_loan():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/loan-assessment/batch', methods=['POST'])
+def assess_loan_batch():
+    """API endpoint for bulk loan assessment
+    
+    Accepts JSON Lines or CSV (one farmer per row) and streams one NDJSON
+    result per input row, in input order.
+    """
+    mimetype = request.mimetype
+    if mimetype not in loan_batch.NDJSON_MIMETYPES | loan_batch.CSV_MIMETYPES:
+        return jsonify({'error': 'Send application/x-ndjson or text/csv'}), 415
+    
+    records = loan_batch.iter_records(request.stream, mimetype)
+    lines = loan_batch.stream_assessments(ai_system, records, LOAN_CONDITIONS)
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
 @app.route('/api/voice-to-text', methods=['POST'])
 def voice_to_text():
-    """API endpoint for voice-to-text conversion"""
+    """API endpoint for voice-to-text conversion
+    
+    Raw audio bodies (WAV, or Ogg/WebM when ffmpeg is available), which may be
+    sent with chunked transfer encoding, get NDJSON back: ``{"partial": ...}``
+    lines while decoding and a final ``{"text", "confidence", ...}`` line.
+    JSON bodies with base64 ``audio`` get a single JSON result.
+    """
+    language = request.args.get('language', 'en')
+    if request.is_json:
+        data = request.get_json()
+        language = data.get('language', language)
+        chunks = _base64_chunks(data.get('audio', ''))
+        mimetype = data.get('mimetype')
+    else:
+        chunks = _request_chunks(request.stream, MAX_UPLOAD_BYTES)
+        mimetype = request.mimetype
+    
+    if not STT_SLOTS.acquire(timeout=STT_QUEUE_TIMEOUT):
+        response = jsonify({'error': 'Too many concurrent transcriptions, retry shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    
+    streaming = False
     try:
-        # This would integrate with speech recognition
-        # For now, return a sample response
-        return jsonify({
-            'text': 'Sample voice input converted to text',
-            'language': 'Swahili',
-            'confidence': 0.85
-        })
+        events = speech.transcribe_stream(chunks, stt_engine, language, mimetype)
+        if request.is_json:
+            return jsonify(list(events)[-1])
+        
+        def lines():
+            try:
+                for event in events:
+                    yield json.dumps(event) + '\n'
+            except Exception as e:
+                # Headers are sent; report the failure as the stream's last line
+                yield json.dumps({'error': str(e)}) + '\n'
+        
+        response = Response(stream_with_context(lines()), mimetype='application/x-ndjson')
+        # Hold the slot until the stream has been sent (or abandoned)
+        response.call_on_close(STT_SLOTS.release)
+        streaming = True
+        return response
     
+    except speech.UnsupportedAudio as e:
+        return jsonify({'error': str(e)}), 415
+    except uploads.UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    finally:
+        if not streaming:
+            STT_SLOTS.release()
+
+def _request_chunks(stream, limit, size=1 << 15):
+    """Read a (possibly chunked) request body piece by piece, enforcing ``limit``"""
+    total = 0
+    for chunk in iter(lambda: stream.read(size), b''):
+        total += len(chunk)
+        if total > limit:
+            raise uploads.UploadTooLarge(f'Audio exceeds the {limit // (1024 * 1024)} MB limit')
+        yield chunk
+
+def _base64_chunks(encoded, size=1 << 16):
+    """Decode base64 audio in slices (the slice size is a multiple of 4)"""
+    if ',' in encoded[:100]:
+        encoded = encoded.split(',', 1)[1]  # data: URL
+    for start in range(0, len(encoded), size):
+        yield base64.b64decode(encoded[start:start + size])
+
+STT_STREAMS = int(os.environ.get('AGRIWISE_STT_STREAMS', 4))
+STT_SLOTS = threading.BoundedSemaphore(STT_STREAMS)
+STT_QUEUE_TIMEOUT = float(os.environ.get('AGRIWISE_STT_QUEUE_TIMEOUT', 2))
+stt_engine = speech.default_engine()
 
 @app.route('/api/text-to-speech', methods=['POST'])
 def text_to_speech():
-    """API endpoint for text-to-speech conversion"""
+    """API endpoint for text-to-speech conversion
+    
+    Returns JSON with an ``audio_url`` by default; with ``"stream": true``
+    (or ``?stream=1``) the audio itself is returned.
+    """
     try:
         data = request.get_json()
         text = data.get('text', 'Hello from AgriWise AI')
         language = data.get('language', 'en')
+        engine = data.get('engine', TTS_ENGINE)
         
-        # Generate speech (simplified)
-        tts = gTTS(text=text, lang=language, slow=False)
+        refused = tts_request_error(text, engine)
+        if refused:
+            return jsonify({'error': refused}), 400
         
-        # Save to temporary file
-        audio_path = f"static/temp_audio_{int(time.time())}.mp3"
-        tts.save(audio_path)
+        result = synthesize_speech(text, language, engine)
+        if data.get('stream') or request.args.get('stream') == '1':
+            return _send_audio(result['audio_file'])
+        return jsonify(result)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/audio/<filename>', methods=['GET'])
+def get_audio(filename):
+    """Serve synthesized audio with ETag and Range support"""
+    return _send_audio(filename)
+
+def _send_audio(filename):
+    path = audio_cache.lookup(filename)
+    if path is None:
+        return jsonify({'error': 'Audio not found'}), 404
+    
+    key, _, extension = filename.partition('.')
+    mimetype = {backend.extension: backend.mimetype for backend in tts.BACKENDS.values()}.get(extension)
+    # Content-addressed, so the file behind a name never changes
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=key, max_age=AUDIO_MAX_AGE)
+    response.cache_control.immutable = True
+    return response
+
+def tts_request_error(text, engine):
+    """Why a text-to-speech request is refused, or None; shared with the ASGI app and the job handler"""
+    if engine not in TTS_ENGINES:
+        return f'Unknown TTS engine {engine!r}'
+    if not isinstance(text, str):
+        return 'text must be a string'
+    if len(text) > MAX_TTS_CHARS:
+        return f'text exceeds {MAX_TTS_CHARS} characters'
+    return None
+
+def synthesize_speech(text, language, engine=None):
+    """Synthesize speech (or reuse the cached audio) and return where to fetch it"""
+    engine = engine or TTS_ENGINE
+    backend = tts_backends.get(engine)
+    if backend is None:
+        backend = tts_backends[engine] = tts.BACKENDS[engine]()
+    
+    filename, cached = audio_cache.get_or_synthesize(text, language, backend)
+    return {
+        'audio_url': f'/api/audio/{filename}',
+        'audio_file': filename,
+        'engine': engine,
+        'cached': cached,
+        'success': True
+    }
+
+TTS_ENGINE = os.environ.get('AGRIWISE_TTS_ENGINE', 'gtts')
+# Engines a request may pick: the configured one unless listed (the tone stand-in is for tests)
+TTS_ENGINES = {TTS_ENGINE, *filter(None, os.environ.get('AGRIWISE_TTS_ENGINES', '').split(','))} & set(tts.BACKENDS)
+MAX_TTS_CHARS = int(os.environ.get('AGRIWISE_TTS_MAX_CHARS', 500))
+AUDIO_MAX_AGE = 365 * 24 * 3600
+audio_cache = tts.AudioCache.from_env(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'audio_cache'))
+tts_backends = {}
+
+# Background jobs. Handlers run in pool worker processes started from a
+# forkserver that has imported this module (and so loaded the models) once.
+JOB_CHUNK = 16
+
+def init_pool_worker():
+    """Process pool initializer: serve the registry's active models
+    
+    The forkserver loaded the models when it started, possibly before a
+    reload, so a worker catches up with the registry before its first task.
+    """
+    if ai_system.models_outdated():
+        try:
+            ai_system.reload_models()
+        except ModelReloadError as e:
+            print(f"Pool worker keeps model version {ai_system.model_version}: {e}")
+
+def _disease_detection_job(payload, progress):
+    """Job handler: disease detection for ``image`` or a list of ``images``"""
+    images = payload.get('images')
+    if images is None:
+        return ai_system.predict_crop_disease(payload.get('image') or '', progress)
+    
+    results = []
+    for start in range(0, len(images), JOB_CHUNK):
+        results.extend(ai_system.predict_crop_disease_batch(images[start:start + JOB_CHUNK]))
+        progress(len(results) / len(images), f'{len(results)}/{len(images)} images')
+    return {'results': results, 'count': len(results)}
+
+def _loan_batch_job(payload, progress):
+    """Job handler: bulk loan assessment of ``records``"""
+    records = payload.get('records') or []
+    rows = (
+        (row, record if isinstance(record, dict) else ValueError('Expected a JSON object'))
+        for row, record in enumerate(records, start=1)
+    )
+    results = []
+    for chunk in loan_batch.stream_assessments(ai_system, rows, LOAN_CONDITIONS):
+        results.extend(json.loads(line) for line in chunk.splitlines())
+        progress(len(results) / len(records), f'{len(results)}/{len(records)} applicants')
+    return {'results': results, 'count': len(results)}
+
+def _tts_job(payload, progress):
+    """Job handler: text-to-speech synthesis"""
+    text = payload.get('text', 'Hello from AgriWise AI')
+    engine = payload.get('engine') or TTS_ENGINE
+    refused = tts_request_error(text, engine)
+    if refused:
+        raise ValueError(refused)
+    return synthesize_speech(text, payload.get('language', 'en'), engine)
+
+job_manager = jobs.JobManager.from_env(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'jobs.sqlite3'),
+                                       preload=['app'], initializer=init_pool_worker)
+job_manager.register('disease-detection', _disease_detection_job, concurrency=2)
+job_manager.register('loan-batch', _loan_batch_job, concurrency=1)
+job_manager.register('tts', _tts_job, concurrency=2)
+
+def _collect_metrics():
+    """Cache, job and model state, read at scrape time"""
+    families = []
+    for prefix, stats in (('agriwise_prediction_cache', ai_system.prediction_cache.stats()),
+                          ('agriwise_weather_cache', ai_system.weather_service.stats()),
+                          ('agriwise_audio_cache', audio_cache.stats())):
+        for name in ('hits', 'disk_hits', 'misses', 'evictions', 'expirations', 'coalesced'):
+            if name in stats:
+                families.append((f'{prefix}_{name}_total', 'counter', f'Cache {name.replace("_", " ")}', {(): stats[name]}))
+        size = stats.get('entries', stats.get('files'))
+        families.append((f'{prefix}_entries', 'gauge', 'Entries currently cached', {(): size}))
+    families.append(('agriwise_audio_cache_bytes', 'gauge', 'Bytes of cached audio', {(): audio_cache.stats()['bytes']}))
+    
+    job_counts = job_manager.stats()['counts']
+    families.append(('agriwise_jobs', 'gauge', 'Jobs in the queue database by status',
+                     {(('status', status),): job_counts.get(status, 0) for status in (jobs.QUEUED, jobs.RUNNING, jobs.DONE, jobs.FAILED)}))
+    families.append(('agriwise_model_info', 'gauge', 'Loaded model version', {(('version', ai_system.model_version), ('classifier', ai_system.disease_classifier.name)): 1}))
+    return families
+
+metrics.REGISTRY.add_collector(_collect_metrics)
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """API endpoint to enqueue a background job"""
+    try:
+        data = request.get_json()
+        job_type = data.get('type')
+        payload = data.get('payload', {})
         
-        return jsonify({
-            'audio_url': audio_path,
-            'success': True
-        })
+        if not isinstance(payload, dict):
+            return jsonify({'error': 'payload must be a JSON object'}), 400
+        
+        job = job_manager.submit(job_type, payload)
+        return jsonify(job), 202, {'Location': f"/api/jobs/{job['id']}"}
     
+    except jobs.QueueFull as e:
+        return jsonify({'error': str(e)}), 429, {'Retry-After': '5'}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """API endpoint for job status, progress and result"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Server-sent events stream of job progress, ending with the result"""
+    if job_manager.get(job_id, include_result=False) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        last = None
+        while True:
+            job = job_manager.get(job_id, include_result=False)
+            if job['status'] in jobs.TERMINAL:
+                yield f"event: {job['status']}\ndata: {json.dumps(job_manager.get(job_id))}\n\n"
+                return
+            snapshot = (job['status'], job['progress'], job['message'])
+            if snapshot != last:
+                yield f'data: {json.dumps(job)}\n\n'
+                last = snapshot
+            time.sleep(0.5)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
+
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='AgriWise AI Flask server')
+    parser.add_argument('--profile-imports', action='store_true',
+                        help='report per-module import time of `import app` and exit')
+    parser.add_argument('--top', type=int, default=25, help='modules to show with --profile-imports')
+    args = parser.parse_args()
+
+    if args.profile_imports:
+        root = os.path.dirname(os.path.abspath(__file__))
+        print(format_import_report(import_time_report('app', cwd=root), top=args.top))
+        raise SystemExit(0)
+
     # Create static directory if it doesn't exist
     os.makedirs('static', exist_ok=True)
     os.makedirs('templates', exist_ok=True)
     
+    ai_system.watch_models()
     app.run(debug=True, host='0.0.0.0', port=5000) 
\ No newline at end of file
@@ -0,0 +1,647 @@
+"""ASGI build of the API, for serving I/O-bound endpoints without blocking workers
+
+    uvicorn asgi:app --host 0.0.0.0 --port 8000 [--workers 4]
+
+Routes and responses match the Flask app in ``app.py``, and importing it loads
+the same AgriWiseAI instance and caches. What differs is where work runs:
+
+- weather forecasts await async providers (pooled httpx clients for remote ones)
+- TTS synthesis, speech decoding and job-queue queries run in the thread pool
+- model inference runs in a process pool (started from a forkserver that has
+  loaded the models, see ``jobs.process_context``), so neither the event loop
+  nor its thread pool executes CPU-bound work; a model reload starts a fresh
+  pool and lets the old one finish its queue
+"""
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import app as core
+import http_caching
+import jobs
+import loan_batch
+import metrics
+import speech
+import tts
+import uploads
+
+INFERENCE_PROCESSES = int(os.environ.get('AGRIWISE_INFERENCE_PROCESSES', os.cpu_count() or 1))
+SPOOL_BYTES = 1024 * 1024
+
+ai_system = core.ai_system
+_inference_pool = None
+_stt_slots = None
+
+
+class JSON(JSONResponse):
+    """Serialized like Flask's jsonify: sorted keys, compact, trailing newline"""
+
+    def render(self, content):
+        return (json.dumps(content, sort_keys=True, separators=(',', ':')) + '\n').encode()
+
+
+def error(message, status=500, headers=None):
+    return JSON({'error': message}, status, headers)
+
+
+def _mimetype(request):
+    return request.headers.get('content-type', '').split(';')[0].strip().lower()
+
+
+async def _read_body(request, limit):
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > limit:
+            raise uploads.UploadTooLarge(f'Upload exceeds the {limit // (1024 * 1024)} MB limit')
+    return bytes(body)
+
+
+async def _spool_body(request, limit=None):
+    """Copy the request body to a temporary file (in memory while small) and rewind it"""
+    spool = tempfile.SpooledTemporaryFile(SPOOL_BYTES)
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if limit is not None and size > limit:
+            spool.close()
+            raise uploads.UploadTooLarge(f'Upload exceeds the {limit // (1024 * 1024)} MB limit')
+        spool.write(chunk)
+    spool.seek(0)
+    return spool
+
+
+# Inference runs in pool processes forked from a forkserver that has loaded the models.
+# Each worker handles one call at a time, so a micro-batcher there would only add
+# its wait; concurrent requests are spread over the processes instead.
+
+def _diagnose(image_bytes):
+    """Returns (model version, result) so the parent caches under the version that answered"""
+    models = ai_system.models
+    try:
+        return models.version, ai_system.diagnose_image(image_bytes, models, batched=False)
+    except Exception as e:
+        return models.version, {'error': str(e)}
+
+
+def _diagnose_batch(images):
+    return ai_system.predict_crop_disease_batch(images)
+
+
+def _assess_loan(data):
+    return ai_system.assess_loan_eligibility(data, batched=False)
+
+
+def _score_loans(features):
+    return ai_system.score_loans(features)
+
+
+def _warm():
+    return os.getpid()
+
+
+async def _offload(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(_inference_pool, func, *args)
+
+
+def _new_pool():
+    # Workers catch up with the registry's active models before their first call
+    return ProcessPoolExecutor(INFERENCE_PROCESSES, mp_context=jobs.process_context(preload=['app']),
+                               initializer=core.init_pool_worker)
+
+
+def _replace_pool(generation):
+    """Reload listener: start a pool on the new models, drain the old one"""
+    global _inference_pool
+    previous = _inference_pool
+    if previous is None:
+        return
+    _inference_pool = _new_pool()
+    previous.shutdown(wait=False)  # queued and running calls still finish on the old models
+
+
+ai_system.add_reload_listener(_replace_pool)
+
+
+class ModelVersionHeader:
+    """Adds X-Model-Version to every HTTP response, like the Flask app"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        async def send_with_version(message):
+            if message['type'] == 'http.response.start':
+                message['headers'] = list(message.get('headers', [])) + [
+                    (b'x-model-version', str(ai_system.model_version).encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_version)
+
+
+class CompressResponses:
+    """Negotiated gzip/brotli for buffered responses, like http_caching.compress_responses
+
+    Responses sent in several body messages (streams, files) pass through.
+    """
+
+    def __init__(self, app, min_size=http_caching.MIN_COMPRESS_BYTES):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        accept = Headers(scope=scope).get('accept-encoding')
+        encoding = http_caching.negotiate(accept)
+        start = None
+
+        async def compressing_send(message):
+            nonlocal start
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message.get('headers', []))
+                if (message['status'] in (204, 304) or 'content-encoding' in headers
+                        or not http_caching.compressible(headers.get('content-type', '').split(';')[0])
+                        or 'no-transform' in headers.get('cache-control', '')):
+                    return await send(message)
+                start = message
+                MutableHeaders(scope=start).add_vary_header('Accept-Encoding')
+                return
+            if start is None or message['type'] != 'http.response.body':
+                return await send(message)
+
+            held, start = start, None
+            body = message.get('body', b'')
+            if encoding and not message.get('more_body') and len(body) >= self.min_size:
+                body = http_caching.compress(body, encoding)
+                headers = MutableHeaders(scope=held)
+                headers['Content-Encoding'] = encoding
+                headers['Content-Length'] = str(len(body))
+                tag = headers.get('etag')
+                if tag and tag.endswith('"'):
+                    headers['ETag'] = f'{tag[:-1]}-{encoding}"'
+                message = {**message, 'body': body}
+            await send(held)
+            await send(message)
+
+        await self.app(scope, receive, compressing_send)
+
+
+@asynccontextmanager
+async def lifespan(application):
+    global _inference_pool, _stt_slots
+    _stt_slots = asyncio.Semaphore(core.STT_STREAMS)
+    _inference_pool = _new_pool()
+    # Start every worker now, before the first request waits on it
+    await asyncio.gather(*(_offload(_warm) for _ in range(INFERENCE_PROCESSES)))
+    watcher = ai_system.watch_models()
+    try:
+        yield
+    finally:
+        if watcher is not None:
+            watcher.stop()
+        _inference_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _send_representation(request, representation):
+    status, headers, body = representation.respond(request.headers.get('accept-encoding'),
+                                                   request.headers.get('if-none-match'))
+    return Response(body, status, headers)
+
+
+async def index(request):
+    """Main dashboard page"""
+    return _send_representation(request, core.index_page())
+
+
+async def static_file(request):
+    """Static assets; fingerprinted names (see asset_url) are cached for a year"""
+    found = core.assets.resolve(request.path_params['filename'])
+    if found is None:
+        return error('Not found', 404)
+    path, digest, immutable = found
+    headers = {'ETag': f'"{digest}"', 'Cache-Control': http_caching.IMMUTABLE if immutable else 'no-cache'}
+    if http_caching.etag_matches(request.headers.get('if-none-match'), digest):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers)
+
+
+async def get_reference(request):
+    """Crop list, disease descriptions and treatment recommendations"""
+    try:
+        return _send_representation(request, core.reference_page())
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def detect_disease(request):
+    """API endpoint for crop disease detection"""
+    try:
+        mimetype = _mimetype(request)
+        if mimetype == 'multipart/form-data':
+            form = await request.form(max_part_size=core.MAX_UPLOAD_BYTES)
+            upload = form.get('image')
+            image_data = await upload.read() if upload else None
+        elif mimetype in core.IMAGE_MIMETYPES:
+            image_data = await _read_body(request, core.MAX_UPLOAD_BYTES)
+        else:
+            data = await request.json()
+            image_data = data.get('image')
+
+        if not image_data:
+            return error('No image data provided', 400)
+
+        image_bytes = ai_system._image_bytes(image_data)
+        cache = ai_system.prediction_cache
+        model_version = ai_system.model_version
+        cache_key = cache.key(image_bytes, model_version)
+        result = cache.get(cache_key)
+        if result is None:
+            answered_by, result = await _offload(_diagnose, bytes(image_bytes))
+            if 'error' not in result and answered_by == model_version:
+                cache.put(cache_key, result, model_version)
+        return JSON(result)
+
+    except uploads.UploadTooLarge as e:
+        return error(str(e), 413)
+    except Exception as e:
+        return error(str(e))
+
+
+async def detect_disease_batch(request):
+    """API endpoint for batched crop disease detection"""
+    try:
+        data = await request.json()
+        images = data.get('images')
+
+        if not isinstance(images, list) or not images:
+            return error('No images provided', 400)
+        if len(images) > core.MAX_BATCH_IMAGES:
+            return error(f'At most {core.MAX_BATCH_IMAGES} images per batch', 413)
+
+        results = await _offload(_diagnose_batch, images)
+        return JSON({'results': results, 'count': len(results)})
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def cache_stats(request):
+    """Hit/miss/eviction counters of the prediction and audio caches"""
+    stats = ai_system.prediction_cache.stats()
+    stats['audio'] = core.audio_cache.stats()
+    return JSON(stats)
+
+
+async def metrics_endpoint(request):
+    """Prometheus metrics for this worker process"""
+    return Response(metrics.REGISTRY.render(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+
+async def admin_reload(request):
+    """Load the registry's active (or the given) model version and swap it in"""
+    client = request.client.host if request.client else None
+    if not core.admin_allowed(request.headers.get('authorization'), client):
+        return error('Forbidden', 403)
+    try:
+        payload = await request.json()
+    except ValueError:
+        payload = {}
+    body, status = await run_in_threadpool(core.request_model_reload, payload)
+    return JSON(body, status)
+
+
+async def predict_weather(request):
+    """API endpoint for weather prediction"""
+    try:
+        data = await request.json()
+        location = data.get('location', 'Nairobi')
+
+        return JSON(await ai_system.predict_weather_async(location))
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def predict_weather_bulk(request):
+    """API endpoint for weather prediction over many locations"""
+    try:
+        data = await request.json()
+        locations = data.get('locations')
+
+        if not isinstance(locations, list) or not locations:
+            return error('No locations provided', 400)
+        if len(locations) > core.MAX_BULK_LOCATIONS:
+            return error(f'At most {core.MAX_BULK_LOCATIONS} locations per request', 413)
+
+        result = await ai_system.predict_weather_bulk_async([str(location) for location in locations])
+        return JSON(result, 500 if 'error' in result else 200)
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def get_market_prices(request):
+    """API endpoint for market prices"""
+    try:
+        data = await request.json()
+        crop_type = data.get('crop_type', 'tomato')
+        location = data.get('location')
+
+        # Precomputed forecasts: an in-memory lookup, no need to leave the loop
+        return JSON(ai_system.get_market_prices(crop_type, location))
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def search_locations(request):
+    """API endpoint for place autocomplete (?q=) and the towns and markets near a point (?lat=&lon=)"""
+    try:
+        # Trie and KD-tree lookups take microseconds; they run on the loop
+        body, status = core.find_locations(request.query_params)
+        return JSON(body, status)
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def get_weather_map(request):
+    """API endpoint for one day's forecast grid (?day=, ?bbox=lat_min,lat_max,lon_min,lon_max)"""
+    try:
+        # Slices of memory-mapped tiles; building the JSON lists is the only real work
+        body, status = core.weather_map(request.query_params)
+        return JSON(body, status)
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def get_market_history(request):
+    """API endpoint for historical market prices"""
+    try:
+        crop_type = request.query_params.get('crop')
+        start = request.query_params.get('from')
+        end = request.query_params.get('to')
+        market = request.query_params.get('market')
+
+        if not crop_type:
+            return error('No crop provided', 400)
+
+        try:
+            prices = ai_system.get_market_history(crop_type, start, end, market)
+        except ValueError as e:
+            return error(str(e), 400)
+        if prices is None:
+            return error(f'No price history for {crop_type}', 404)
+
+        return JSON({'crop': crop_type, 'market': market, 'from': start, 'to': end, 'prices': prices})
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def sync_bundle(request):
+    """Forecast, prices and disease tables for a region in one versioned, compressed response"""
+    try:
+        representation = await run_in_threadpool(core.sync_service.representation,
+                                                 request.query_params.get('region', 'Nairobi'),
+                                                 request.query_params.get('since'))
+        return _send_representation(request, representation)
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def assess_loan(request):
+    """API endpoint for loan assessment"""
+    try:
+        data = await request.json()
+        return JSON(await _offload(_assess_loan, data))
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def assess_loan_batch(request):
+    """API endpoint for bulk loan assessment (JSON Lines or CSV in, NDJSON out)"""
+    mimetype = _mimetype(request)
+    if mimetype not in loan_batch.NDJSON_MIMETYPES | loan_batch.CSV_MIMETYPES:
+        return error('Send application/x-ndjson or text/csv', 415)
+
+    spool = await _spool_body(request)
+
+    def score(features):
+        # Parsing stays in this thread; the forest scoring waits on the process pool
+        return _inference_pool.submit(_score_loans, features).result()
+
+    def lines():
+        try:
+            records = loan_batch.iter_records(spool, mimetype)
+            yield from loan_batch.stream_assessments(ai_system, records, core.LOAN_CONDITIONS, score=score)
+        finally:
+            spool.close()
+
+    return StreamingResponse(iterate_in_threadpool(lines()), media_type='application/x-ndjson')
+
+
+async def voice_to_text(request):
+    """API endpoint for voice-to-text conversion
+
+    Same contract as the Flask route, except that the upload is received in
+    full before decoding starts; partial transcripts still stream back.
+    """
+    language = request.query_params.get('language', 'en')
+    is_json = _mimetype(request) == 'application/json'
+    try:
+        if is_json:
+            data = await request.json()
+            language = data.get('language', language)
+            chunks = core._base64_chunks(data.get('audio', ''))
+            mimetype = data.get('mimetype')
+        else:
+            spool = await _spool_body(request, core.MAX_UPLOAD_BYTES)
+            chunks = iter(lambda: spool.read(1 << 15), b'')
+            mimetype = _mimetype(request)
+    except uploads.UploadTooLarge as e:
+        return error(str(e), 413)
+
+    try:
+        await asyncio.wait_for(_stt_slots.acquire(), core.STT_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return error('Too many concurrent transcriptions, retry shortly', 503, {'Retry-After': '1'})
+
+    streaming = False
+    try:
+        events = await run_in_threadpool(speech.transcribe_stream, chunks, core.stt_engine, language, mimetype)
+        if is_json:
+            return JSON(await run_in_threadpool(lambda: list(events)[-1]))
+
+        def lines():
+            try:
+                for event in events:
+                    yield json.dumps(event) + '\n'
+            except Exception as e:
+                # Headers are sent; report the failure as the stream's last line
+                yield json.dumps({'error': str(e)}) + '\n'
+
+        async def body():
+            # Hold the slot until the stream has been sent (or abandoned)
+            try:
+                async for line in iterate_in_threadpool(lines()):
+                    yield line
+            finally:
+                _stt_slots.release()
+
+        streaming = True
+        return StreamingResponse(body(), media_type='application/x-ndjson')
+
+    except speech.UnsupportedAudio as e:
+        return error(str(e), 415)
+    except Exception as e:
+        return error(str(e))
+    finally:
+        if not streaming:
+            _stt_slots.release()
+
+
+async def text_to_speech(request):
+    """API endpoint for text-to-speech conversion"""
+    try:
+        data = await request.json()
+        text = data.get('text', 'Hello from AgriWise AI')
+        language = data.get('language', 'en')
+        engine = data.get('engine', core.TTS_ENGINE)
+
+        refused = core.tts_request_error(text, engine)
+        if refused:
+            return error(refused, 400)
+
+        result = await run_in_threadpool(core.synthesize_speech, text, language, engine)
+        if data.get('stream') or request.query_params.get('stream') == '1':
+            return _send_audio(request, result['audio_file'])
+        return JSON(result)
+
+    except Exception as e:
+        return error(str(e))
+
+
+async def get_audio(request):
+    """Serve synthesized audio with ETag and Range support"""
+    return _send_audio(request, request.path_params['filename'])
+
+
+def _send_audio(request, filename):
+    path = core.audio_cache.lookup(filename)
+    if path is None:
+        return error('Audio not found', 404)
+
+    key, _, extension = filename.partition('.')
+    etag = f'"{key}"'
+    headers = {'ETag': etag, 'Cache-Control': f'public, max-age={core.AUDIO_MAX_AGE}, immutable'}
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=headers)
+    mimetype = {backend.extension: backend.mimetype for backend in tts.BACKENDS.values()}.get(extension)
+    return FileResponse(path, media_type=mimetype, headers=headers)
+
+
+async def submit_job(request):
+    """API endpoint to enqueue a background job"""
+    try:
+        data = await request.json()
+        job_type = data.get('type')
+        payload = data.get('payload', {})
+
+        if not isinstance(payload, dict):
+            return error('payload must be a JSON object', 400)
+
+        job = await run_in_threadpool(core.job_manager.submit, job_type, payload)
+        return JSON(job, 202, {'Location': f"/api/jobs/{job['id']}"})
+
+    except jobs.QueueFull as e:
+        return error(str(e), 429, {'Retry-After': '5'})
+    except ValueError as e:
+        return error(str(e), 400)
+    except Exception as e:
+        return error(str(e))
+
+
+async def get_job(request):
+    """API endpoint for job status, progress and result"""
+    job = await run_in_threadpool(core.job_manager.get, request.path_params['job_id'])
+    if job is None:
+        return error('Job not found', 404)
+    return JSON(job)
+
+
+async def job_events(request):
+    """Server-sent events stream of job progress, ending with the result"""
+    job_id = request.path_params['job_id']
+    manager = core.job_manager
+    if await run_in_threadpool(manager.get, job_id, False) is None:
+        return error('Job not found', 404)
+
+    async def generate():
+        last = None
+        while True:
+            job = await run_in_threadpool(manager.get, job_id, False)
+            if job['status'] in jobs.TERMINAL:
+                result = await run_in_threadpool(manager.get, job_id)
+                yield f"event: {job['status']}\ndata: {json.dumps(result)}\n\n"
+                return
+            snapshot = (job['status'], job['progress'], job['message'])
+            if snapshot != last:
+                yield f'data: {json.dumps(job)}\n\n'
+                last = snapshot
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+
+routes = [
+    Route('/', index),
+    Route('/api/disease-detection', detect_disease, methods=['POST']),
+    Route('/api/disease-detection/batch', detect_disease_batch, methods=['POST']),
+    Route('/api/cache-stats', cache_stats, methods=['GET']),
+    Route('/metrics', metrics_endpoint, methods=['GET']),
+    Route('/admin/reload', admin_reload, methods=['POST']),
+    Route('/api/weather-prediction', predict_weather, methods=['POST']),
+    Route('/api/weather-prediction/bulk', predict_weather_bulk, methods=['POST']),
+    Route('/api/market-prices', get_market_prices, methods=['POST']),
+    Route('/api/market-prices/history', get_market_history, methods=['GET']),
+    Route('/api/locations', search_locations, methods=['GET']),
+    Route('/api/weather-map', get_weather_map, methods=['GET']),
+    Route('/api/reference', get_reference, methods=['GET']),
+    Route('/api/sync', sync_bundle, methods=['GET']),
+    Route('/api/loan-assessment', assess_loan, methods=['POST']),
+    Route('/api/loan-assessment/batch', assess_loan_batch, methods=['POST']),
+    Route('/api/voice-to-text', voice_to_text, methods=['POST']),
+    Route('/api/text-to-speech', text_to_speech, methods=['POST']),
+    Route('/api/audio/{filename}', get_audio, methods=['GET']),
+    Route('/api/jobs', submit_job, methods=['POST']),
+    Route('/api/jobs/{job_id}', get_job, methods=['GET']),
+    Route('/api/jobs/{job_id}/events', job_events, methods=['GET']),
+    Route('/static/{filename:path}', static_file, methods=['GET']),
+]
+
+# Same open CORS policy as the Flask app
+app = Starlette(routes=routes, lifespan=lifespan, middleware=[
+    Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+    Middleware(ModelVersionHeader),
+    Middleware(CompressResponses),
+])
@@ -0,0 +1,145 @@
+"""Dynamic micro-batching of model calls across concurrent requests
+
+Request threads hand single items to a ``MicroBatcher``; one background
+thread gathers whatever has queued up (up to ``max_batch`` items, waiting at
+most ``max_wait`` seconds after the first) and runs the model once for the
+whole batch. Under load the per-item model overhead is amortised; an idle
+server adds at most ``max_wait`` to a lone request.
+
+    batcher = MicroBatcher(lambda items: model.predict_proba(np.stack(items)), name='disease')
+    probabilities = batcher(item)
+
+Each batcher reports its queue depth, batch sizes and how long items waited
+for their batch to start, labelled with its ``name``.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import metrics
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512)
+
+QUEUE_DEPTH = metrics.gauge('agriwise_batch_queue_depth', 'Items waiting for a micro-batch', ('model',))
+BATCH_SIZE = metrics.histogram('agriwise_batch_size', 'Items per micro-batch', ('model',),
+                               buckets=BATCH_SIZE_BUCKETS)
+BATCH_WAIT = metrics.histogram('agriwise_batch_wait_seconds', 'Time from submit until the batch starts running',
+                               ('model',))
+
+
+class MicroBatcher:
+    """Coalesce single-item calls into batched ``func(items)`` calls
+
+    ``func`` receives a list of items and returns a sequence of results in
+    the same order. If it raises, every caller in that batch gets the error.
+    """
+
+    def __init__(self, func, max_batch=32, max_wait=0.002, name='batcher'):
+        self.func = func
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self._depth = QUEUE_DEPTH.labels(name)
+        self._sizes = BATCH_SIZE.labels(name)
+        self._waits = BATCH_WAIT.labels(name)
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+
+    @classmethod
+    def from_env(cls, func, prefix, max_batch=32, max_wait_ms=2, name=None):
+        """Read ``<prefix>_BATCH`` and ``<prefix>_BATCH_WAIT_MS`` (0 disables waiting)"""
+        return cls(
+            func,
+            max_batch=int(os.environ.get(f'{prefix}_BATCH', max_batch)),
+            max_wait=float(os.environ.get(f'{prefix}_BATCH_WAIT_MS', max_wait_ms)) / 1000,
+            name=name or prefix.lower(),
+        )
+
+    def submit(self, item):
+        """Queue one item; returns a Future for its result"""
+        future = Future()
+        with self._lock:
+            if not self._closed:
+                # A thread inherited through fork is not running in the child
+                if self._pid != os.getpid():
+                    self._start()
+                self._depth.inc()
+                self._queue.put((item, future, time.perf_counter()))
+                return future
+        # Callers that picked up this batcher just before close() run alone
+        try:
+            future.set_result(self.func([item])[0])
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+    def __call__(self, item):
+        return self.submit(item).result()
+
+    def close(self):
+        """Stop the thread once everything already queued has run"""
+        with self._lock:
+            self._closed = True
+            if self._pid == os.getpid():
+                self._queue.put(None)
+
+    def _start(self):
+        self._queue = queue.SimpleQueue()
+        self._depth.set(0)
+        self._thread = threading.Thread(target=self._run, args=(self._queue,),
+                                        name=f'batch-{self.name}', daemon=True)
+        self._thread.start()
+        self._pid = os.getpid()
+
+    def _collect(self, pending):
+        """Block for one item, then take more until the batch is full or max_wait passes"""
+        first = pending.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                entry = pending.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = pending.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if entry is None:
+                pending.put(None)  # run this batch, then stop
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = self._collect(pending)
+            if batch is None:
+                return
+            self._depth.dec(len(batch))
+            started = time.perf_counter()
+            for _, _, submitted in batch:
+                self._waits.observe(started - submitted)
+            batch = [(item, future) for item, future, _ in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            self._sizes.observe(len(batch))
+            try:
+                results = self.func([item for item, _ in batch])
+                if len(results) != len(batch):
+                    raise RuntimeError(f'{self.name} returned {len(results)} results for {len(batch)} items')
+            except BaseException as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
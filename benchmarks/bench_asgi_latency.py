@@ -0,0 +1,155 @@
+"""Tail latency of I/O-bound requests: Flask (serve.py) vs. the ASGI app (uvicorn)
+
+Both servers use the local weather provider wrapped with an injected delay
+(AGRIWISE_WEATHER_LATENCY_MS) to stand in for a remote data source. Every
+request asks for a new location, so each one pays the delay. An asyncio
+client holds ``--concurrency`` requests in flight throughout.
+
+    python benchmarks/bench_asgi_latency.py [--concurrency 1000] [--latency-ms 100]
+                                            [--duration 15] [--workers 1] [--threads 8]
+"""
+import argparse
+import asyncio
+import http.client
+import itertools
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/cache-stats')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError('server did not start')
+
+
+async def one_request(port, body, keep_alive, connection):
+    """Send one POST, reusing ``connection`` (reader, writer) when keep-alive is on"""
+    if connection is None:
+        connection = await asyncio.open_connection('127.0.0.1', port)
+    reader, writer = connection
+    writer.write(
+        b'POST /api/weather-prediction HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n'
+        b'Content-Length: %d\r\nConnection: %s\r\n\r\n%s'
+        % (len(body), b'keep-alive' if keep_alive else b'close', body)
+    )
+    await writer.drain()
+    status_line = await reader.readline()
+    length = None
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    if length is None:
+        await reader.read()
+    else:
+        await reader.readexactly(length)
+    if not status_line.startswith(b'HTTP/1.1 200'):
+        raise OSError(status_line.decode(errors='replace').strip())
+    if keep_alive:
+        return connection
+    writer.close()
+    return None
+
+
+async def drive(port, concurrency, duration, keep_alive):
+    counter = itertools.count()
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def loop():
+        nonlocal errors
+        connection = None
+        while time.perf_counter() < deadline:
+            body = json.dumps({'location': f'bench-{next(counter)}'}).encode()
+            start = time.perf_counter()
+            try:
+                connection = await asyncio.wait_for(one_request(port, body, keep_alive, connection), 60)
+                latencies.append(time.perf_counter() - start)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+                errors += 1
+                if connection is not None:
+                    connection[1].close()
+                connection = None
+
+    await asyncio.gather(*(loop() for _ in range(concurrency)))
+    return np.array(latencies), errors
+
+
+def run(name, command, args, env):
+    port = free_port()
+    command = [part.replace('{port}', str(port)) for part in command]
+    server = subprocess.Popen(command, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_ready(port)
+        latencies, errors = asyncio.run(drive(port, args.concurrency, args.duration, args.keep_alive))
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=60)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    if not len(latencies):
+        print(f"{name:<8} no successful requests ({errors} errors)")
+        return
+    p50, p99, p999 = np.percentile(latencies, [50, 99, 99.9]) * 1000
+    print(f"{name:<8} {len(latencies) / args.duration:>9.1f} {p50:>9.1f} {p99:>9.1f} {p999:>9.1f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=1000)
+    parser.add_argument('--latency-ms', type=float, default=100)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8, help='threads per Flask worker')
+    parser.add_argument('--keep-alive', action='store_true',
+                        help='reuse connections (pins Flask threads to idle connections)')
+    parser.add_argument('--only', choices=['flask', 'asgi'])
+    args = parser.parse_args()
+
+    env = dict(os.environ, AGRIWISE_WEATHER_LATENCY_MS=str(args.latency_ms),
+               AGRIWISE_INFERENCE_PROCESSES='1', PYTHONWARNINGS='ignore')
+    servers = {
+        'flask': [sys.executable, 'serve.py', '--host', '127.0.0.1', '--port', '{port}',
+                  '--workers', str(args.workers), '--threads', str(args.threads), '--backlog', '4096'],
+        'asgi': [sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', '{port}',
+                 '--workers', str(args.workers), '--log-level', 'warning', '--backlog', '4096'],
+    }
+
+    print(f"concurrency={args.concurrency} injected latency={args.latency_ms:g}ms workers={args.workers} "
+          f"flask threads={args.threads} keep-alive={args.keep_alive} duration={args.duration:g}s")
+    print(f"{'server':<8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'p99.9 ms':>9} {'errors':>7}")
+    for name, command in servers.items():
+        if args.only in (None, name):
+            run(name, command, args, env)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""CNN classifier latency by batch size, and micro-batching under concurrency
+
+    python benchmarks/bench_cnn_engine.py [--model path.onnx] [--clients 16] [--threads 1]
+
+Without ``--model`` a demo CNN (fp32 and int8) is written to a temporary
+directory. Needs onnxruntime and onnx.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import vision  # noqa: E402
+from batching import MicroBatcher  # noqa: E402
+
+
+def per_image_ms(classifier, batch, repeat):
+    classifier.predict_proba(batch)  # warm-up
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        classifier.predict_proba(batch)
+        timings.append(time.perf_counter() - start)
+    return min(timings) / len(batch) * 1000
+
+
+def concurrent_run(classify, images, clients, requests):
+    """``clients`` threads each classify ``requests`` single images; returns (img/s, p50 ms, p99 ms)"""
+    latencies = []
+    lock = threading.Lock()
+
+    def client(offset):
+        mine = []
+        for i in range(requests):
+            start = time.perf_counter()
+            classify(images[(offset + i) % len(images)])
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (len(latencies) / elapsed,
+            statistics.median(latencies) * 1000,
+            latencies[int(len(latencies) * 0.99) - 1] * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', action='append', help='ONNX/TorchScript model (repeatable)')
+    parser.add_argument('--threads', type=int, default=vision.intra_op_threads(), help='intra-op threads')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=20, help='requests per client')
+    parser.add_argument('--max-batch', type=int, default=32)
+    parser.add_argument('--wait-ms', type=float, default=2)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    models = args.model
+    if not models:
+        directory = tempfile.mkdtemp(prefix='agriwise-cnn-')
+        fp32 = vision.build_demo_model(os.path.join(directory, 'demo.onnx'))
+        models = [fp32, vision.quantize(fp32, os.path.join(directory, 'demo.int8.onnx'))]
+
+    rng = np.random.default_rng(0)
+    images = rng.integers(0, 256, (max(args.sizes + [64]), vision.INPUT_SIZE, vision.INPUT_SIZE, 3), dtype=np.uint8)
+
+    for path in models:
+        classifier = vision.load_classifier(path, threads=args.threads)
+        print(f'\n{os.path.basename(path)} ({os.path.getsize(path) / 1024:.0f} KiB, {args.threads} intra-op threads)')
+        print(f'{"batch":>6} {"ms/img":>8} {"img/s":>8}')
+        for size in args.sizes:
+            ms = per_image_ms(classifier, images[:size], args.repeat)
+            print(f'{size:>6} {ms:>8.2f} {1000 / ms:>8.0f}')
+
+        batcher = MicroBatcher(lambda items: classifier.predict_proba(np.stack(items)),
+                               max_batch=args.max_batch, max_wait=args.wait_ms / 1000)
+        print(f'{args.clients} concurrent clients x {args.requests} single-image requests')
+        print(f'{"mode":>12} {"img/s":>8} {"p50 ms":>8} {"p99 ms":>8}')
+        for mode, classify in (('direct', lambda image: classifier.predict_proba(image[np.newaxis])),
+                               ('micro-batch', batcher)):
+            rate, p50, p99 = concurrent_run(classify, images, args.clients, args.requests)
+            print(f'{mode:>12} {rate:>8.0f} {p50:>8.1f} {p99:>8.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""Cold-start benchmark: in-process training vs. memory-mapped model artifacts
+
+Each run starts a fresh interpreter, imports ``app``, serves one request through
+the Flask test client and reports time-to-first-request plus the worker's RSS
+and PSS (proportional set size, which credits shared page-cache pages to each
+process sharing them).
+
+    python benchmarks/bench_cold_start.py [--runs 3] [--workers 4]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+WORKER = r'''
+import json, time
+start = time.perf_counter()
+import app
+client = app.app.test_client()
+response = client.post('/api/loan-assessment', json={'monthly_income': 4000, 'credit_score': 650})
+assert response.status_code == 200, response.data
+elapsed = time.perf_counter() - start
+
+def read_kb(path, field):
+    try:
+        with open(path) as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+print(json.dumps({
+    'first_request_s': elapsed,
+    'rss_kb': read_kb('/proc/self/status', 'VmRSS'),
+    'pss_kb': read_kb('/proc/self/smaps_rollup', 'Pss'),
+    'model_version': app.ai_system.model_version,
+}))
+if {hold}:
+    input()
+'''
+
+
+def _read_result(proc):
+    """Skip whatever app prints while starting and parse the JSON result line"""
+    for line in proc.stdout:
+        if line.startswith('{'):
+            return json.loads(line)
+    raise RuntimeError('worker exited without reporting')
+
+
+def run_workers(model_dir, workers):
+    """Start `workers` interpreters together and collect their measurements"""
+    env = dict(os.environ, AGRIWISE_MODEL_DIR=model_dir)
+    hold = workers > 1
+    procs = [
+        subprocess.Popen(
+            [sys.executable, '-c', WORKER.replace('{hold}', str(hold))],
+            cwd=ROOT, env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True
+        )
+        for _ in range(workers)
+    ]
+    # Keep every worker alive until all have reported so PSS reflects the sharing
+    results = [_read_result(proc) for proc in procs]
+    for proc in procs:
+        proc.communicate('\n' if hold else None)
+    return results
+
+
+def summarize(label, results):
+    first = sorted(r['first_request_s'] for r in results)
+    rss = [r['rss_kb'] for r in results if r['rss_kb']]
+    pss = [r['pss_kb'] for r in results if r['pss_kb']]
+    line = f'{label:<10} first-request median {first[len(first) // 2] * 1000:8.1f} ms'
+    if rss:
+        line += f'   RSS {sum(rss) / len(rss) / 1024:7.1f} MiB/worker'
+    if pss:
+        line += f'   PSS {sum(pss) / len(pss) / 1024:7.1f} MiB/worker'
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='cold starts per mode')
+    parser.add_argument('--workers', type=int, default=4, help='concurrent workers for the sharing run')
+    args = parser.parse_args()
+
+    import model_registry
+
+    with tempfile.TemporaryDirectory() as empty_dir, tempfile.TemporaryDirectory() as artifact_dir:
+        model_registry.build_models(artifact_dir)
+
+        print(f'== sequential cold starts ({args.runs} runs) ==')
+        for label, model_dir in (('train', empty_dir), ('registry', artifact_dir)):
+            results = []
+            for _ in range(args.runs):
+                results.extend(run_workers(model_dir, 1))
+            summarize(label, results)
+
+        print(f'== {args.workers} concurrent workers ==')
+        for label, model_dir in (('train', empty_dir), ('registry', artifact_dir)):
+            started = time.perf_counter()
+            results = run_workers(model_dir, args.workers)
+            summarize(label, results)
+            print(f'{"":<10} all workers ready after {(time.perf_counter() - started) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
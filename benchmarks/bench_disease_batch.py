@@ -0,0 +1,66 @@
+"""Throughput of per-image vs. batched crop disease detection
+
+    python benchmarks/bench_disease_batch.py [--sizes 1 16 128] [--width 1024]
+"""
+import argparse
+import base64
+import io
+import os
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synthetic_leaf_images(count, width, height, seed=0):
+    """Base64 data-URL JPEGs with leaf-like green gradients and blotches"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width]
+    images = []
+    for _ in range(count):
+        base = np.stack([
+            40 + 60 * x / width,
+            120 + 80 * y / height,
+            30 + 20 * rng.random((height, width)),
+        ], axis=-1)
+        base += rng.normal(0, 12, base.shape)
+        buffer = io.BytesIO()
+        Image.fromarray(np.clip(base, 0, 255).astype(np.uint8)).save(buffer, 'JPEG', quality=85)
+        images.append('data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode())
+    return images
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 16, 128])
+    parser.add_argument('--width', type=int, default=1024)
+    parser.add_argument('--height', type=int, default=768)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from app import ai_system
+
+    images = synthetic_leaf_images(max(args.sizes), args.width, args.height)
+    print(f'{args.width}x{args.height} JPEGs, best of {args.repeat}')
+    print(f'{"N":>5} {"single img/s":>14} {"batch img/s":>13} {"speedup":>8}')
+    for n in args.sizes:
+        subset = images[:n]
+        single = best_of(args.repeat, lambda: [ai_system.predict_crop_disease(image) for image in subset])
+        batch = best_of(args.repeat, lambda: ai_system.predict_crop_disease_batch(subset))
+        print(f'{n:>5} {n / single:>14.1f} {n / batch:>13.1f} {single / batch:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""sklearn vs. compiled forest inference at batch sizes 1, 64 and 10k
+
+    python benchmarks/bench_forest_compiler.py [--sizes 1 64 10000] [--models loan crop_disease]
+
+Uses the active registry version (run `python model_registry.py build` or
+`compile` first). Every timed call is also checked for bit-identical output.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import forest_compiler  # noqa: E402
+import model_registry  # noqa: E402
+
+
+def per_call_ms(fn, min_seconds=0.5):
+    fn()  # warm-up
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds:
+            return elapsed / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 64, 10000])
+    parser.add_argument('--models', nargs='+', default=['loan', 'crop_disease'])
+    parser.add_argument('--model-dir', default=model_registry.MODEL_DIR)
+    args = parser.parse_args()
+
+    version, models = model_registry.load_models(args.model_dir, runtime='sklearn')
+    rng = np.random.default_rng(0)
+    print(f'model version {version}')
+    print(f'{"model":>13} {"batch":>6} {"sklearn ms":>11} {"numpy ms":>9} {"served ms":>10} {"speedup":>8}')
+    for name in args.models:
+        model = models[name]
+        with tempfile.TemporaryDirectory() as directory:
+            path = forest_compiler.compile_forest(model).save(os.path.join(directory, f'{name}.forest'))
+            start = time.perf_counter()
+            pure = forest_compiler.CompiledForest.load(path)
+            load_ms = (time.perf_counter() - start) * 1000
+            served = forest_compiler.CompiledForest.load(path, fallback=model)
+
+            for size in args.sizes:
+                X = rng.random((size, model.n_features_in_))
+                forest_compiler.verify(model, pure, X)
+                baseline = per_call_ms(lambda: model.predict_proba(X))
+                numpy_ms = per_call_ms(lambda: pure.predict_proba(X))
+                served_ms = per_call_ms(lambda: served.predict_proba(X))
+                print(f'{name:>13} {size:>6} {baseline:>11.3f} {numpy_ms:>9.3f} {served_ms:>10.3f} '
+                      f'{baseline / served_ms:>7.1f}x')
+            print(f'{name:>13} {pure.node_count} nodes, {os.path.getsize(path) / 1e6:.1f} MB, '
+                  f'mmap load {load_ms:.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
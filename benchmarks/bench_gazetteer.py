@@ -0,0 +1,85 @@
+"""Gazetteer lookup latency, and forecast cache hit rate per location string vs. per grid cell
+
+    python benchmarks/bench_gazetteer.py [--requests 20000] [--towns 40]
+
+The request stream asks for ``--towns`` towns the way farmers type them:
+varying case and spacing, "<town>, Kenya", one-letter typos and GPS fixes
+within a few km of the town. "per string" is the old cache key (the
+normalized text); "per cell" is the gazetteer's grid cell. Hit rates assume
+a cache large enough to hold every key.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def per_call(function, *args, number=2000):
+    start = time.perf_counter()
+    for _ in range(number):
+        function(*args)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def typo(name, rng):
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice('aeiourstn') + name[i + 1:]
+
+
+def request_stream(towns, count, rng):
+    """Free-text locations for ``count`` requests spread over ``towns``"""
+    variants = [
+        lambda town: town.name,
+        lambda town: town.name.lower(),
+        lambda town: f'  {town.name.upper()} ',
+        lambda town: f'{town.name}, Kenya',
+        lambda town: typo(town.name, rng),
+        lambda town: f'{town.lat + rng.uniform(-0.03, 0.03):.5f},{town.lon + rng.uniform(-0.03, 0.03):.5f}',
+    ]
+    return [rng.choice(variants)(rng.choice(towns)) for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--towns', type=int, default=40)
+    args = parser.parse_args()
+
+    from gazetteer import Gazetteer
+    from weather import normalize_location
+
+    start = time.perf_counter()
+    gazetteer = Gazetteer.load()
+    print(f'load {len(gazetteer.places)} places: {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    uncached = gazetteer._resolve
+    rows = [
+        ('resolve, exact name', per_call(uncached, 'Nairobi')),
+        ('resolve, "town, country"', per_call(uncached, 'Nakuru, Kenya')),
+        ('resolve, one typo', per_call(uncached, 'Nairbi', number=200)),
+        ('resolve, "lat,lon"', per_call(uncached, '-1.2921,36.8219')),
+        ('resolve, repeated (cached)', per_call(gazetteer.resolve, 'Nairbi')),
+        ('autocomplete "Ki"', per_call(gazetteer.complete, 'Ki')),
+        ('nearest town', per_call(gazetteer.nearest, -0.9, 36.9, 'town')),
+        ('nearest 5 markets', per_call(gazetteer.nearest, -0.9, 36.9, 'market', 5)),
+    ]
+    for label, micros in rows:
+        print(f'{label:<30} {micros:>9.1f} us')
+
+    rng = random.Random(0)
+    towns = rng.sample([place for place in gazetteer.places if place.kind == 'town'], args.towns)
+    stream = request_stream(towns, args.requests, rng)
+    for label, key in [
+        ('per string', normalize_location),
+        ('per cell', lambda text: getattr(gazetteer.resolve(text), 'cell', normalize_location(text))),
+    ]:
+        keys = [key(text) for text in stream]
+        distinct = len(set(keys))
+        print(f'{label:<10} {distinct:>7} keys  hit rate {1 - distinct / len(keys):.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Bulk loan scoring throughput: per-row calls vs. the streaming batch endpoint
+
+    python benchmarks/bench_loan_batch.py [--rows 10000 1000000] [--format ndjson|csv]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+COLUMNS = ['monthly_income', 'land_size', 'crop_yield', 'credit_score', 'age', 'farming_experience']
+
+
+def synthetic_applicants(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.column_stack([
+        rng.uniform(0, 20000, n).round(0),
+        rng.uniform(0, 10, n).round(1),
+        rng.uniform(0, 3000, n).round(0),
+        rng.integers(300, 851, n),
+        rng.integers(18, 81, n),
+        rng.integers(0, 41, n),
+    ])
+
+
+def encode(matrix, fmt):
+    rows = matrix.tolist()
+    if fmt == 'csv':
+        lines = ['id,' + ','.join(COLUMNS)]
+        lines.extend(f'f{i},' + ','.join(f'{v:g}' for v in row) for i, row in enumerate(rows))
+        return ('\n'.join(lines) + '\n').encode(), 'text/csv'
+    lines = [json.dumps(dict(zip(COLUMNS, row), id=f'f{i}')) for i, row in enumerate(rows)]
+    return ('\n'.join(lines) + '\n').encode(), 'application/x-ndjson'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 1000000])
+    parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+    parser.add_argument('--single-sample', type=int, default=500,
+                        help='per-row calls timed to extrapolate the unbatched rate')
+    args = parser.parse_args()
+
+    import app
+
+    client = app.app.test_client()
+    matrix = synthetic_applicants(args.single_sample)
+    records = [dict(zip(COLUMNS, row)) for row in matrix.tolist()]
+    start = time.perf_counter()
+    for record in records:
+        app.ai_system.assess_loan_eligibility(record)
+    single_rate = len(records) / (time.perf_counter() - start)
+    print(f'per-row assess_loan_eligibility: {single_rate:,.0f} rows/s')
+
+    print(f'{"rows":>10} {"body MB":>8} {"seconds":>8} {"rows/s":>10} {"vs per-row":>10}')
+    for n in args.rows:
+        body, content_type = encode(synthetic_applicants(n), args.format)
+        start = time.perf_counter()
+        response = client.post('/api/loan-assessment/batch', data=body, content_type=content_type, buffered=False)
+        count = sum(chunk.count(b'\n') for chunk in response.response)
+        elapsed = time.perf_counter() - start
+        assert count == n, (count, n)
+        print(f'{n:>10,} {len(body) / 1e6:>8.1f} {elapsed:>8.2f} {n / elapsed:>10,.0f} {n / elapsed / single_rate:>9.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Cost of the metrics middleware and stage timers per request
+
+Times the WSGI wrapper and route hook in isolation, and whole requests
+through Flask on an instrumented vs. a bare app.
+
+    python benchmarks/bench_metrics_overhead.py [--iterations 200000]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify  # noqa: E402
+from werkzeug.test import EnvironBuilder  # noqa: E402
+
+import metrics  # noqa: E402
+
+
+def make_app(instrumented):
+    app = Flask(__name__)
+    if instrumented:
+        metrics.instrument(app, metrics.Registry())
+
+    @app.route('/ping', methods=['POST'])
+    def ping():
+        return jsonify({'ok': True})
+
+    return app
+
+
+def per_call(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    # The WSGI wrapper around a no-op inner app, plus the route hook run alone
+    app = Flask(__name__)
+    app.wsgi_app = lambda environ, start_response: start_response('200 OK', [('Content-Length', '12')]) or [b'{"ok": true}']
+    metrics.instrument(app, metrics.Registry())
+    after, = app.after_request_funcs[None]
+    environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': '2', 'agriwise.route': '/ping'}
+    wrapper_cost = per_call(lambda: app.wsgi_app(environ, lambda status, headers, exc_info=None: None), args.iterations)
+
+    routed = make_app(True)
+    after, = routed.after_request_funcs[None]
+    with routed.test_request_context('/ping', method='POST', data=b'{}', content_type='application/json') as ctx:
+        ctx.request.url_rule = routed.url_map._rules_by_endpoint['ping'][0]
+        response = routed.make_response(jsonify({'ok': True}))
+        hook_cost = per_call(lambda: after(response), args.iterations)
+
+    def timed_stage():
+        with metrics.stage('bench'):
+            pass
+
+    stage_cost = per_call(timed_stage, args.iterations)
+    observe_cost = per_call(lambda: metrics.STAGE_SECONDS.labels('bench').observe(0.001), args.iterations)
+
+    # End to end through Flask, calling the WSGI app directly; interleaved
+    # rounds and the best round per variant, since scheduling noise is larger
+    # than the difference being measured
+    environ = EnvironBuilder('/ping', method='POST', data=b'{}', content_type='application/json').get_environ()
+    results = {}
+    for instrumented in (False, True) * 5:
+        flask_app = make_app(instrumented)
+
+        def call():
+            request_environ = dict(environ, **{'wsgi.input': io.BytesIO(b'{}')})
+            body = flask_app(request_environ, lambda status, headers, exc_info=None: None)
+            b''.join(body)
+            body.close()
+
+        cost = per_call(call, args.requests)
+        results[instrumented] = min(cost, results.get(instrumented, cost))
+
+    print(f"WSGI wrapper             {wrapper_cost * 1e6:7.2f} us/request")
+    print(f"route hook               {hook_cost * 1e6:7.2f} us/request")
+    print(f"stage timer (with block) {stage_cost * 1e6:7.2f} us/stage")
+    print(f"histogram observe        {observe_cost * 1e6:7.2f} us/call")
+    print(f"Flask request, bare      {results[False] * 1e6:7.1f} us/request")
+    print(f"Flask request, metrics   {results[True] * 1e6:7.1f} us/request  "
+          f"({(results[True] - results[False]) * 1e6:+.1f} us)")
+
+    registry = metrics.Registry()
+    hist = registry.histogram('bench_seconds', 'bench', ('route',))
+    for i in range(50):
+        for _ in range(100):
+            hist.labels(f'/r{i}').observe(0.01)
+    render_cost = per_call(registry.render, 200)
+    print(f"render 50 histograms     {render_cost * 1e3:7.2f} ms/scrape")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Throughput vs. added latency of micro-batched model calls
+
+    python benchmarks/bench_microbatch.py [--clients 1 8 32] [--wait-ms 0 1 2 5] [--model loan disease]
+
+Each client thread sends single-item requests back to back. "direct" calls
+the model once per request in the client's own thread; the other rows go
+through the model's MicroBatcher with the given max wait.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def run_clients(call, items, clients, duration):
+    """Call ``call(item)`` from ``clients`` threads for ``duration`` seconds"""
+    latencies = []
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def client(offset):
+        mine = []
+        i = offset
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            call(items[i % len(items)])
+            mine.append(time.perf_counter() - start)
+            i += clients
+        with lock:
+            latencies.extend(mine)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return len(latencies) / elapsed, statistics.median(latencies), latencies[max(0, int(len(latencies) * 0.99) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--model', nargs='+', default=['loan', 'disease'], choices=['loan', 'disease'])
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--wait-ms', type=float, nargs='+', default=[0, 1, 2, 5])
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds per measurement')
+    args = parser.parse_args()
+
+    import batching
+    from app import ai_system
+
+    rng = np.random.default_rng(0)
+    models = ai_system.models
+    setups = {
+        'loan': (
+            models.loan_batcher,
+            lambda row: ai_system._assess_loan_rows([row], models),
+            list(ai_system._loan_features([
+                {'monthly_income': float(rng.uniform(200, 5000)), 'land_size': float(rng.uniform(0.5, 20)),
+                 'credit_score': float(rng.uniform(400, 850)), 'farming_experience': float(rng.uniform(0, 30))}
+                for _ in range(256)
+            ])),
+        ),
+        'disease': (
+            models.disease_batcher,
+            lambda image: ai_system._classify_images([image], models),
+            list(rng.integers(0, 256, (64, 224, 224, 3), dtype=np.uint8)),
+        ),
+    }
+
+    print(f'{"model":>8} {"clients":>8} {"mode":>10} {"req/s":>8} {"p50 ms":>8} {"p99 ms":>8} {"avg batch":>10}')
+    for model in args.model:
+        batcher, direct, items = setups[model]
+        sizes = batching.BATCH_SIZE.labels(batcher.name)
+        batcher.max_batch = args.max_batch
+        for clients in args.clients:
+            modes = [('direct', None)] + [(f'wait {wait:g}ms', wait) for wait in args.wait_ms]
+            for mode, wait in modes:
+                if wait is None:
+                    call = direct
+                else:
+                    batcher.max_wait = wait / 1000
+                    call = batcher
+                count, total = sum(sizes.counts), sizes.sum
+                rate, p50, p99 = run_clients(call, items, clients, args.duration)
+                batches = sum(sizes.counts) - count
+                average = f'{(sizes.sum - total) / batches:.1f}' if batches else '-'
+                print(f'{model:>8} {clients:>8} {mode:>10} {rate:>8.0f} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f} {average:>10}')
+
+
+if __name__ == '__main__':
+    main()
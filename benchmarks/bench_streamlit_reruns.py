@@ -0,0 +1,97 @@
+"""Streamlit rerun latency per page, scripted with streamlit.testing's AppTest
+
+    python benchmarks/bench_streamlit_reruns.py [--reruns 20] [--pages weather market]
+
+For each page: "action" is the run in which the page's button is pressed for
+new inputs (for disease detection, until the background analysis has
+finished), "repeat" presses it again with the same inputs, and "rerun" is
+any later rerun, as caused by an unrelated widget. Times are whole script
+runs, in ms; the engine itself is loaded once, before the first page.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGES = {
+    'dashboard': '🏠 Dashboard',
+    'disease': '🔍 Disease Detection',
+    'weather': '🌤️ Weather Prediction',
+    'market': '📊 Market Intelligence',
+    'loans': '💰 Loan Assessment',
+    'voice': '🗣️ Voice Interface',
+}
+
+
+def leaf_jpeg(size=(1600, 1200)):
+    """A phone-camera-sized photo; noise, so neither JPEG nor the preview is trivially small"""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 48).convert('RGB').save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def timed(run):
+    start = time.perf_counter()
+    run()
+    return (time.perf_counter() - start) * 1000
+
+
+def wait_for_analyses(at, timeout=60):
+    """Rerun until no background analysis of the session is still running"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        analyses = at.session_state['analyses'] if 'analyses' in at.session_state else {}
+        if all(analysis.future.done() for analysis in analyses.values()):
+            return at.run()
+        if time.perf_counter() > deadline:
+            raise SystemExit('background analysis did not finish')
+        time.sleep(0.01)
+
+
+def press(at, page, photo):
+    """Press the page's button (after an upload for disease detection); None for pages without one"""
+    if page == 'disease':
+        at.file_uploader[0].set_value(('leaf.jpg', photo, 'image/jpeg')).run()
+    if not at.button:
+        return None
+    at.button[0].click().run()
+    return wait_for_analyses(at) if page == 'disease' else at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--pages', nargs='+', default=list(PAGES), choices=list(PAGES))
+    parser.add_argument('--reruns', type=int, default=20)
+    args = parser.parse_args()
+
+    from streamlit.testing.v1 import AppTest
+
+    photo = leaf_jpeg()
+    at = AppTest.from_file(os.path.join(ROOT, 'streamlit_app.py'), default_timeout=600)
+    print(f'engine load + first run: {timed(at.run):.0f} ms')
+    if at.exception:
+        raise SystemExit(at.exception[0].value)
+
+    print(f'{"page":<10} {"action":>10} {"repeat":>10} {"rerun p50":>10} {"rerun p90":>10}')
+    for page in args.pages:
+        at = AppTest.from_file(os.path.join(ROOT, 'streamlit_app.py'), default_timeout=600).run()
+        at.sidebar.selectbox[0].set_value(PAGES[page]).run()
+        action = timed(lambda: press(at, page, photo))
+        repeat = timed(lambda: press(at, page, photo))
+        reruns = sorted(timed(at.run) for _ in range(args.reruns))
+        if at.exception:
+            raise SystemExit(f'{page}: {at.exception[0].value}')
+        p90 = reruns[max(0, int(len(reruns) * 0.9) - 1)]
+        print(f'{page:<10} {action:>10.1f} {repeat:>10.1f} {statistics.median(reruns):>10.1f} {p90:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
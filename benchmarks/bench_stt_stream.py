@@ -0,0 +1,89 @@
+"""Streaming speech-to-text: real-time factor and memory per concurrent stream
+
+Feeds synthetic 44.1 kHz stereo WAV recordings through the streaming pipeline
+in small chunks, as an upload would arrive. Real-time factor is processing time
+divided by audio duration (below 1.0 keeps up with live audio).
+
+    python benchmarks/bench_stt_stream.py [--seconds 60] [--streams 1 4 8] [--engine energy]
+"""
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import wave
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speech  # noqa: E402
+
+
+def synthetic_wav(seconds, rate=44100, channels=2, seed=0):
+    """Background noise with periodic voiced bursts"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(rate * seconds)) / rate
+    signal = 0.003 * rng.standard_normal(len(t))
+    voiced = (np.sin(2 * np.pi * t / 3.0) > 0.2)
+    signal += voiced * 0.3 * np.sin(2 * np.pi * 180 * t) * np.abs(np.sin(2 * np.pi * 4 * t))
+    pcm = (np.clip(signal, -1, 1) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(np.repeat(pcm[:, None], channels, axis=1).tobytes())
+    return buffer.getvalue()
+
+
+def chunks(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def run_stream(data, engine, chunk, results, index):
+    start = time.perf_counter()
+    final = None
+    for event in speech.transcribe_stream(chunks(data, chunk), engine, 'en', 'audio/wav'):
+        final = event
+    results[index] = (time.perf_counter() - start, final)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--streams', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--chunk', type=int, default=8192, help='upload chunk size in bytes')
+    parser.add_argument('--engine', default='energy', choices=sorted(speech.ENGINES))
+    args = parser.parse_args()
+
+    engine = speech.ENGINES[args.engine]()
+    data = synthetic_wav(args.seconds)
+    print(f"engine={args.engine} audio={args.seconds:g}s wav={len(data) / 1e6:.1f} MB chunk={args.chunk}")
+    print(f"{'streams':>8} {'wall s':>8} {'RTF/stream':>11} {'agg RTF':>8} {'peak KiB/stream':>16}")
+
+    for n in args.streams:
+        results = [None] * n
+        tracemalloc.start()
+        start = time.perf_counter()
+        threads = [threading.Thread(target=run_stream, args=(data, engine, args.chunk, results, i)) for i in range(n)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        per_stream = np.mean([elapsed for elapsed, _ in results]) / args.seconds
+        aggregate = wall / (args.seconds * n)
+        print(f"{n:>8} {wall:>8.2f} {per_stream:>11.4f} {aggregate:>8.4f} {peak / n / 1024:>16.0f}")
+
+    print(f"final result: {results[0][1]}")
+
+
+if __name__ == '__main__':
+    main()
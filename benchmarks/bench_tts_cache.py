@@ -0,0 +1,70 @@
+"""Text-to-speech: cold synthesis vs. cache hits, and Range/304 serving
+
+Uses the offline ``tone`` engine by default so it runs without network access.
+
+    python benchmarks/bench_tts_cache.py [--engine tone] [--phrases 50] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--engine', default='tone')
+    parser.add_argument('--phrases', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix='agriwise-audio-')
+    os.environ['AGRIWISE_AUDIO_CACHE_DIR'] = cache_dir
+    os.environ.setdefault('AGRIWISE_TTS_ENGINES', args.engine)
+    import app
+
+    client = app.app.test_client()
+    phrases = [f'Apply fertilizer to field {i} before the rains begin' for i in range(args.phrases)]
+
+    def post(text):
+        response = client.post('/api/text-to-speech', json={'text': text, 'engine': args.engine})
+        assert response.status_code == 200, response.get_data(as_text=True)
+        return response.get_json()
+
+    start = time.perf_counter()
+    urls = [post(text)['audio_url'] for text in phrases]
+    cold = (time.perf_counter() - start) / len(phrases)
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for text in phrases:
+            post(text)
+    warm = (time.perf_counter() - start) / (len(phrases) * args.repeat)
+
+    start = time.perf_counter()
+    etags = [client.get(url).headers['ETag'] for url in urls]
+    full = (time.perf_counter() - start) / len(urls)
+
+    start = time.perf_counter()
+    for url, etag in zip(urls, etags):
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    not_modified = (time.perf_counter() - start) / len(urls)
+
+    start = time.perf_counter()
+    for url in urls:
+        assert client.get(url, headers={'Range': 'bytes=0-4095'}).status_code == 206
+    ranged = (time.perf_counter() - start) / len(urls)
+
+    print(f"engine={args.engine} phrases={len(phrases)} cache_dir={cache_dir}")
+    print(f"  synthesize (miss)   {cold * 1000:8.2f} ms/request")
+    print(f"  cached (hit)        {warm * 1000:8.2f} ms/request  ({cold / warm:.1f}x)")
+    print(f"  GET full file       {full * 1000:8.2f} ms/request")
+    print(f"  GET 304             {not_modified * 1000:8.2f} ms/request")
+    print(f"  GET Range 4 KiB     {ranged * 1000:8.2f} ms/request")
+    print(f"  cache stats         {app.audio_cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Peak memory and latency of /api/disease-detection per upload encoding
+
+Sends the same 12 MP JPEG as base64 JSON, multipart/form-data and a raw
+image/jpeg body. Each encoding runs in its own interpreter so the peak RSS
+growth (VmHWM after a reset via /proc/self/clear_refs) is not shared.
+
+    python benchmarks/bench_upload_paths.py [--width 4000 --height 3000] [--requests 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import base64, json, statistics, sys, time, tracemalloc
+import app
+
+path, mode, requests = sys.argv[1], sys.argv[2], int(sys.argv[3])
+with open(path, 'rb') as f:
+    jpeg = f.read()
+
+# Build each request body up front so only server-side handling is measured
+if mode == 'json':
+    body = json.dumps({'image': 'data:image/jpeg;base64,' + base64.b64encode(jpeg).decode()}).encode()
+    content_type = 'application/json'
+elif mode == 'multipart':
+    boundary = 'agriwise-bench'
+    body = (
+        f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="leaf.jpg"\r\n'
+        f'Content-Type: image/jpeg\r\n\r\n'
+    ).encode() + jpeg + f'\r\n--{boundary}--\r\n'.encode()
+    content_type = f'multipart/form-data; boundary={boundary}'
+else:
+    body = jpeg
+    content_type = 'image/jpeg'
+
+client = app.app.test_client()
+
+def post():
+    response = client.post('/api/disease-detection', data=body, content_type=content_type)
+    assert response.status_code == 200 and 'disease' in response.json, response.data
+
+def status(field):
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+
+post()  # warm up lazy imports and buffers
+
+latencies = []
+peaks = []
+traced = []
+for _ in range(requests):
+    with open('/proc/self/clear_refs', 'w') as f:
+        f.write('5')  # reset VmHWM to the current RSS
+    before = status('VmRSS')
+    tracemalloc.start()
+    start = time.perf_counter()
+    post()
+    latencies.append(time.perf_counter() - start)
+    traced.append(tracemalloc.get_traced_memory()[1])
+    tracemalloc.stop()
+    peaks.append(status('VmHWM') - before)
+
+print(json.dumps({
+    'wire_bytes': len(body),
+    'latency_ms': statistics.median(latencies) * 1000,
+    'peak_rss_kb': max(peaks),
+    'peak_traced_kb': max(traced) / 1024,
+}))
+'''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--requests', type=int, default=5)
+    args = parser.parse_args()
+
+    import numpy as np
+    from PIL import Image
+
+    y, x = np.mgrid[0:args.height, 0:args.width]
+    pixels = np.stack([40 + 60 * x / args.width, 120 + 80 * y / args.height, 50 + 0 * x], axis=-1)
+    pixels += np.random.default_rng(0).normal(0, 10, pixels.shape)
+
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as photo:
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(photo.name, 'JPEG', quality=90)
+        del pixels, x, y
+        print(f'{args.width}x{args.height} JPEG, {os.path.getsize(photo.name) / 1e6:.1f} MB, '
+              f'median of {args.requests} requests')
+        print(f'{"path":<10} {"wire MB":>8} {"latency ms":>11} {"peak RSS MiB":>13} {"peak py MiB":>12}')
+        for mode in ('json', 'multipart', 'raw'):
+            completed = subprocess.run(
+                [sys.executable, '-c', PROBE, photo.name, mode, str(args.requests)],
+                cwd=ROOT, capture_output=True, text=True
+            )
+            if completed.returncode != 0:
+                raise SystemExit(completed.stderr)
+            r = json.loads(completed.stdout.strip().splitlines()[-1])
+            print(f'{mode:<10} {r["wire_bytes"] / 1e6:>8.1f} {r["latency_ms"]:>11.1f} '
+                  f'{r["peak_rss_kb"] / 1024:>13.1f} {r["peak_traced_kb"] / 1024:>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
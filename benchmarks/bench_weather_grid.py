@@ -0,0 +1,77 @@
+"""Gridded weather: tile build time, and point queries from tiles vs. the provider
+
+    python benchmarks/bench_weather_grid.py [--points 1 100 1000] [--latency-ms 0]
+
+Builds the region tiles into a temporary directory from the local provider,
+then times ``forecast_fields`` for random points in Kenya asked of the
+provider directly and of the tiles (bilinear between grid points). With
+``--latency-ms`` the provider stands in for a remote service, as
+``AGRIWISE_WEATHER_LATENCY_MS`` does for the API. Also times a one-day map
+slice as served by ``GET /api/weather-map``.
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def per_call(function, *args, number=20):
+    start = time.perf_counter()
+    for _ in range(number):
+        function(*args)
+    return (time.perf_counter() - start) / number * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, nargs='+', default=[1, 100, 1000])
+    parser.add_argument('--latency-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    import numpy as np
+
+    from gazetteer import format_point
+    from weather import DelayedProvider, LocalWeatherProvider
+    from weather_grid import REGIONS, GriddedWeatherProvider, WeatherGrid, build_tile
+
+    grid_dir = tempfile.mkdtemp(prefix='agriwise-grid-')
+    try:
+        today = date.today()
+        provider = LocalWeatherProvider()
+        if args.latency_ms:
+            provider = DelayedProvider(provider, args.latency_ms / 1000)
+        for region in REGIONS:
+            start = time.perf_counter()
+            meta = build_tile(region, provider, today, grid_dir=grid_dir)
+            days, nlat, nlon = meta['shape']
+            print(f'build {region}: {nlat}x{nlon} points x {days} days '
+                  f'in {(time.perf_counter() - start) * 1000:.0f} ms')
+
+        gridded = GriddedWeatherProvider(WeatherGrid(grid_dir), provider)
+        rng = random.Random(0)
+        print(f'{"points":>7} {"provider ms":>12} {"grid ms":>10} {"max diff at nodes":>18}')
+        for count in args.points:
+            points = [format_point(rng.uniform(-4.5, 4.5), rng.uniform(34.0, 41.5)) for _ in range(count)]
+            direct = per_call(provider.forecast_fields, points, today)
+            tiles = per_call(gridded.forecast_fields, points, today)
+            # Grid points themselves must come back exactly as the provider made them
+            nodes = [format_point(round(rng.randint(-16, 16) * 0.25, 6), round(rng.randint(136, 166) * 0.25, 6))
+                     for _ in range(count)]
+            expected, got = provider.forecast_fields(nodes, today), gridded.forecast_fields(nodes, today)
+            diff = max(float(np.abs(expected[name] - got[name]).max()) for name in expected)
+            print(f'{count:>7} {direct:>12.2f} {tiles:>10.2f} {diff:>18.4f}')
+
+        bounds = (-5.0, 5.0, 33.5, 42.0)
+        print(f'map slice, Kenya, one day: {per_call(gridded.grid.map, today, 1, bounds):.2f} ms')
+    finally:
+        shutil.rmtree(grid_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Bytes on the wire per request, before and after compression and conditional GET
+
+    python benchmarks/bench_wire_bytes.py [--encodings gzip br]
+
+"before" is what every request cost without the response layer: identity
+bodies, no validators, so a repeat visit downloads everything again. The
+other columns negotiate each coding; "repeat" is a second visit by a client
+that kept the first visit's responses: it revalidates with If-None-Match and
+does not request fingerprinted static assets at all. Counts are status line,
+headers and body, as sent by the Flask app.
+"""
+import argparse
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# One dashboard visit: the page, its image, then one call per card
+VISIT = [
+    ('GET', '/', None),
+    ('GET', 'image', None),
+    ('GET', '/api/reference', None),
+    ('GET', '/api/sync?region=Nairobi', None),
+    ('POST', '/api/weather-prediction', {'location': 'Nairobi'}),
+    ('POST', '/api/market-prices', {'crop_type': 'tomato'}),
+    ('GET', '/api/market-prices/history?crop=tomato', None),
+    ('POST', '/api/loan-assessment', {'monthly_income': 1200, 'land_size': 3, 'credit_score': 640}),
+]
+
+
+def wire_bytes(response):
+    head = len(f'HTTP/1.1 {response.status}\r\n') + 2
+    head += sum(len(name) + len(value) + 4 for name, value in response.headers.items())
+    return head + len(response.get_data())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--encodings', nargs='+', default=['gzip', 'br'])
+    args = parser.parse_args()
+
+    import http_caching
+    from app import app
+
+    encodings = [e for e in args.encodings if e in http_caching.ENCODINGS]
+    client = app.test_client()
+    page = client.get('/').get_data(as_text=True)
+    fingerprinted = re.search(r'src="(/static/images/[^"]+)"', page).group(1)
+
+    def fetch(method, path, payload, headers, image):
+        if path == 'image':
+            path = image
+        response = client.open(path, method=method, json=payload, headers=headers)
+        size = wire_bytes(response)
+        response.close()
+        return response, size
+
+    columns = ['before'] + encodings + [f'repeat {e}' for e in encodings]
+    print(f'{"request":<44}' + ''.join(f'{c:>12}' for c in columns))
+    totals = dict.fromkeys(columns, 0)
+    text = dict.fromkeys(columns, 0)  # without the (already compressed) JPEG
+    for method, path, payload in VISIT:
+        label = f'{method} {fingerprinted if path == "image" else path}'
+        row = {}
+        _, row['before'] = fetch(method, path, payload, {'Accept-Encoding': 'identity'}, '/static/images/happy2.jpg')
+        for encoding in encodings:
+            response, row[encoding] = fetch(method, path, payload, {'Accept-Encoding': encoding}, fingerprinted)
+            etag = response.headers.get('ETag')
+            if path == 'image':
+                row[f'repeat {encoding}'] = 0  # immutable: served from the browser cache
+            elif etag and method == 'GET':
+                _, row[f'repeat {encoding}'] = fetch(method, path, payload,
+                                                     {'Accept-Encoding': encoding, 'If-None-Match': etag}, fingerprinted)
+            else:
+                row[f'repeat {encoding}'] = row[encoding]
+        for column in columns:
+            totals[column] += row[column]
+            if path != 'image':
+                text[column] += row[column]
+        print(f'{label[:44]:<44}' + ''.join(f'{row[c]:>12,}' for c in columns))
+
+    print(f'{"total":<44}' + ''.join(f'{totals[c]:>12,}' for c in columns))
+    print(f'{"total without the image":<44}' + ''.join(f'{text[c]:>12,}' for c in columns))
+    for encoding in encodings:
+        print(f'{encoding}: first visit {totals[encoding] / totals["before"]:.1%} of before '
+              f'({text[encoding] / text["before"]:.1%} without the image), '
+              f'repeat visit {totals[f"repeat {encoding}"] / totals["before"]:.1%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Requests/sec of serve.py as the worker count grows
+
+Starts the prefork server with each worker count in turn and drives it from
+several client processes over keep-alive connections.
+
+    python benchmarks/load_test.py [--workers 1 2 4] [--connections 16] [--duration 10]
+                                   [--endpoint loan|weather|market]
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = {
+    'loan': ('/api/loan-assessment', {'monthly_income': 8000, 'land_size': 3, 'credit_score': 720}),
+    'weather': ('/api/weather-prediction', {'location': 'Nakuru'}),
+    'market': ('/api/market-prices', {'crop': 'maize'}),
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/api/cache-stats')
+            if conn.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError('server did not start')
+
+
+def client_process(port, path, body, threads, duration, queue):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def run():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        local = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.request('POST', path, body, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    raise OSError(response.status)
+                local.append(time.perf_counter() - start)
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    queue.put((latencies, errors[0]))
+
+
+def measure(workers, args):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, 'serve.py', '--port', str(port), '--host', '127.0.0.1',
+         '--workers', str(workers), '--threads', str(args.threads)],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(port)
+        path, payload = ENDPOINTS[args.endpoint]
+        body = json.dumps(payload)
+        queue = multiprocessing.Queue()
+        per_client = max(1, args.connections // args.clients)
+        clients = [multiprocessing.Process(target=client_process, args=(port, path, body, per_client, args.duration, queue))
+                   for _ in range(args.clients)]
+        for client in clients:
+            client.start()
+        results = [queue.get() for _ in clients]
+        for client in clients:
+            client.join()
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=60)
+
+    latencies = np.array([latency for result, _ in results for latency in result])
+    errors = sum(error for _, error in results)
+    return len(latencies) / args.duration, np.percentile(latencies, 50), np.percentile(latencies, 99), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--threads', type=int, default=8, help='threads per server worker')
+    parser.add_argument('--connections', type=int, default=16)
+    parser.add_argument('--clients', type=int, default=2, help='load-generating processes')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='loan')
+    args = parser.parse_args()
+
+    print(f"cpus={os.cpu_count()} endpoint={args.endpoint} connections={args.connections} duration={args.duration:g}s")
+    print(f"{'workers':>8} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'scaling':>8}")
+    baseline = None
+    for workers in args.workers:
+        rate, p50, p99, errors = measure(workers, args)
+        baseline = baseline or rate
+        print(f"{workers:>8} {rate:>9.1f} {p50 * 1000:>8.2f} {p99 * 1000:>8.2f} {errors:>7} {rate / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,480 @@
+"""Benchmark suite: AgriWiseAI methods in-process and every Flask route through the test client
+
+    python benchmarks/suite.py list [-k REGEX]
+    python benchmarks/suite.py run [-k REGEX] [--repeat 7] [--sample-time 0.05] [--output FILE]
+    python benchmarks/suite.py compare BASE HEAD [--threshold 0.10]
+
+``run`` times each benchmark asv-style: one warm-up call, then ``--repeat``
+samples of as many calls as fill ``--sample-time``, and writes per-call
+statistics to ``data/benchmarks/<commit>.json`` (``<commit>-dirty.json`` when
+the tree has uncommitted changes).
+
+``compare`` takes two result files, or two commits that have results, prints
+the change of every benchmark and exits with status 1 when one got slower by
+more than ``--threshold``. Both the median and the fastest sample must have
+slowed down, so one noisy sample does not fail a build.
+
+Fixtures are synthetic: leaf photos at several sizes, farmer records,
+locations, a WAV recording, a seeded market history and weather tiles built
+from the local provider. Unless already set in the environment, the
+prediction and weather caches are disabled and micro-batches do not wait for
+company, so repeated calls measure the work itself. The settings in effect are stored with the results.
+"""
+import argparse
+import base64
+import functools
+import gc
+import io
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+RESULTS_DIR = os.path.join(ROOT, 'data', 'benchmarks')
+IMAGE_SIZES = (64, 224, 512, 1024)
+LOCATIONS = ['Nairobi', 'Nakuru', 'Kisumu', 'Eldoret', 'Mombasa', 'Thika', 'Machakos', 'Meru', 'Nyeri', 'Kitale']
+
+# Defaults applied before `app` is imported, unless the variable is already set
+SUITE_ENV = {
+    'AGRIWISE_CACHE_SIZE': '0',
+    'AGRIWISE_WEATHER_TTL': '0',
+    'AGRIWISE_DISEASE_BATCH_WAIT_MS': '0',
+    'AGRIWISE_LOAN_BATCH_WAIT_MS': '0',
+    'AGRIWISE_MODEL_WATCH_SECONDS': '0',
+    'AGRIWISE_TTS_ENGINES': 'tone',
+}
+RECORDED_ENV = re.compile(r'^AGRIWISE_')
+
+# name -> (setup, number, repeat); setup(core) returns the zero-argument callable to time
+BENCHMARKS = {}
+
+
+def benchmark(name, number=None, repeat=None):
+    """Register a setup function under ``name``; ``number`` fixes the calls per sample"""
+    def register(setup):
+        BENCHMARKS[name] = (setup, number, repeat)
+        return setup
+    return register
+
+
+# Fixtures
+
+@functools.cache
+def leaf_jpeg(size, seed=0):
+    """A synthetic leaf photo: a veined green ellipse with lesions, on soil"""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / size - 0.5
+    image = np.empty((size, size, 3))
+    image[:] = (96, 72, 48)
+    image += rng.normal(0, 12, image.shape)
+    leaf = (x / 0.42) ** 2 + (y / 0.28) ** 2 < 1
+    shade = 0.75 + 0.25 * np.cos(x * 6)
+    vein = np.abs(y) < 0.006 + 0.002 * rng.random((size, size))
+    image[leaf] = np.stack([50 * shade, 140 * shade, 45 * shade], axis=-1)[leaf]
+    image[leaf & vein] = (150, 190, 110)
+    for cx, cy, r in zip(rng.uniform(-0.3, 0.3, 12), rng.uniform(-0.15, 0.15, 12), rng.uniform(0.01, 0.04, 12)):
+        spot = leaf & ((x - cx) ** 2 + (y - cy) ** 2 < r ** 2)
+        image[spot] = (110, 80, 30)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def leaf_data_url(size, seed=0):
+    return 'data:image/jpeg;base64,' + base64.b64encode(leaf_jpeg(size, seed)).decode()
+
+
+@functools.cache
+def farmer_records(count=256, seed=0):
+    rng = np.random.default_rng(seed)
+    return [
+        {
+            'monthly_income': round(float(rng.uniform(200, 8000)), 2),
+            'land_size': round(float(rng.uniform(0.25, 20)), 2),
+            'crop_yield': round(float(rng.uniform(0, 5000)), 1),
+            'credit_score': int(rng.integers(350, 850)),
+            'age': int(rng.integers(18, 75)),
+            'farming_experience': int(rng.integers(0, 40)),
+        }
+        for _ in range(count)
+    ]
+
+
+def locations(count):
+    return [LOCATIONS[i % len(LOCATIONS)] + ('' if i < len(LOCATIONS) else f' {i}') for i in range(count)]
+
+
+@functools.cache
+def wav_recording(seconds=2.0, rate=16000):
+    """Speech-like bursts of tone over noise, as 16-bit mono WAV"""
+    rng = np.random.default_rng(0)
+    t = np.arange(int(seconds * rate)) / rate
+    envelope = (np.sin(2 * np.pi * 2.5 * t) > 0.2).astype(float)
+    signal = 0.4 * envelope * np.sin(2 * np.pi * 220 * t) + rng.normal(0, 0.01, len(t))
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes((np.clip(signal, -1, 1) * 32767).astype('<i2').tobytes())
+    return buffer.getvalue()
+
+
+def prepare_environment(directory):
+    """Point data directories at ``directory`` and apply SUITE_ENV defaults"""
+    if 'AGRIWISE_MARKET_DIR' not in os.environ:
+        # Before the import: market_data reads its default directory once
+        market_dir = os.environ['AGRIWISE_MARKET_DIR'] = os.path.join(directory, 'market')
+        import market_data
+
+        market_data.seed_synthetic(market_dir)
+        market_data.build_forecasts(market_dir)
+    if 'AGRIWISE_WEATHER_GRID_DIR' not in os.environ:
+        grid_dir = os.environ['AGRIWISE_WEATHER_GRID_DIR'] = os.path.join(directory, 'weather')
+        import weather_grid
+        from weather import LocalWeatherProvider
+
+        for region in weather_grid.REGIONS:
+            weather_grid.build_tile(region, LocalWeatherProvider(), date.today(), grid_dir=grid_dir)
+    os.environ.setdefault('AGRIWISE_JOBS_DB', os.path.join(directory, 'jobs.sqlite3'))
+    os.environ.setdefault('AGRIWISE_AUDIO_CACHE_DIR', os.path.join(directory, 'audio'))
+    for name, value in SUITE_ENV.items():
+        os.environ.setdefault(name, value)
+
+
+# In-process AgriWiseAI methods
+
+for _size in IMAGE_SIZES:
+    @benchmark(f'method.predict_crop_disease(size={_size})')
+    def _predict_crop_disease(core, size=_size):
+        image = leaf_data_url(size)
+        return lambda: core.ai_system.predict_crop_disease(image)
+
+    @benchmark(f'method._decode_image(size={_size})')
+    def _decode_image(core, size=_size):
+        image = leaf_data_url(size)
+        return lambda: core.ai_system._decode_image(image)
+
+
+# Images are decoded to 224x224 first, so feature extraction does not depend on
+# the upload size; the per-image extractor is the batch one given one image
+@benchmark('method._extract_image_features')
+def _extract_image_features(core):
+    images = core.ai_system._decode_image(leaf_data_url(224))[np.newaxis]
+    return lambda: core.ai_system._extract_image_features_batch(images)
+
+
+@benchmark('method.predict_crop_disease_batch(images=16)')
+def _predict_crop_disease_batch(core):
+    images = [leaf_data_url(224, seed) for seed in range(16)]
+    return lambda: core.ai_system.predict_crop_disease_batch(images)
+
+
+@benchmark('method.predict_weather')
+def _predict_weather(core):
+    return lambda: core.ai_system.predict_weather('Nairobi')
+
+
+@benchmark('method.predict_weather_bulk(locations=100)')
+def _predict_weather_bulk(core):
+    places = locations(100)
+    return lambda: core.ai_system.predict_weather_bulk(places)
+
+
+@benchmark('method.get_market_prices')
+def _get_market_prices(core):
+    return lambda: core.ai_system.get_market_prices('tomato')
+
+
+@benchmark('method.get_market_prices(location)')
+def _get_market_prices_nearest(core):
+    return lambda: core.ai_system.get_market_prices('tomato', 'Thika')
+
+
+@benchmark('method.get_market_history')
+def _get_market_history(core):
+    if core.ai_system.get_market_history('tomato') is None:
+        raise RuntimeError('No market history for tomato')
+    return lambda: core.ai_system.get_market_history('tomato')
+
+
+@benchmark('method.assess_loan_eligibility')
+def _assess_loan_eligibility(core):
+    record = farmer_records()[0]
+    return lambda: core.ai_system.assess_loan_eligibility(record)
+
+
+@benchmark('method.score_loans(rows=256)')
+def _score_loans(core):
+    features = core.ai_system._loan_features(farmer_records())
+    return lambda: core.ai_system.score_loans(features)
+
+
+# Flask routes
+
+def route(method, path, check=True, **kwargs):
+    """Setup for one request through the test client
+
+    ``path`` may be a callable taking the client, and request arguments
+    callables returning the value, so fixtures are built only when needed.
+    """
+    def setup(core):
+        client = core.app.test_client()
+        url = path(client) if callable(path) else path
+        request = {name: value() if callable(value) else value for name, value in kwargs.items()}
+
+        def call():
+            response = client.open(url, method=method, **request)
+            body = response.get_data()  # drains streamed responses
+            response.close()
+            if check and response.status_code >= 400:
+                raise RuntimeError(f'{method} {url} returned {response.status_code}: {body[:200]!r}')
+            return response
+        return call
+    return setup
+
+
+def _fingerprinted_image(client):
+    page = client.get('/').get_data(as_text=True)
+    return re.search(r'src="(/static/[^"]+)"', page).group(1)
+
+
+def _audio_url(client):
+    return client.post('/api/text-to-speech', json={'text': 'Mvua itanyesha kesho', 'engine': 'tone'}).get_json()['audio_url']
+
+
+def _finished_job(client):
+    job = client.post('/api/jobs', json={'type': 'loan-batch', 'payload': {'records': farmer_records()[:4]}}).get_json()
+    deadline = time.monotonic() + 60
+    while client.get(f'/api/jobs/{job["id"]}').get_json()['status'] not in ('done', 'failed'):
+        if time.monotonic() > deadline:
+            raise RuntimeError('benchmark job did not finish')
+        time.sleep(0.1)
+    return f'/api/jobs/{job["id"]}'
+
+
+ROUTES = [
+    ('GET /', route('GET', '/', headers={'Accept-Encoding': 'gzip'})),
+    ('GET /static/<fingerprinted>', route('GET', _fingerprinted_image)),
+    ('GET /api/reference', route('GET', '/api/reference', headers={'Accept-Encoding': 'gzip'})),
+    ('GET /api/sync', route('GET', '/api/sync?region=Nairobi', headers={'Accept-Encoding': 'gzip'})),
+    ('POST /api/disease-detection', route('POST', '/api/disease-detection', json=lambda: {'image': leaf_data_url(224)})),
+    ('POST /api/disease-detection (raw jpeg)', route('POST', '/api/disease-detection', data=lambda: leaf_jpeg(224),
+                                                     content_type='image/jpeg')),
+    ('POST /api/disease-detection/batch', route('POST', '/api/disease-detection/batch',
+                                                json=lambda: {'images': [leaf_data_url(224, seed) for seed in range(16)]})),
+    ('GET /api/cache-stats', route('GET', '/api/cache-stats')),
+    ('GET /metrics', route('GET', '/metrics')),
+    ('POST /admin/reload (unchanged)', route('POST', '/admin/reload', json={})),
+    ('POST /api/weather-prediction', route('POST', '/api/weather-prediction', json={'location': 'Nairobi'})),
+    ('POST /api/weather-prediction/bulk', route('POST', '/api/weather-prediction/bulk',
+                                                json={'locations': locations(100)})),
+    ('POST /api/market-prices', route('POST', '/api/market-prices', json={'crop_type': 'tomato'})),
+    ('GET /api/market-prices/history', route('GET', '/api/market-prices/history?crop=tomato')),
+    ('GET /api/locations?q=', route('GET', '/api/locations?q=Ki')),
+    ('GET /api/locations?lat=&lon=', route('GET', '/api/locations?lat=-0.9&lon=36.9')),
+    ('GET /api/weather-map', route('GET', '/api/weather-map?bbox=-2,0,36,38&day=1')),
+    ('POST /api/loan-assessment', route('POST', '/api/loan-assessment', json=lambda: farmer_records()[0])),
+    ('POST /api/loan-assessment/batch', route('POST', '/api/loan-assessment/batch',
+                                              data=lambda: ''.join(json.dumps(r) + '\n' for r in farmer_records()),
+                                              content_type='application/x-ndjson')),
+    ('POST /api/voice-to-text', route('POST', '/api/voice-to-text',
+                                      json=lambda: {'audio': base64.b64encode(wav_recording()).decode(),
+                                                   'mimetype': 'audio/wav'})),
+    ('POST /api/text-to-speech (cached)', route('POST', '/api/text-to-speech',
+                                                json={'text': 'Mvua itanyesha kesho', 'engine': 'tone'})),
+    ('GET /api/audio/<file>', route('GET', _audio_url)),
+    ('GET /api/jobs/<id>', route('GET', _finished_job)),
+    ('GET /api/jobs/<id>/events (finished)', route('GET', lambda client: _finished_job(client) + '/events')),
+]
+for _name, _setup in ROUTES:
+    benchmark(f'route.{_name}')(_setup)
+
+# Last: every call enqueues work for the job pool
+benchmark('route.POST /api/jobs', number=1, repeat=5)(
+    route('POST', '/api/jobs', json=lambda: {'type': 'loan-batch', 'payload': {'records': farmer_records()[:4]}}))
+
+
+# Timing
+
+def _time(func, number):
+    gc.collect()
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def measure(func, number=None, repeat=7, sample_time=0.05):
+    """Per-call seconds of ``repeat`` samples; ``number`` calls per sample, calibrated when None"""
+    result = func()  # warm-up: first-use imports, pools, caches of compiled code
+    if isinstance(result, dict) and 'error' in result:  # AgriWiseAI methods report errors in the result
+        raise RuntimeError(result['error'])
+    if number is None:
+        number = 1
+        while _time(func, number) < sample_time and number < 1 << 20:
+            number *= 2
+    samples = [_time(func, number) / number for _ in range(repeat)]
+    return {
+        'min': min(samples),
+        'median': statistics.median(samples),
+        'max': max(samples),
+        'number': number,
+        'samples': samples,
+    }
+
+
+def git_commit():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    commit = git('rev-parse', '--short=10', 'HEAD') or 'unknown'
+    dirty = bool(git('status', '--porcelain', '--untracked-files=no'))
+    return commit, dirty
+
+
+def selected(pattern):
+    return [name for name in BENCHMARKS if not pattern or re.search(pattern, name)]
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3g} {unit}'
+    return f'{seconds / 1e-9:.3g} ns'
+
+
+def run(args):
+    directory = tempfile.mkdtemp(prefix='agriwise-bench-')
+    prepare_environment(directory)
+    import app as core
+
+    commit, dirty = git_commit()
+    results = {}
+    print(f'{"benchmark":<58} {"median":>10} {"min":>10} {"calls":>8}')
+    for name in selected(args.k):
+        setup, number, repeat = BENCHMARKS[name]
+        try:
+            stats = measure(setup(core), number, repeat or args.repeat, args.sample_time)
+        except Exception as e:
+            results[name] = {'error': f'{type(e).__name__}: {e}'}
+            print(f'{name[:58]:<58} failed: {results[name]["error"]}')
+            continue
+        results[name] = stats
+        print(f'{name[:58]:<58} {format_time(stats["median"]):>10} {format_time(stats["min"]):>10} '
+              f'{stats["number"] * len(stats["samples"]):>8}')
+
+    document = {
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+        },
+        'model_version': core.ai_system.model_version,
+        'env': {name: value for name, value in sorted(os.environ.items())
+                if RECORDED_ENV.match(name) and not name.endswith(('_DIR', '_DB', '_TOKEN'))},
+        'benchmarks': results,
+    }
+    shutil.rmtree(directory, ignore_errors=True)
+    output = args.output or os.path.join(RESULTS_DIR, f'{commit}{"-dirty" if dirty else ""}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(document, f, indent=1)
+    print(f'wrote {output}')
+
+
+def load_results(reference):
+    """A results file, or the results recorded for a commit"""
+    if os.path.isfile(reference):
+        path = reference
+    else:
+        commit = subprocess.run(['git', 'rev-parse', '--short=10', reference], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+        path = os.path.join(RESULTS_DIR, f'{commit or reference}.json')
+        if not os.path.isfile(path):
+            raise SystemExit(f'No results for {reference}: check it out and run `python benchmarks/suite.py run`')
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(args):
+    base, head = load_results(args.base), load_results(args.head)
+    if base['machine'] != head['machine'] or base['env'] != head['env']:
+        print('warning: results come from different machines or settings')
+    print(f'{base["commit"]} -> {head["commit"]}, threshold {args.threshold:.0%}')
+    print(f'{"benchmark":<58} {"base":>10} {"head":>10} {"change":>8}')
+
+    regressions = []
+    for name in sorted(set(base['benchmarks']) | set(head['benchmarks'])):
+        old, new = base['benchmarks'].get(name), head['benchmarks'].get(name)
+        if old is None or new is None or 'error' in old or 'error' in new:
+            state = 'only in head' if old is None else 'only in base' if new is None else 'failed'
+            print(f'{name[:58]:<58} {state:>30}')
+            continue
+        change = new['median'] / old['median'] - 1
+        slower = change > args.threshold and new['min'] / old['min'] - 1 > args.threshold
+        faster = change < -args.threshold and new['min'] / old['min'] - 1 < -args.threshold
+        if slower:
+            regressions.append(name)
+        flag = '  REGRESSION' if slower else '  faster' if faster else ''
+        print(f'{name[:58]:<58} {format_time(old["median"]):>10} {format_time(new["median"]):>10} '
+              f'{change:>+8.1%}{flag}')
+
+    if regressions:
+        print(f'{len(regressions)} benchmark(s) slower by more than {args.threshold:.0%}')
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    listing = commands.add_parser('list', help='show the benchmarks')
+    listing.add_argument('-k', help='only benchmarks whose name matches this regex')
+
+    running = commands.add_parser('run', help='time the benchmarks and write JSON results')
+    running.add_argument('-k', help='only benchmarks whose name matches this regex')
+    running.add_argument('--repeat', type=int, default=7, help='samples per benchmark')
+    running.add_argument('--sample-time', type=float, default=0.05, help='minimum seconds per sample')
+    running.add_argument('--output', help=f'results file (default {os.path.relpath(RESULTS_DIR, ROOT)}/<commit>.json)')
+
+    comparing = commands.add_parser('compare', help='compare two result files or commits')
+    comparing.add_argument('base')
+    comparing.add_argument('head')
+    comparing.add_argument('--threshold', type=float, default=0.10, help='relative slowdown to flag (0.10 = 10%%)')
+
+    args = parser.parse_args()
+    if args.command == 'list':
+        print('\n'.join(selected(args.k)))
+    elif args.command == 'run':
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,291 @@
+"""Bundled gazetteer: place-name lookup and nearest town, market and weather cell
+
+``gazetteer.csv`` lists towns and markets (``name,kind,lat,lon,country``).
+Names are matched through a prefix trie, exactly, by prefix (autocomplete)
+or within a small edit distance ("Nairbi" -> Nairobi). Places are held as
+unit vectors in one array-backed KD-tree per kind, so the nearest market to
+a point is a few dozen array reads.
+
+Weather is forecast on a regular grid of ``GRID_STEP`` degrees. ``resolve``
+turns a free-text location (a place name or ``"lat,lon"``) into its grid
+cell, and forecasts are cached per cell: "Nairobi", "nairobi, kenya",
+"Nairbi" and a phone's GPS fix in town all share one entry.
+"""
+import csv
+import heapq
+import math
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+GAZETTEER_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+GRID_STEP = 0.25  # degrees, about 28 km at the equator
+EARTH_RADIUS_KM = 6371.0
+
+_COORDINATES = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$')
+
+Place = namedtuple('Place', 'name kind lat lon country')
+
+# What a location string resolved to: the matched place (None for coordinates),
+# the point used, and the weather grid cell key ("lat,lon" of the grid point)
+Resolution = namedtuple('Resolution', 'place lat lon cell')
+
+
+def normalize_name(name):
+    return ' '.join(str(name).split()).lower()
+
+
+def unit_vectors(lat, lon):
+    """(N, 3) points on the unit sphere; chord length orders points as great-circle distance does"""
+    lat, lon = np.radians(np.asarray(lat, dtype=np.float64)), np.radians(np.asarray(lon, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def unit_vector(lat, lon):
+    """unit_vectors for one point, as a list (cheaper than NumPy for a single query)"""
+    lat, lon = math.radians(lat), math.radians(lon)
+    return [math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat)]
+
+
+def parse_coordinates(text):
+    """(lat, lon) from a ``"lat,lon"`` string, or None if it is not one or is out of range"""
+    match = _COORDINATES.match(str(text))
+    if match is None:
+        return None
+    lat, lon = float(match[1]), float(match[2])
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def format_point(lat, lon):
+    """The ``"lat,lon"`` key of a grid point"""
+    return f'{lat:.3f},{lon:.3f}'
+
+
+def chord_to_km(squared_chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(squared_chord) / 2))
+
+
+class KDTree:
+    """Static k-d tree stored implicitly: each range's median sits at its middle index
+
+    Built once with NumPy; queries walk plain lists, which is faster than
+    array indexing for the handful of nodes a query touches.
+    """
+
+    def __init__(self, points):
+        points = np.asarray(points, dtype=np.float64)
+        self.order = np.arange(len(points))
+        self.axes = np.zeros(len(points), dtype=np.int8)
+        ranges = [(0, len(points))]
+        while ranges:
+            lo, hi = ranges.pop()
+            if hi - lo < 1:
+                continue
+            ids = self.order[lo:hi]
+            axis = int(np.ptp(points[ids], axis=0).argmax()) if hi - lo > 1 else 0
+            self.order[lo:hi] = ids[np.argsort(points[ids, axis], kind='stable')]
+            mid = (lo + hi) // 2
+            self.axes[mid] = axis
+            ranges.append((lo, mid))
+            ranges.append((mid + 1, hi))
+        self.points = points[self.order]
+        self._rows = self.points.tolist()
+        self._axes = self.axes.tolist()
+        self._ids = self.order.tolist()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def nearest(self, point, k=1):
+        """[(squared distance, input index)] of the ``k`` nearest points, closest first"""
+        if k < 1:
+            return []
+        x, y, z = point
+        best = []  # max-heap of (-squared distance, index)
+        ranges = [(0, len(self._rows), 0.0)]  # (lo, hi, squared distance to the splitting plane)
+        while ranges:
+            lo, hi, bound = ranges.pop()
+            if lo >= hi or (len(best) == k and bound >= -best[0][0]):
+                continue
+            mid = (lo + hi) // 2
+            row = self._rows[mid]
+            d2 = (row[0] - x) ** 2 + (row[1] - y) ** 2 + (row[2] - z) ** 2
+            if len(best) < k:
+                heapq.heappush(best, (-d2, self._ids[mid]))
+            elif d2 < -best[0][0]:
+                heapq.heapreplace(best, (-d2, self._ids[mid]))
+            axis = self._axes[mid]
+            diff = point[axis] - row[axis]
+            near, far = ((mid + 1, hi), (lo, mid)) if diff > 0 else ((lo, mid), (mid + 1, hi))
+            ranges.append((*far, diff * diff))
+            ranges.append((*near, 0.0))
+        return [(-d2, index) for d2, index in sorted(best, reverse=True)]
+
+
+class NameTrie:
+    """Prefix trie over normalized names, with bounded edit-distance search"""
+
+    _END = None  # key of the values stored at a node; children are keyed by character
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, name, value):
+        node = self.root
+        for char in name:
+            node = node.setdefault(char, {})
+        node.setdefault(self._END, []).append(value)
+
+    def get(self, name):
+        node = self.root
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get(self._END, [])
+
+    def prefixed(self, prefix, limit=10):
+        """Values under ``prefix``, shortest names first"""
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        found = []
+        level = [node]
+        while level and len(found) < limit:
+            found.extend(value for node in level for value in node.get(self._END, ()))
+            level = [child for node in level for char, child in sorted(node.items(), key=_char_key)
+                     if char is not self._END]
+        return found[:limit]
+
+    def fuzzy(self, name, max_distance):
+        """[(edit distance, value)] for names within ``max_distance`` edits of ``name``"""
+        found = []
+        first = list(range(len(name) + 1))
+        stack = [(child, char, first) for char, child in self.root.items() if char is not self._END]
+        while stack:
+            node, char, previous = stack.pop()
+            row = [previous[0] + 1]
+            for i in range(1, len(name) + 1):
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (name[i - 1] != char)))
+            if row[-1] <= max_distance:
+                found.extend((row[-1], value) for value in node.get(self._END, ()))
+            # Every extension of this prefix is at least min(row) edits away
+            if min(row) <= max_distance:
+                stack.extend((child, c, row) for c, child in node.items() if c is not self._END)
+        found.sort(key=lambda item: item[0])
+        return found
+
+
+def _char_key(item):
+    return '' if item[0] is None else item[0]
+
+
+class Gazetteer:
+    """Places with name lookup, nearest-neighbour search and weather grid snapping"""
+
+    def __init__(self, places, grid_step=GRID_STEP, cache_size=4096):
+        self.places = list(places)
+        self.grid_step = grid_step
+        self._names = NameTrie()
+        self._trees = {}  # kind -> (KDTree, [index into places])
+        for index, place in enumerate(self.places):
+            self._names.add(normalize_name(place.name), index)
+        for kind in sorted({place.kind for place in self.places}):
+            members = [i for i, place in enumerate(self.places) if place.kind == kind]
+            lat = [self.places[i].lat for i in members]
+            lon = [self.places[i].lon for i in members]
+            self._trees[kind] = (KDTree(unit_vectors(lat, lon)), members)
+        # Resolutions are pure functions of the text, so repeats skip the trie
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    @classmethod
+    def load(cls, path=GAZETTEER_FILE, **kwargs):
+        with open(path, newline='') as f:
+            places = [
+                Place(row['name'].strip(), row['kind'].strip(), float(row['lat']), float(row['lon']),
+                      row.get('country', '').strip())
+                for row in csv.DictReader(f)
+            ]
+        return cls(places, **kwargs)
+
+    @classmethod
+    def from_env(cls):
+        return cls.load(
+            os.environ.get('AGRIWISE_GAZETTEER', GAZETTEER_FILE),
+            grid_step=float(os.environ.get('AGRIWISE_GRID_STEP', GRID_STEP)),
+        )
+
+    @property
+    def kinds(self):
+        return list(self._trees)
+
+    def _max_distance(self, name):
+        """Edits allowed for a fuzzy match: none for very short names, at most two"""
+        return 0 if len(name) < 4 else min(2, len(name) // 4)
+
+    def lookup(self, name, kind=None):
+        """Best place for a name: exact, then the closest fuzzy match; towns win ties. None if nothing is close"""
+        name = normalize_name(name)
+        matches = [(0, index) for index in self._names.get(name)]
+        if not matches and ',' in name:
+            # "Nakuru, Kenya", "Kisii town, Nyanza" -> the first part
+            return self.lookup(name.split(',')[0], kind)
+        if not matches:
+            max_distance = self._max_distance(name)
+            matches = self._names.fuzzy(name, max_distance) if max_distance else []
+        for _, index in sorted(matches, key=lambda m: (m[0], self.places[m[1]].kind != 'town')):
+            if kind is None or self.places[index].kind == kind:
+                return self.places[index]
+        return None
+
+    def complete(self, prefix, limit=10, kind=None):
+        """Places whose name starts with ``prefix``, shortest names first"""
+        places = (self.places[i] for i in self._names.prefixed(normalize_name(prefix), limit * len(self._trees)))
+        return [place for place in places if kind is None or place.kind == kind][:limit]
+
+    def search(self, text, limit=10):
+        """Autocomplete suggestions: prefix matches, else fuzzy matches of the whole text"""
+        found = self.complete(text, limit)
+        if found:
+            return found
+        name = normalize_name(text)
+        max_distance = self._max_distance(name)
+        if not max_distance:
+            return []
+        return [self.places[index] for _, index in self._names.fuzzy(name, max_distance)[:limit]]
+
+    def nearest(self, lat, lon, kind='town', k=1):
+        """[(distance in km, place)] of the ``k`` nearest places of a kind, closest first"""
+        tree, members = self._trees.get(kind, (None, None))
+        if tree is None:
+            return []
+        point = unit_vector(lat, lon)
+        return [(chord_to_km(d2), self.places[members[i]]) for d2, i in tree.nearest(point, min(k, len(tree)))]
+
+    def grid_point(self, lat, lon):
+        """Nearest weather grid point"""
+        step = self.grid_step
+        return round(round(lat / step) * step, 6), round(round(lon / step) * step, 6)
+
+    def cell_key(self, lat, lon):
+        """Cache key of the grid cell containing a point"""
+        return format_point(*self.grid_point(lat, lon))
+
+    def _resolve(self, location):
+        """Resolution for a place name or ``"lat,lon"``, or None if neither matches"""
+        point = parse_coordinates(location)
+        if point is not None:
+            return Resolution(None, *point, self.cell_key(*point))
+        if _COORDINATES.match(str(location)):
+            return None  # coordinates out of range
+        place = self.lookup(location)
+        if place is None:
+            return None
+        return Resolution(place, place.lat, place.lon, self.cell_key(place.lat, place.lon))
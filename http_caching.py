@@ -0,0 +1,254 @@
+"""Content negotiation, compression and validators for HTTP responses
+
+``negotiate`` picks a content coding from ``Accept-Encoding`` (brotli when the
+``brotli`` package is installed, then gzip, else identity) and ``compress``
+applies it. ETags are derived from a version string; a compressed
+representation gets the coding appended (``"v1-br"``), and ``etag_matches``
+ignores that suffix, because every coding of a version carries the same data.
+
+Three layers use them:
+
+* ``Representation`` holds a body that only changes with its data version
+  (the dashboard, reference tables, sync bundles) and compresses it once per
+  coding, so repeat requests cost a dict lookup or a ``304``
+* ``compress_responses`` compresses any other buffered Flask response above
+  ``MIN_COMPRESS_BYTES``
+* ``StaticAssets`` gives files under ``static/`` content-fingerprinted URLs
+  that are served as immutable for a year
+"""
+import gzip
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import threading
+
+from lazy_imports import lazy_import
+
+brotli = lazy_import('brotli')
+
+BROTLI_AVAILABLE = importlib.util.find_spec('brotli') is not None
+ENCODINGS = ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)  # server preference on equal q
+MIN_COMPRESS_BYTES = 512  # below this the coding overhead outweighs the saving
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+CACHED_LEVELS = {'br': 11, 'gzip': 9}  # for bodies compressed once and reused
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'application/x-ndjson',
+                      'application/xml', 'image/svg+xml')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+
+def canonical_json(value):
+    """Compact, key-sorted JSON bytes, so equal data always encodes identically"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode()
+
+
+def digest(value, size=8):
+    """Short content hash of JSON-serialisable data"""
+    return hashlib.sha256(canonical_json(value)).hexdigest()[:size * 2]
+
+
+def accepted_encodings(header):
+    """Parse an Accept-Encoding header into {coding: q}"""
+    accepted = {}
+    for part in (header or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def negotiate(header, offered=ENCODINGS):
+    """Best coding in ``offered`` the client accepts, or None for identity"""
+    accepted = accepted_encodings(header)
+    default = accepted.get('*', 0.0)
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = accepted.get(coding, default)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def compressible(mimetype):
+    return bool(mimetype) and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding, level=None):
+    """Encode bytes with 'br' or 'gzip'; ``None`` returns them unchanged"""
+    if encoding is None:
+        return data
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output byte-identical for identical input
+        return gzip.compress(data, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+    raise ValueError(f'Unsupported content coding {encoding!r}')
+
+
+def etag(version, encoding=None):
+    """Strong ETag for one coding of a version"""
+    return f'"{version}-{encoding}"' if encoding else f'"{version}"'
+
+
+def etag_matches(if_none_match, version):
+    """Whether an If-None-Match header names any coding of ``version``"""
+    for tag in (if_none_match or '').split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        tag = tag.strip('"')
+        base, _, suffix = tag.rpartition('-')
+        if tag == version or (base == version and suffix in ('br', 'gzip')):
+            return True
+    return False
+
+
+class Representation:
+    """A response body for one data version, compressed at most once per content coding
+
+    ``version`` defaults to a hash of the body.
+    """
+
+    def __init__(self, body, version=None, mimetype='application/json', cache_control='no-cache'):
+        self.body = body
+        self.version = version or hashlib.sha256(body).hexdigest()[:16]
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self._encoded = {None: body}
+
+    def encoded(self, encoding):
+        body = self._encoded.get(encoding)
+        if body is None:
+            # Concurrent first requests may both compress; either result is kept
+            body = self._encoded[encoding] = compress(self.body, encoding, CACHED_LEVELS[encoding])
+        return body
+
+    def respond(self, accept_encoding, if_none_match):
+        """(status, headers, body) for a request, honouring Accept-Encoding and If-None-Match"""
+        encoding = negotiate(accept_encoding) if len(self.body) >= MIN_COMPRESS_BYTES else None
+        headers = {
+            'ETag': etag(self.version, encoding),
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        if etag_matches(if_none_match, self.version):
+            return 304, headers, b''
+        headers['Content-Type'] = self.mimetype
+        if encoding:
+            headers['Content-Encoding'] = encoding
+        return 200, headers, self.encoded(encoding)
+
+
+def compress_responses(app, min_size=MIN_COMPRESS_BYTES):
+    """Compress a Flask app's buffered, compressible responses for clients that accept it
+
+    Streamed and file responses, and bodies that are already encoded, pass
+    through untouched.
+    """
+    from flask.globals import _cv_request
+
+    @app.after_request
+    def _compress(response):
+        if (response.direct_passthrough or response.is_streamed or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers or not compressible(response.mimetype)
+                or response.cache_control.no_transform):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.content_length is not None and response.content_length < min_size:
+            return response
+        encoding = negotiate(_cv_request.get().request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return response
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        tag, weak = response.get_etag()
+        if tag:
+            response.set_etag(f'{tag}-{encoding}', weak)
+        return response
+
+    return _compress
+
+
+_FINGERPRINTED = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<suffix>\.[^./]+)$')
+
+
+class StaticAssets:
+    """Content-fingerprinted URLs for the files under a static directory
+
+    ``url('images/farm.jpg')`` returns ``/static/images/farm.<hash>.jpg``.
+    A fingerprinted name always refers to the same bytes, so it can be cached
+    for good; a plain name is still served, but revalidated by ETag.
+    """
+
+    def __init__(self, directory, prefix='/static'):
+        self.directory = os.path.abspath(directory)
+        self.prefix = prefix
+        self._digests = {}  # filename -> (mtime_ns, size, digest)
+        self._referenced = set()  # filenames url() has been asked for
+        self._lock = threading.Lock()
+
+    def _path(self, filename):
+        path = os.path.abspath(os.path.join(self.directory, filename))
+        if not path.startswith(self.directory + os.sep) or not os.path.isfile(path):
+            return None
+        return path
+
+    def digest(self, filename):
+        """Content hash of a static file (recomputed when it changes), or None if missing"""
+        path = self._path(filename)
+        if path is None:
+            return None
+        stat = os.stat(path)
+        cached = self._digests.get(filename)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            return cached[2]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        with self._lock:
+            self._digests[filename] = (stat.st_mtime_ns, stat.st_size, digest)
+        return digest
+
+    def url(self, filename):
+        """Fingerprinted URL for ``filename``; the plain URL if the file does not exist"""
+        with self._lock:
+            self._referenced.add(filename)
+        digest = self.digest(filename)
+        if digest is None:
+            return f'{self.prefix}/{filename}'
+        stem, suffix = os.path.splitext(filename)
+        return f'{self.prefix}/{stem}.{digest}{suffix}'
+
+    def manifest(self):
+        """Current digest of every file a URL was made for; a page holding those URLs is stale once this changes"""
+        with self._lock:
+            referenced = sorted(self._referenced)
+        return tuple((filename, self.digest(filename)) for filename in referenced)
+
+    def resolve(self, name):
+        """(path, digest, immutable) for a requested file name, or None if there is no such file
+
+        A fingerprint that no longer matches the file's content is not found,
+        so a cache never stores new bytes under an old name.
+        """
+        match = _FINGERPRINTED.match(name)
+        if match is not None:
+            filename = match['stem'] + match['suffix']
+            digest = self.digest(filename)
+            if digest is not None:
+                return (self._path(filename), digest, True) if digest == match['digest'] else None
+        digest = self.digest(name)
+        return None if digest is None else (self._path(name), digest, False)
@@ -0,0 +1,306 @@
+"""Persistent background jobs for long-running analyses
+
+Jobs are rows in a local SQLite database, so the queue survives restarts and
+needs no external broker. A dispatcher thread claims queued jobs and runs them
+on a bounded process pool, honouring a per-job-type concurrency limit. Pool
+workers start from a forkserver (see ``process_context``), never by forking
+the threaded server process itself.
+
+Handlers are module-level functions ``handler(payload, progress)`` returning a
+JSON-serializable result; ``progress(fraction, message=None)`` may be called
+from the worker process to report how far along the job is.
+"""
+import json
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+log = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+TERMINAL = (DONE, FAILED)
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    owner INTEGER,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+'''
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _connect(db_path):
+    conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    return conn
+
+
+def _execute(db_path, job_id, handler, payload):
+    """Run one job inside a pool worker process"""
+    conn = _connect(db_path)
+
+    def progress(fraction, message=None):
+        conn.execute(
+            'UPDATE jobs SET progress = ?, message = ? WHERE id = ?',
+            (max(0.0, min(1.0, float(fraction))), message, job_id)
+        )
+
+    try:
+        return handler(payload, progress)
+    finally:
+        conn.close()
+
+
+def process_context(start_method=None, preload=()):
+    """Multiprocessing context for worker pools started by a multithreaded server
+
+    Forking a process that runs other threads can leave the child blocked on
+    a lock one of them held at fork time (logging, sqlite3, batcher queues).
+    Workers therefore come from a forkserver, a clean single-threaded process
+    that imports ``preload`` once and forks them; spawn where there is none.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    start_method = start_method or ('forkserver' if 'forkserver' in methods else 'spawn')
+    context = multiprocessing.get_context(start_method)
+    if start_method == 'forkserver' and preload:
+        # Only takes effect if the forkserver has not been started yet
+        context.set_forkserver_preload(list(preload))
+    return context
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobManager:
+    """SQLite-backed queue with a bounded process pool and per-type limits"""
+
+    def __init__(self, db_path, max_workers=2, max_queued=100, retention=86400,
+                 poll_interval=0.25, start_method=None, preload=(), initializer=None):
+        self.db_path = db_path
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.poll_interval = poll_interval
+        self.start_method = start_method
+        self.preload = preload
+        self.initializer = initializer
+        self.handlers = {}  # job type -> (handler, concurrency)
+        self._running = {}  # job type -> jobs this process has in the pool
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._pool = None
+        self._pool_broken = False
+        self._dispatcher = None
+        self._pid = None
+
+    @classmethod
+    def from_env(cls, default_db_path, **kwargs):
+        return cls(
+            os.environ.get('AGRIWISE_JOBS_DB', default_db_path),
+            max_workers=int(os.environ.get('AGRIWISE_JOB_WORKERS', 2)),
+            max_queued=int(os.environ.get('AGRIWISE_JOB_QUEUE_MAX', 100)),
+            start_method=os.environ.get('AGRIWISE_JOB_START_METHOD'),
+            **kwargs
+        )
+
+    def register(self, job_type, handler, concurrency=1):
+        """Register a module-level handler for ``job_type``"""
+        self.handlers[job_type] = (handler, concurrency)
+        self._running.setdefault(job_type, 0)
+
+    def _db(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = _connect(self.db_path)
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _ensure_started(self):
+        """Start the dispatcher lazily, and again in a forked child (e.g. a serve.py worker)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._local = threading.local()
+            self._running = {job_type: 0 for job_type in self.handlers}
+            self._recover()
+            self._pool = self._new_pool()
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name='job-dispatcher', daemon=True)
+            self._pid = os.getpid()
+            self._dispatcher.start()
+
+    def _new_pool(self):
+        self._pool_broken = False
+        return ProcessPoolExecutor(self.max_workers, mp_context=process_context(self.start_method, self.preload),
+                                   initializer=self.initializer)
+
+    def _replace_pool(self):
+        """Swap a pool that lost a worker for a fresh one; its futures have already failed"""
+        log.warning('Job pool lost a worker process; starting a new pool')
+        broken, self._pool = self._pool, self._new_pool()
+        broken.shutdown(wait=False)
+
+    def _recover(self):
+        """Requeue jobs whose owning process died mid-run"""
+        db = self._db()
+        for job_id, owner in db.execute('SELECT id, owner FROM jobs WHERE status = ?', (RUNNING,)).fetchall():
+            if owner is None or not _pid_alive(owner):
+                db.execute(
+                    'UPDATE jobs SET status = ?, owner = NULL, progress = 0, message = ? WHERE id = ? AND status = ?',
+                    (QUEUED, 'requeued after worker restart', job_id, RUNNING)
+                )
+
+    def submit(self, job_type, payload):
+        """Queue a job; raises ValueError for unknown types and QueueFull under backpressure"""
+        if job_type not in self.handlers:
+            raise ValueError(f'Unknown job type {job_type!r}; expected one of {sorted(self.handlers)}')
+        self._ensure_started()
+        db = self._db()
+        queued = db.execute('SELECT COUNT(*) FROM jobs WHERE status = ?', (QUEUED,)).fetchone()[0]
+        if queued >= self.max_queued:
+            raise QueueFull(f'Job queue is full ({queued} queued)')
+
+        job_id = uuid.uuid4().hex
+        db.execute(
+            'INSERT INTO jobs (id, type, status, payload, created) VALUES (?, ?, ?, ?, ?)',
+            (job_id, job_type, QUEUED, json.dumps(payload), time.time())
+        )
+        self._wake.set()
+        return self.get(job_id)
+
+    def get(self, job_id, include_result=True):
+        """Return a job as a dict, or None if it does not exist"""
+        self._ensure_started()
+        row = self._db().execute(
+            'SELECT id, type, status, progress, message, error, created, started, finished, result '
+            'FROM jobs WHERE id = ?', (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(('id', 'type', 'status', 'progress', 'message', 'error', 'created', 'started', 'finished'), row))
+        if include_result and row[9] is not None:
+            job['result'] = json.loads(row[9])
+        return job
+
+    def stats(self):
+        counts = dict(self._db().execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+        with self._lock:
+            running_here = dict(self._running)
+        return {'counts': counts, 'running_in_this_process': running_here,
+                'max_workers': self.max_workers, 'max_queued': self.max_queued}
+
+    def _dispatch_loop(self):
+        last_prune = 0.0
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            try:
+                self._dispatch_ready()
+                if time.time() - last_prune > 600:
+                    last_prune = time.time()
+                    self._db().execute(
+                        'DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?',
+                        (DONE, FAILED, time.time() - self.retention)
+                    )
+            except Exception:
+                log.exception('Job dispatcher error')
+
+    def _dispatch_ready(self):
+        if self._pool_broken:
+            self._replace_pool()
+        with self._lock:
+            free = self.max_workers - sum(self._running.values())
+            blocked = [t for t, (_, limit) in self.handlers.items() if self._running[t] >= limit]
+        if free <= 0:
+            return
+
+        db = self._db()
+        placeholders = ','.join('?' * len(blocked))
+        query = 'SELECT id, type, payload FROM jobs WHERE status = ?'
+        if blocked:
+            query += f' AND type NOT IN ({placeholders})'
+        rows = db.execute(query + ' ORDER BY created LIMIT ?', (QUEUED, *blocked, free * 4)).fetchall()
+
+        for job_id, job_type, payload in rows:
+            handler, limit = self.handlers.get(job_type, (None, 0))
+            with self._lock:
+                if free <= 0 or handler is None or self._running[job_type] >= limit:
+                    continue
+            # Claim atomically; another worker process may share the database
+            claimed = db.execute(
+                'UPDATE jobs SET status = ?, owner = ?, started = ? WHERE id = ? AND status = ?',
+                (RUNNING, os.getpid(), time.time(), job_id, QUEUED)
+            ).rowcount
+            if not claimed:
+                continue
+            with self._lock:
+                self._running[job_type] += 1
+            free -= 1
+            try:
+                future = self._pool.submit(_execute, self.db_path, job_id, handler, json.loads(payload))
+            except BrokenProcessPool:
+                # The job never reached a worker: hand it back and retry on a new pool
+                db.execute('UPDATE jobs SET status = ?, owner = NULL, started = NULL WHERE id = ?', (QUEUED, job_id))
+                with self._lock:
+                    self._running[job_type] -= 1
+                self._pool_broken = True
+                self._wake.set()
+                return
+            future.add_done_callback(lambda f, job_id=job_id, job_type=job_type: self._finished(job_id, job_type, f))
+
+    def _finished(self, job_id, job_type, future):
+        try:
+            result = future.result()
+            status, result_json, error = DONE, json.dumps(result), None
+        except BrokenProcessPool:
+            # A worker died (crash, OOM kill). Any job in the pool may have been
+            # the cause, so fail rather than requeue them, and rebuild the pool.
+            status, result_json, error = FAILED, None, 'worker process died while running the job'
+            self._pool_broken = True
+        except Exception as e:
+            status, result_json, error = FAILED, None, str(e) or e.__class__.__name__
+        self._db().execute(
+            'UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, owner = NULL, '
+            'progress = CASE WHEN ? THEN 1.0 ELSE progress END WHERE id = ?',
+            (status, result_json, error, time.time(), status == DONE, job_id)
+        )
+        with self._lock:
+            self._running[job_type] -= 1
+        self._wake.set()
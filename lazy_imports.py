@@ -0,0 +1,98 @@
+"""Deferred imports for heavy, endpoint-specific dependencies
+
+``cv2 = lazy_import('cv2')`` binds a placeholder that performs the real import
+the first time an attribute is used, so a worker only pays for the libraries of
+the endpoints it actually serves.
+"""
+import importlib
+import re
+import subprocess
+import sys
+import threading
+import time
+
+_lock = threading.Lock()
+
+# module name -> seconds spent importing it on first use
+load_times = {}
+
+
+class LazyModule:
+    """Placeholder that imports the named module on first attribute access"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            with _lock:
+                module = self.__dict__['_module']
+                if module is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    load_times[self._name] = time.perf_counter() - start
+                    self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = 'loaded' if self.__dict__['_module'] is not None else 'not loaded'
+        return f'<lazy module {self._name!r} ({state})>'
+
+
+def lazy_import(name):
+    """Return the module if it is already imported, otherwise a LazyModule"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    return LazyModule(name)
+
+
+def is_loaded(name):
+    return name in sys.modules
+
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def import_time_report(target='app', python=sys.executable, cwd=None):
+    """Import ``target`` in a fresh interpreter under ``-X importtime``
+
+    Returns a list of ``(module, self_us, cumulative_us, depth)`` in import order.
+    """
+    completed = subprocess.run(
+        [python, '-X', 'importtime', '-c', f'import {target}'],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        tail = completed.stderr.strip().splitlines()[-1:] or ['unknown error']
+        raise RuntimeError(f'import {target} failed: {tail[0]}')
+
+    rows = []
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def format_import_report(rows, top=25):
+    """Render the slowest imports made directly by the target, plus the total"""
+    direct = [row for row in rows if row[3] <= 1]
+    total_us = sum(row[2] for row in rows if row[3] == 0)
+    lines = [f'{"cumulative ms":>14} {"self ms":>9}  module']
+    for module, self_us, cumulative_us, depth in sorted(direct, key=lambda row: -row[2])[:top]:
+        lines.append(f'{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {"  " * depth}{module}')
+    lines.append(f'{total_us / 1000:14.1f} {"":>9}  total ({len(rows)} modules)')
+    return '\n'.join(lines)
@@ -0,0 +1,145 @@
+"""Streaming bulk loan scoring: JSON Lines or CSV in, NDJSON out"""
+import csv
+import io
+import json
+import math
+
+NDJSON_MIMETYPES = {'application/x-ndjson', 'application/jsonl', 'application/json-lines', 'application/x-jsonlines'}
+CSV_MIMETYPES = {'text/csv', 'application/csv'}
+
+CHUNK_ROWS = 8192
+
+
+def iter_records(stream, mimetype):
+    """Yield (row number, record dict or exception) from a binary request stream"""
+    text = io.TextIOWrapper(io.BufferedReader(stream, 1 << 16), encoding='utf-8', newline='')
+    if mimetype in CSV_MIMETYPES:
+        reader = csv.DictReader(text)
+        for row, record in enumerate(reader, start=1):
+            try:
+                yield row, _csv_record(record)
+            except ValueError as e:
+                yield row, e
+        return
+
+    row = 0
+    for line in text:
+        if not line.strip():
+            continue
+        row += 1
+        try:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError('Expected a JSON object')
+            yield row, record
+        except ValueError as e:
+            yield row, e
+
+
+def _csv_record(record):
+    """Convert numeric CSV cells; blank cells fall back to the model defaults"""
+    converted = {}
+    for name, value in record.items():
+        if name is None or value is None or value.strip() == '':
+            continue
+        if name in ('id', 'farmer_id'):
+            converted[name] = value
+        else:
+            try:
+                converted[name] = float(value)
+            except ValueError:
+                converted[name] = math.nan
+            if not math.isfinite(converted[name]):
+                raise ValueError(f'{name}: {value!r} is not a number')
+    return converted
+
+
+def _chunks(records, size):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _ident(record):
+    """``{"id": ...}`` from the record's id (or farmer_id), so results join back to the input"""
+    ident = record.get('id', record.get('farmer_id'))
+    return {} if ident is None else {'id': ident}
+
+
+def _error_line(row, record, error):
+    return json.dumps({'row': row, **_ident(record), 'error': str(error)})
+
+
+def _validated(ai, valid, lines):
+    """The (row, record) pairs whose loan features build; error lines for the others"""
+    kept = []
+    for row, record in valid:
+        try:
+            ai._loan_features([record])
+        except Exception as e:
+            lines.append((row, _error_line(row, record, e)))
+        else:
+            kept.append((row, record))
+    return kept
+
+
+def stream_assessments(ai, records, conditions, chunk_rows=CHUNK_ROWS, score=None):
+    """Score records chunk by chunk and yield NDJSON lines
+
+    Rows that fail to parse or convert come back as ``{"row": n, "error": ...}``
+    without failing the rest of the batch. ``score(features)`` defaults to
+    ``ai.score_loans``; the ASGI app passes one that runs in its process pool.
+    """
+    score = score or ai.score_loans
+    # Serialize the per-risk-level constants once
+    conditions_json = {level: json.dumps(items) for level, items in conditions.items()}
+
+    for chunk in _chunks(records, chunk_rows):
+        lines = []
+        valid = []
+        for row, record in chunk:
+            if isinstance(record, Exception):
+                lines.append((row, json.dumps({'row': row, 'error': str(record)})))
+            else:
+                valid.append((row, record))
+
+        if valid:
+            try:
+                features = ai._loan_features([record for _, record in valid])
+            except Exception:
+                # Isolate the offending records row by row (no model calls), then score the rest together
+                valid = _validated(ai, valid, lines)
+                features = ai._loan_features([record for _, record in valid]) if valid else None
+
+        if valid:
+            try:
+                scores = score(features)
+            except Exception as e:
+                lines.extend((row, _error_line(row, record, e)) for row, record in valid)
+            else:
+                eligible = scores['eligible'].tolist()
+                probability = scores['probability'].round(2).tolist()
+                amount = scores['recommended_amount'].tolist()
+                risk = scores['risk_level'].tolist()
+                for i, (row, record) in enumerate(valid):
+                    ident = _ident(record)
+                    lines.append((row, (
+                        '{"row": %d, %s"eligible": %s, "probability": %s, "recommended_amount": %s, '
+                        '"risk_level": "%s", "conditions": %s}'
+                    ) % (
+                        row,
+                        '"id": %s, ' % json.dumps(ident['id']) if ident else '',
+                        'true' if eligible[i] else 'false',
+                        json.dumps(probability[i]),
+                        json.dumps(amount[i]),
+                        risk[i],
+                        conditions_json[risk[i]],
+                    )))
+
+        lines.sort(key=lambda item: item[0])
+        yield ''.join(line + '\n' for _, line in lines)
@@ -0,0 +1,328 @@
+"""Historical market prices and precomputed price forecasts
+
+Prices are stored column-wise per crop as memory-mappable ``.npy`` files,
+sorted by day so date-range queries are a binary search::
+
+    data/market/
+        forecasts.json          # written by `python market_data.py forecast`, per crop
+                                # and per (market, crop)
+        tomato/
+            days.npy            # int32 days since 1970-01-01, ascending
+            prices.npy          # float32 KSH/kg
+            market_ids.npy      # int16 index into markets.json
+            markets.json
+
+Ingest CSV dumps (``date,crop,market,price``) with ``python market_data.py ingest``
+and schedule ``python market_data.py forecast`` nightly, e.g. from cron::
+
+    15 2 * * *  cd /srv/agriwise && python market_data.py forecast
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+MARKET_DIR = os.environ.get(
+    'AGRIWISE_MARKET_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'market')
+)
+FORECASTS_FILE = 'forecasts.json'
+EPOCH = date(1970, 1, 1)
+
+# Days of history the forecast job fits its trend on, and how far ahead it projects
+TREND_WINDOW = 60
+HORIZON = 14
+
+
+def to_day(value):
+    """ISO date string or date -> days since the epoch"""
+    if isinstance(value, str):
+        value = datetime.strptime(value.strip()[:10], '%Y-%m-%d').date()
+    return (value - EPOCH).days
+
+
+def from_day(day):
+    return (EPOCH + timedelta(days=int(day))).isoformat()
+
+
+def market_recommendation(current, forecast):
+    """Get market recommendations based on price trends"""
+    if forecast > current * 1.1:
+        return "Consider holding harvest for better prices"
+    elif forecast < current * 0.9:
+        return "Consider selling soon to avoid price drops"
+    else:
+        return "Prices are stable, plan harvest based on crop readiness"
+
+
+def _crop_dir(data_dir, crop):
+    if not crop or os.sep in crop or crop.startswith('.'):
+        raise ValueError(f'Invalid crop name {crop!r}')
+    return os.path.join(data_dir, crop)
+
+
+def read_crop(data_dir, crop, mmap_mode='r'):
+    """Load one crop's columns, or None if the crop has no history"""
+    path = _crop_dir(data_dir, crop)
+    if not os.path.isfile(os.path.join(path, 'days.npy')):
+        return None
+    with open(os.path.join(path, 'markets.json')) as f:
+        markets = json.load(f)
+    return {
+        'days': np.load(os.path.join(path, 'days.npy'), mmap_mode=mmap_mode),
+        'prices': np.load(os.path.join(path, 'prices.npy'), mmap_mode=mmap_mode),
+        'market_ids': np.load(os.path.join(path, 'market_ids.npy'), mmap_mode=mmap_mode),
+        'markets': markets,
+    }
+
+
+def write_crop(data_dir, crop, days, prices, market_names):
+    """Merge rows into a crop's columns; later rows win on (day, market)"""
+    existing = read_crop(data_dir, crop, mmap_mode=None)
+    markets = list(existing['markets']) if existing else []
+    index = {name: i for i, name in enumerate(markets)}
+    for name in market_names:
+        if name not in index:
+            index[name] = len(markets)
+            markets.append(name)
+    new_ids = np.array([index[name] for name in market_names], dtype=np.int16)
+
+    days = np.asarray(days, dtype=np.int32)
+    prices = np.asarray(prices, dtype=np.float32)
+    if existing:
+        days = np.concatenate([existing['days'], days])
+        prices = np.concatenate([existing['prices'], prices])
+        new_ids = np.concatenate([existing['market_ids'], new_ids])
+
+    # Keep the last occurrence of each (day, market), sorted by day then market
+    key = days.astype(np.int64) * 65536 + new_ids
+    _, last = np.unique(key[::-1], return_index=True)
+    keep = len(key) - 1 - last
+    order = keep[np.lexsort((new_ids[keep], days[keep]))]
+
+    path = _crop_dir(data_dir, crop)
+    staging = path + '.new'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    np.save(os.path.join(staging, 'days.npy'), days[order])
+    np.save(os.path.join(staging, 'prices.npy'), prices[order])
+    np.save(os.path.join(staging, 'market_ids.npy'), new_ids[order])
+    with open(os.path.join(staging, 'markets.json'), 'w') as f:
+        json.dump(markets, f)
+
+    # Swap directories; readers holding the old mmaps keep the unlinked files
+    retired = path + '.old'
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, retired)
+    os.replace(staging, path)
+    shutil.rmtree(retired, ignore_errors=True)
+    return len(order)
+
+
+def ingest_csv(csv_path, data_dir=MARKET_DIR):
+    """Ingest a ``date,crop,market,price`` CSV dump; returns rows stored per crop"""
+    rows = {}
+    with open(csv_path, newline='') as f:
+        for line, record in enumerate(csv.DictReader(f), start=2):
+            try:
+                crop = record['crop'].strip().lower()
+                entry = rows.setdefault(crop, ([], [], []))
+                entry[0].append(to_day(record['date']))
+                entry[1].append(float(record['price']))
+                entry[2].append(record['market'].strip())
+            except (KeyError, ValueError, AttributeError) as e:
+                raise ValueError(f'{csv_path}:{line}: bad row ({e})') from e
+
+    os.makedirs(data_dir, exist_ok=True)
+    return {crop: write_crop(data_dir, crop, *columns) for crop, columns in rows.items()}
+
+
+def list_crops(data_dir=MARKET_DIR):
+    if not os.path.isdir(data_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(data_dir)
+        if os.path.isfile(os.path.join(data_dir, name, 'days.npy'))
+    )
+
+
+def forecast_crop(columns, horizon=HORIZON, window=TREND_WINDOW):
+    """Linear-trend forecast of the daily mean price across markets"""
+    days, prices = np.asarray(columns['days']), np.asarray(columns['prices'], dtype=np.float64)
+    unique_days, inverse = np.unique(days, return_inverse=True)
+    daily = np.bincount(inverse, weights=prices) / np.bincount(inverse)
+
+    recent_days, recent = unique_days[-window:], daily[-window:]
+    current = float(recent[-7:].mean())
+    if len(recent) >= 2:
+        slope, intercept = np.polyfit(recent_days - recent_days[-1], recent, 1)
+        forecast = float(intercept + slope * horizon)
+        residual = recent - (intercept + slope * (recent_days - recent_days[-1]))
+        # Tighter fit relative to the price level -> higher confidence
+        confidence = float(np.clip(1 - residual.std() / max(current, 1e-9) * 2, 0.5, 0.95))
+    else:
+        forecast, confidence = current, 0.5
+
+    return {
+        'current_price': round(current, 2),
+        'forecast_price': round(forecast, 2),
+        'trend': 'up' if forecast > current else 'down',
+        'confidence': round(confidence, 2),
+        'recommendation': market_recommendation(current, forecast),
+        'as_of': from_day(unique_days[-1]),
+        'horizon_days': horizon,
+    }
+
+
+def build_forecasts(data_dir=MARKET_DIR):
+    """Nightly job: precompute the forecast for every crop with history, overall and per market"""
+    forecasts = {}
+    by_market = {}
+    for crop in list_crops(data_dir):
+        columns = read_crop(data_dir, crop)
+        forecasts[crop] = dict(crop=crop, **forecast_crop(columns))
+        market_ids = np.asarray(columns['market_ids'])
+        for market_id, market in enumerate(columns['markets']):
+            mask = market_ids == market_id
+            if mask.any():
+                local = {'days': np.asarray(columns['days'])[mask], 'prices': np.asarray(columns['prices'])[mask]}
+                by_market.setdefault(market, {})[crop] = dict(crop=crop, market=market, **forecast_crop(local))
+    table = {'generated': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'), 'crops': forecasts, 'markets': by_market}
+
+    path = os.path.join(data_dir, FORECASTS_FILE)
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        json.dump(table, f, indent=2)
+    os.replace(tmp_path, path)
+    return table
+
+
+def seed_synthetic(data_dir=MARKET_DIR, days=365, markets=('Nairobi', 'Nakuru', 'Kisumu', 'Eldoret', 'Mombasa')):
+    """Write synthetic history around the reference prices (for demos and benchmarks)"""
+    base_price = {'tomato': 50, 'potato': 30, 'corn': 25, 'wheat': 35, 'rice': 40, 'beans': 45}
+    rng = np.random.default_rng(42)
+    end = to_day(date.today())
+    day_range = np.arange(end - days + 1, end + 1, dtype=np.int32)
+    os.makedirs(data_dir, exist_ok=True)
+    for crop, base in base_price.items():
+        season = 1 + 0.1 * np.sin(2 * np.pi * day_range / 365.25 + rng.uniform(0, 2 * np.pi))
+        walk = np.cumsum(rng.normal(0, 0.01, len(day_range)))
+        for market in markets:
+            offset = rng.uniform(0.9, 1.1)
+            prices = base * offset * season * np.exp(walk) + rng.normal(0, base * 0.02, len(day_range))
+            write_crop(data_dir, crop, day_range, np.round(prices, 2), [market] * len(day_range))
+
+
+class MarketStore:
+    """Read side used by the API: precomputed forecasts and history range queries"""
+
+    def __init__(self, data_dir=MARKET_DIR, refresh_interval=60):
+        self.data_dir = data_dir
+        self.refresh_interval = refresh_interval
+        self._forecasts = {}
+        self._market_forecasts = {}
+        self._forecasts_mtime = None
+        self._checked = 0.0
+        self._columns = {}  # crop -> (mtime of days.npy, columns)
+        self._lock = threading.Lock()
+
+    def forecast(self, crop, market=None):
+        """Precomputed forecast for ``crop`` (at one ``market``), or None if the job has not covered it"""
+        now = time.monotonic()
+        if now - self._checked > self.refresh_interval:
+            self._refresh_forecasts(now)
+        if market is not None:
+            return self._market_forecasts.get(market, {}).get(crop)
+        return self._forecasts.get(crop)
+
+    def _refresh_forecasts(self, now):
+        with self._lock:
+            self._checked = now
+            path = os.path.join(self.data_dir, FORECASTS_FILE)
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                self._forecasts, self._market_forecasts, self._forecasts_mtime = {}, {}, None
+                return
+            if mtime != self._forecasts_mtime:
+                with open(path) as f:
+                    table = json.load(f)
+                self._forecasts = table['crops']
+                self._market_forecasts = table.get('markets', {})  # absent in tables from older jobs
+                self._forecasts_mtime = mtime
+
+    def _crop_columns(self, crop):
+        try:
+            mtime = os.stat(os.path.join(_crop_dir(self.data_dir, crop), 'days.npy')).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._columns.get(crop)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, read_crop(self.data_dir, crop))
+            self._columns[crop] = cached
+        return cached[1]
+
+    def history(self, crop, start=None, end=None, market=None):
+        """Prices for ``crop`` with start <= date <= end (ISO dates, inclusive)
+
+        Returns None if the crop has no history.
+        """
+        columns = self._crop_columns(crop)
+        if columns is None:
+            return None
+        days = columns['days']
+        lo = 0 if start is None else int(np.searchsorted(days, to_day(start), side='left'))
+        hi = len(days) if end is None else int(np.searchsorted(days, to_day(end), side='right'))
+
+        window_days = np.asarray(days[lo:hi])
+        window_prices = np.asarray(columns['prices'][lo:hi])
+        window_ids = np.asarray(columns['market_ids'][lo:hi])
+        markets = columns['markets']
+        if market is not None:
+            if market not in markets:
+                return []
+            mask = window_ids == markets.index(market)
+            window_days, window_prices, window_ids = window_days[mask], window_prices[mask], window_ids[mask]
+
+        return [
+            {'date': from_day(day), 'market': markets[market_id], 'price': round(float(price), 2)}
+            for day, price, market_id in zip(window_days.tolist(), window_prices.tolist(), window_ids.tolist())
+        ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AgriWise AI market data store')
+    parser.add_argument('--data-dir', default=MARKET_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help='ingest date,crop,market,price CSV dumps')
+    ingest.add_argument('csv_files', nargs='+')
+
+    commands.add_parser('forecast', help='precompute forecasts for every crop (nightly job)')
+
+    seed = commands.add_parser('seed', help='write synthetic history for demos')
+    seed.add_argument('--days', type=int, default=365)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'ingest':
+        for csv_path in args.csv_files:
+            for crop, rows in ingest_csv(csv_path, args.data_dir).items():
+                print(f'{csv_path}: {crop} now has {rows} rows')
+    elif args.command == 'forecast':
+        table = build_forecasts(args.data_dir)
+        print(f'Wrote forecasts for {len(table["crops"])} crops')
+    elif args.command == 'seed':
+        seed_synthetic(args.data_dir, args.days)
+        print(f'Seeded {args.days} days of synthetic prices in {args.data_dir}')
+
+
+if __name__ == '__main__':
+    main()
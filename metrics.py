@@ -0,0 +1,319 @@
+"""In-process metrics with Prometheus text exposition
+
+Counters, gauges and histograms are kept per process (each worker exports
+its own series). Recording is a dict lookup plus a few integer updates, so
+it is cheap enough to sit on every request.
+
+    REQUESTS = metrics.counter('agriwise_requests_total', 'Requests', ('route',))
+    REQUESTS.labels('/api/x').inc()
+
+    with metrics.stage('decode'):
+        ...
+"""
+import threading
+import time
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{value}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def labels(self, *values):
+        """Return the child series for these label values (created on first use)"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f'{self.name} expects labels {self.labelnames}')
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{labels} {_format_value(value)}' for name, labels, value in self.samples())
+        return '\n'.join(lines)
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            yield self.name, _format_labels(self.labelnames, values), child.value
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount=1):
+        self._default.dec(amount)
+
+    def set(self, value):
+        self._default.set(value)
+
+
+class _HistogramValue:
+    __slots__ = ('bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def samples(self):
+        for values, child in list(self._children.items()):
+            with child._lock:
+                counts = list(child.counts)
+                total = child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket',
+                       _format_labels(self.labelnames, values, [('le', _format_value(float(bound)))]),
+                       cumulative)
+            labels = _format_labels(self.labelnames, values)
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, cumulative
+
+
+class Registry:
+    """A set of metrics plus collectors that report externally kept stats at scrape time"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f'{name} is already registered as a {metric.kind}')
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def add_collector(self, collect):
+        """``collect()`` returns [(name, kind, help, {labels tuple: value})] at scrape time"""
+        self._collectors.append(collect)
+
+    def render(self):
+        blocks = [metric.render() for metric in list(self._metrics.values())]
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                print(f"Metrics collector {getattr(collect, '__name__', collect)} failed: {e}")
+                continue
+            for name, kind, documentation, series in families:
+                lines = [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+                for labels, value in series.items():
+                    label_text = '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in labels) + '}' if labels else ''
+                    lines.append(f'{name}{label_text} {_format_value(float(value))}')
+                blocks.append('\n'.join(lines))
+        return '\n'.join(blocks) + '\n'
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+
+STAGE_SECONDS = histogram('agriwise_stage_seconds', 'Time spent in each processing stage', ('stage',))
+
+
+class stage:
+    """Time a block (or a function, as a decorator) into agriwise_stage_seconds"""
+
+    __slots__ = ('_series', '_start')
+
+    def __init__(self, name):
+        self._series = STAGE_SECONDS.labels(name)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._series.observe(time.perf_counter() - self._start)
+        return False
+
+    def __call__(self, func):
+        series = self._series
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                series.observe(time.perf_counter() - start)
+
+        timed.__name__ = func.__name__
+        timed.__doc__ = func.__doc__
+        timed.__wrapped__ = func
+        return timed
+
+
+def instrument(app, registry=REGISTRY):
+    """Record per-route latency, sizes, in-flight requests and errors for a Flask app
+
+    Timing wraps ``app.wsgi_app`` and reads the WSGI environ directly; Flask's
+    ``request`` proxy costs microseconds per attribute, so a single
+    after-request hook just notes the matched route. Latency ends when the
+    response headers are ready, so streamed bodies are not included.
+    """
+    from flask.globals import _cv_request
+
+    latency = registry.histogram('agriwise_http_request_duration_seconds', 'Request latency',
+                                 ('method', 'route', 'status'))
+    request_size = registry.histogram('agriwise_http_request_size_bytes', 'Request body size',
+                                      ('route',), buckets=SIZE_BUCKETS)
+    response_size = registry.histogram('agriwise_http_response_size_bytes', 'Response body size (when known)',
+                                       ('route',), buckets=SIZE_BUCKETS)
+    in_flight = registry.gauge('agriwise_http_requests_in_flight', 'Requests being handled')
+    errors = registry.counter('agriwise_http_errors_total', 'Responses with a 5xx status or an unhandled exception',
+                              ('route', 'status'))
+    in_flight_value = in_flight.labels()
+    series = {}  # (method, route, status) -> histogram children
+    perf_counter = time.perf_counter
+
+    @app.after_request
+    def _note_route(response):
+        request = _cv_request.get().request
+        rule = request.url_rule
+        if rule is not None:
+            request.environ['agriwise.route'] = rule.rule
+        return response
+
+    wsgi_app = app.wsgi_app
+
+    def instrumented_wsgi_app(environ, start_response):
+        start = perf_counter()
+        in_flight_value.inc()
+        captured = []
+
+        def capture(status, headers, exc_info=None):
+            captured.append((status, headers))
+            return start_response(status, headers, exc_info)
+
+        try:
+            return wsgi_app(environ, capture)
+        except Exception:
+            errors.labels(environ.get('agriwise.route', 'unmatched'), 500).inc()
+            raise
+        finally:
+            in_flight_value.dec()
+            if captured:
+                elapsed = perf_counter() - start
+                status, headers = captured[-1]
+                route = environ.get('agriwise.route', 'unmatched')
+                key = (environ['REQUEST_METHOD'], route, status)
+                children = series.get(key)
+                if children is None:
+                    code = int(status[:3])
+                    children = series[key] = (
+                        latency.labels(key[0], route, code),
+                        request_size.labels(route),
+                        response_size.labels(route),
+                        errors.labels(route, code) if code >= 500 else None,
+                    )
+                children[0].observe(elapsed)
+                children[1].observe(int(environ.get('CONTENT_LENGTH') or 0))
+                for name, value in headers:
+                    if name == 'Content-Length':
+                        children[2].observe(int(value))
+                        break
+                if children[3] is not None:
+                    children[3].inc()
+
+    app.wsgi_app = instrumented_wsgi_app
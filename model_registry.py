@@ -0,0 +1,327 @@
+"""Versioned on-disk registry for the AgriWise AI models
+
+Artifacts are built once with ``python model_registry.py build`` and laid out as::
+
+    models/
+        CURRENT                     # name of the active version
+        20250101120000/
+            manifest.json           # checksums, feature schemas, classes
+            crop_disease.joblib
+            crop_disease.forest     # compiled node arrays (forest_compiler)
+            ...
+
+Artifacts are written uncompressed so ``joblib.load(..., mmap_mode='r')`` can map
+the numpy buffers read-only straight from the page cache. The ``.forest`` files
+are served by ``forest_compiler.CompiledForest`` unless
+``AGRIWISE_FOREST_RUNTIME=sklearn``; ``python model_registry.py compile`` adds
+them to versions built before they existed.
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+
+import joblib
+import numpy as np
+
+import forest_compiler
+
+MODEL_DIR = os.environ.get(
+    'AGRIWISE_MODEL_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+)
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+FORMAT_VERSION = 1
+FOREST_RUNTIME = os.environ.get('AGRIWISE_FOREST_RUNTIME', 'compiled')
+
+# Class vocabulary of the disease model (descriptions live in AgriWiseAI.crop_diseases)
+DISEASE_LABELS = [
+    'healthy', 'early_blight', 'late_blight', 'leaf_mold', 'septoria_leaf_spot',
+    'spider_mites', 'target_spot', 'yellow_leaf_curl_virus', 'mosaic_virus'
+]
+
+# Column order each model was trained on
+FEATURE_SCHEMAS = {
+    'crop_disease': [
+        'red_mean', 'green_mean', 'blue_mean', 'red_std', 'green_std', 'blue_std',
+        'gray_mean', 'gray_std', 'gray_var', 'gray_max'
+    ],
+    'weather': ['temperature', 'humidity', 'pressure', 'wind', 'rainfall'],
+    'loan': [
+        'monthly_income', 'land_size', 'crop_yield', 'credit_score', 'age',
+        'farming_experience'
+    ],
+}
+
+
+def train_sample_models(disease_labels=DISEASE_LABELS):
+    """Train the sample models with synthetic data"""
+    from sklearn.ensemble import RandomForestClassifier
+
+    models = {
+        'crop_disease': RandomForestClassifier(n_estimators=100, random_state=42),
+        'weather': RandomForestClassifier(n_estimators=50, random_state=42),
+        'loan': RandomForestClassifier(n_estimators=75, random_state=42),
+    }
+
+    np.random.seed(42)
+    n_samples = 1000
+
+    # Synthetic image features (RGB values, texture features, etc.)
+    image_features = np.random.rand(n_samples, 10)
+    disease_labels = np.random.choice(list(disease_labels), n_samples)
+    models['crop_disease'].fit(image_features, disease_labels)
+
+    # temp, humidity, pressure, wind, rainfall
+    weather_features = np.random.rand(n_samples, 5)
+    weather_labels = np.random.choice(['sunny', 'rainy', 'cloudy', 'stormy'], n_samples)
+    models['weather'].fit(weather_features, weather_labels)
+
+    # income, land_size, crop_yield, credit_score, age, experience
+    loan_features = np.random.rand(n_samples, 6)
+    loan_labels = np.random.choice([0, 1], n_samples)  # 0: rejected, 1: approved
+    models['loan'].fit(loan_features, loan_labels)
+
+    return models
+
+
+def _sha256(path):
+    """Checksum a file without reading it into memory at once"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, text):
+    """Write a small text file so readers never see a partial write"""
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def build_models(model_dir=MODEL_DIR, version=None, activate=True):
+    """Train the models and write them as a new versioned artifact set"""
+    import sklearn
+
+    version = version or time.strftime('%Y%m%d%H%M%S')
+    version_dir = os.path.join(model_dir, version)
+    if os.path.exists(version_dir):
+        raise FileExistsError(f'Model version {version} already exists in {model_dir}')
+    os.makedirs(version_dir)
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'sklearn_version': sklearn.__version__,
+        'numpy_version': np.__version__,
+        'models': {},
+    }
+    for name, model in train_sample_models().items():
+        filename = f'{name}.joblib'
+        path = os.path.join(version_dir, filename)
+        # No compression: compressed pickles cannot be memory-mapped on load
+        joblib.dump(model, path, compress=0)
+        manifest['models'][name] = {
+            'file': filename,
+            'sha256': _sha256(path),
+            'size': os.path.getsize(path),
+            'features': FEATURE_SCHEMAS[name],
+            'classes': [c.item() if hasattr(c, 'item') else c for c in model.classes_],
+            'n_estimators': len(model.estimators_),
+            'compiled': _write_compiled(model, version_dir, name),
+        }
+
+    _write_atomic(os.path.join(version_dir, MANIFEST_FILE), json.dumps(manifest, indent=2))
+    if activate:
+        activate_version(version, model_dir)
+    return version
+
+
+def _write_compiled(model, version_dir, name):
+    """Compile a forest next to its joblib file, checking it against sklearn first"""
+    compiled = forest_compiler.compile_forest(model)
+    probe = np.random.default_rng(0).random((256, model.n_features_in_))
+    forest_compiler.verify(model, compiled, probe)
+    filename = f'{name}.forest'
+    path = compiled.save(os.path.join(version_dir, filename))
+    return {'file': filename, 'sha256': _sha256(path), 'size': os.path.getsize(path)}
+
+
+def compile_version(version=None, model_dir=MODEL_DIR):
+    """Add compiled forests to an existing version that lacks them"""
+    version = version or current_version(model_dir)
+    manifest = read_manifest(version, model_dir)
+    _, models = load_models(model_dir, version, runtime='sklearn')
+    version_dir = os.path.join(model_dir, version)
+    for name, model in models.items():
+        manifest['models'][name]['compiled'] = _write_compiled(model, version_dir, name)
+    _write_atomic(os.path.join(version_dir, MANIFEST_FILE), json.dumps(manifest, indent=2))
+    return version
+
+
+def compile_models(models):
+    """Compiled in-memory counterparts of freshly trained models (per FOREST_RUNTIME)"""
+    if FOREST_RUNTIME != 'compiled':
+        return models
+    return {name: forest_compiler.compile_forest(model, fallback=True) for name, model in models.items()}
+
+
+def activate_version(version, model_dir=MODEL_DIR):
+    """Point CURRENT at an existing version"""
+    if not os.path.isfile(os.path.join(model_dir, version, MANIFEST_FILE)):
+        raise FileNotFoundError(f'No manifest for model version {version} in {model_dir}')
+    _write_atomic(os.path.join(model_dir, CURRENT_FILE), version + '\n')
+
+
+def current_version(model_dir=MODEL_DIR):
+    """Return the active version name, or None if nothing has been built"""
+    try:
+        with open(os.path.join(model_dir, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class CurrentWatcher:
+    """Poll CURRENT and call ``on_change(version)`` from a background thread when it changes
+
+    A failing callback is logged and not retried until CURRENT changes again,
+    so a bad artifact set is not reloaded over and over.
+    """
+
+    def __init__(self, on_change, model_dir=MODEL_DIR, interval=5.0, version=None):
+        self.on_change = on_change
+        self.model_dir = model_dir
+        self.interval = interval
+        self.version = version or current_version(model_dir)  # the version already being served
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='model-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            version = current_version(self.model_dir)
+            if version is None or version == self.version:
+                continue
+            self.version = version
+            try:
+                self.on_change(version)
+            except Exception as e:
+                print(f"Model version {version} was not loaded: {e}")
+
+
+def list_versions(model_dir=MODEL_DIR):
+    """List the versions present on disk, oldest first"""
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(model_dir)
+        if os.path.isfile(os.path.join(model_dir, name, MANIFEST_FILE))
+    )
+
+
+def read_manifest(version, model_dir=MODEL_DIR):
+    with open(os.path.join(model_dir, version, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def load_models(model_dir=MODEL_DIR, version=None, verify=True, runtime=None):
+    """Load a versioned artifact set, memory-mapping the tree arrays read-only
+
+    With the ``compiled`` runtime each model that has a ``.forest`` artifact is
+    returned as a CompiledForest (keeping the sklearn model for bulk batches).
+    Returns ``(version, models)``. Raises FileNotFoundError when no artifacts
+    exist and ValueError when an artifact fails its checksum or schema check.
+    """
+    runtime = runtime or FOREST_RUNTIME
+    version = version or current_version(model_dir)
+    if version is None:
+        raise FileNotFoundError(f'No model artifacts in {model_dir}; run `python model_registry.py build`')
+
+    manifest = read_manifest(version, model_dir)
+    if manifest.get('format') != FORMAT_VERSION:
+        raise ValueError(f'Unsupported model artifact format {manifest.get("format")!r}')
+
+    models = {}
+    for name, schema in FEATURE_SCHEMAS.items():
+        entry = manifest['models'].get(name)
+        if entry is None:
+            raise ValueError(f'Model version {version} has no {name} model')
+        if entry['features'] != schema:
+            raise ValueError(f'Feature schema of {name} model does not match this code')
+
+        path = os.path.join(model_dir, version, entry['file'])
+        if verify and _sha256(path) != entry['sha256']:
+            raise ValueError(f'Checksum mismatch for {path}')
+
+        model = joblib.load(path, mmap_mode='r')
+        if model.n_features_in_ != len(schema):
+            raise ValueError(f'{name} model expects {model.n_features_in_} features, schema has {len(schema)}')
+
+        compiled = entry.get('compiled')
+        if runtime == 'compiled' and compiled is not None:
+            path = os.path.join(model_dir, version, compiled['file'])
+            if verify and _sha256(path) != compiled['sha256']:
+                raise ValueError(f'Checksum mismatch for {path}')
+            model = forest_compiler.CompiledForest.load(path, fallback=model)
+        models[name] = model
+
+    return version, models
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Manage AgriWise AI model artifacts')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='train and write a new model version')
+    build.add_argument('--version', help='version name (default: timestamp)')
+    build.add_argument('--no-activate', action='store_true', help='do not point CURRENT at the new version')
+
+    commands.add_parser('list', help='list model versions')
+
+    activate = commands.add_parser('activate', help='point CURRENT at an existing version')
+    activate.add_argument('version')
+
+    verify = commands.add_parser('verify', help='check artifact checksums and schemas')
+    verify.add_argument('version', nargs='?')
+
+    compile_ = commands.add_parser('compile', help='add compiled forests to an existing version')
+    compile_.add_argument('version', nargs='?')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        version = build_models(args.model_dir, args.version, activate=not args.no_activate)
+        print(f'Built model version {version} in {args.model_dir}')
+    elif args.command == 'list':
+        active = current_version(args.model_dir)
+        for version in list_versions(args.model_dir):
+            print(('* ' if version == active else '  ') + version)
+    elif args.command == 'activate':
+        activate_version(args.version, args.model_dir)
+        print(f'Activated model version {args.version}')
+    elif args.command == 'verify':
+        version, _ = load_models(args.model_dir, args.version)
+        print(f'Model version {version} OK')
+    elif args.command == 'compile':
+        version = compile_version(args.version, args.model_dir)
+        print(f'Compiled the forests of model version {version}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""Content-addressed cache for prediction results
+
+An in-process LRU bounded by entry count and TTL, optionally backed by a
+SQLite file so every worker on the host shares results.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def content_key(data, model_version):
+    """Hash upload bytes (bytes-like or file object) together with the model version"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str(model_version).encode())
+    digest.update(b'\0')
+    if hasattr(data, 'read'):
+        for chunk in iter(lambda: data.read(1 << 20), b''):
+            digest.update(chunk)
+        data.seek(0)
+    else:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """LRU/TTL result cache with hit, miss and eviction counters"""
+
+    def __init__(self, max_entries=1024, ttl=3600, db_path=None, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()  # key -> (expires, value)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._disk_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        if db_path:
+            self._db().execute(
+                'CREATE TABLE IF NOT EXISTS predictions ('
+                'key TEXT PRIMARY KEY, model_version TEXT, value TEXT, expires REAL)'
+            )
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.environ.get('AGRIWISE_CACHE_SIZE', 1024)),
+            ttl=float(os.environ.get('AGRIWISE_CACHE_TTL', 3600)),
+            db_path=os.environ.get('AGRIWISE_CACHE_DB') or None,
+        )
+
+    key = staticmethod(content_key)
+
+    def _db(self):
+        """One connection per thread and process; connections must not cross either"""
+        conn, pid = getattr(self._local, 'conn', (None, None))
+        if conn is None or pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = (conn, os.getpid())
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+
+        if self.db_path:
+            row = self._db().execute(
+                'SELECT value, expires FROM predictions WHERE key = ? AND expires > ?', (key, now)
+            ).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, value, row[1])
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value, model_version=None):
+        expires = time.time() + self.ttl
+        self._remember(key, value, expires)
+        if self.db_path:
+            db = self._db()
+            db.execute(
+                'INSERT OR REPLACE INTO predictions (key, model_version, value, expires) VALUES (?, ?, ?, ?)',
+                (key, model_version, json.dumps(value), expires)
+            )
+            self._disk_writes += 1
+            if self._disk_writes % 1000 == 0:
+                self._prune_disk(db)
+
+    def _remember(self, key, value, expires):
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def _prune_disk(self, db):
+        """Drop expired rows and keep the disk tier within max_disk_entries"""
+        db.execute('DELETE FROM predictions WHERE expires <= ?', (time.time(),))
+        db.execute(
+            'DELETE FROM predictions WHERE key IN (SELECT key FROM predictions '
+            'ORDER BY expires DESC LIMIT -1 OFFSET ?)', (self.max_disk_entries,)
+        )
+
+    def invalidate(self, model_version=None):
+        """Forget everything, keeping only disk rows written for ``model_version``"""
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            self._db().execute(
+                'DELETE FROM predictions WHERE model_version IS NOT ?', (model_version,)
+            )
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                'disk_tier': bool(self.db_path),
+            }
@@ -0,0 +1,261 @@
+"""Production server: preload once, fork workers that share the model pages
+
+    python serve.py [--workers 4] [--threads 8] [--port 5000]
+
+The master imports the application (loading the models), moves everything
+allocated so far into the permanent GC generation with ``gc.freeze()`` so
+collections in the workers do not touch, and therefore copy, those pages, and
+then forks workers that all accept from one listening socket.
+
+Signals to the master:
+    SIGHUP           reload the models in the master and replace the workers
+                     one generation at a time; in-flight requests finish.
+                     Models that fail their smoke test are not rolled out
+    SIGTERM, SIGINT  stop accepting, let workers drain, exit
+    SIGTTIN/SIGTTOU  add / remove one worker
+
+The master also polls the model registry's CURRENT file (every
+AGRIWISE_MODEL_WATCH_SECONDS, default 5, 0 disables) and does the same as
+SIGHUP when it changes. POST /admin/reload on a worker signals the master.
+"""
+import argparse
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+
+class RequestHandler(WSGIRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = 15  # drop idle keep-alive connections so they do not pin threads
+    access_log = False
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+
+class PooledWSGIServer(ThreadingMixIn, BaseWSGIServer):
+    """werkzeug server handling connections on a fixed-size thread pool"""
+
+    multithread = True
+    daemon_threads = True
+
+    def __init__(self, host, port, app, threads, fd):
+        super().__init__(host, port, app, handler=RequestHandler, fd=fd)
+        self.pool = ThreadPoolExecutor(threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def drain(self, timeout):
+        """Stop accepting and wait up to ``timeout`` seconds for in-flight requests"""
+        self.shutdown()
+        done = threading.Event()
+        threading.Thread(target=lambda: (self.pool.shutdown(wait=True), done.set()), daemon=True).start()
+        done.wait(timeout)
+
+
+def load_app(target):
+    """Import ``module:attribute`` and return the WSGI application"""
+    module_name, _, attribute = target.partition(':')
+    return getattr(importlib.import_module(module_name), attribute or 'app')
+
+
+def run_worker(app, sock, args):
+    """Serve until told to stop; runs in the forked child"""
+    for sig in (signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+        signal.signal(sig, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the master handles Ctrl-C
+
+    server = PooledWSGIServer(args.host, args.port, app, args.threads, sock.fileno())
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        if not stopping.is_set():
+            stopping.set()
+            threading.Thread(target=server.drain, args=(args.graceful_timeout,), daemon=True).start()
+
+    signal.signal(signal.SIGTERM, stop)
+    server.serve_forever(poll_interval=0.5)
+    # serve_forever returns once drain() has called shutdown(); wait for the pool
+    server.pool.shutdown(wait=True)
+    os._exit(0)
+
+
+class Master:
+    def __init__(self, args):
+        self.args = args
+        self.workers = {}  # pid -> generation
+        self.generation = 0
+        self.target = args.workers
+        self.signals = []
+        self.app = None
+        self.sock = None
+        self.watch_interval = float(os.environ.get('AGRIWISE_MODEL_WATCH_SECONDS', 5))
+        self.next_watch = 0
+
+    def preload(self):
+        start = time.perf_counter()
+        self.app = load_app(self.args.app)
+        self._freeze()
+        print(f"[master {os.getpid()}] loaded {self.args.app} in {time.perf_counter() - start:.2f}s", flush=True)
+
+    def _ai_system(self):
+        return getattr(sys.modules[self.args.app.partition(':')[0]], 'ai_system', None)
+
+    def reload_models(self):
+        """Reload and validate the models in the master; False if the new ones were rejected"""
+        ai = self._ai_system()
+        if ai is None:
+            return True
+        gc.unfreeze()  # let the previous models be collected
+        try:
+            ai.reload_models(force=True)
+        except Exception as e:
+            print(f"[master {os.getpid()}] keeping model version {ai.model_version}: {e}", flush=True)
+            return False
+        finally:
+            self._freeze()
+        print(f"[master {os.getpid()}] reloaded models, version {ai.model_version}", flush=True)
+        return True
+
+    def models_changed(self):
+        """Poll the registry at most every watch_interval seconds"""
+        if self.watch_interval <= 0 or time.monotonic() < self.next_watch:
+            return False
+        self.next_watch = time.monotonic() + self.watch_interval
+        ai = self._ai_system()
+        return ai is not None and ai.models_outdated()
+
+    @staticmethod
+    def _freeze():
+        gc.collect()
+        gc.freeze()
+
+    def bind(self):
+        self.sock = socket.create_server((self.args.host, self.args.port), backlog=self.args.backlog, reuse_port=False)
+        self.sock.set_inheritable(True)
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(self.app, self.sock, self.args)
+            finally:
+                os._exit(1)
+        self.workers[pid] = self.generation
+        return pid
+
+    def stop_workers(self, pids, sig=signal.SIGTERM):
+        for pid in pids:
+            try:
+                os.kill(pid, sig)
+            except ProcessLookupError:
+                pass
+
+    def reap(self):
+        """Collect exited workers; returns the pids that exited"""
+        exited = []
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            if pid in self.workers:
+                del self.workers[pid]
+                exited.append((pid, status))
+        return exited
+
+    def run(self):
+        self.preload()
+        self.bind()
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, lambda signum, frame: self.signals.append(signum))
+
+        for _ in range(self.target):
+            self.spawn()
+        print(f"[master {os.getpid()}] listening on http://{self.args.host}:{self.args.port} "
+              f"with {self.target} workers x {self.args.threads} threads", flush=True)
+
+        while True:
+            while self.signals:
+                signum = self.signals.pop(0)
+                if signum in (signal.SIGTERM, signal.SIGINT):
+                    return self.shutdown()
+                if signum == signal.SIGHUP:
+                    self.rolling_restart()
+                elif signum == signal.SIGTTIN:
+                    self.target += 1
+                elif signum == signal.SIGTTOU and self.target > 1:
+                    self.target -= 1
+                    newest = max(self.workers, key=lambda pid: (self.workers[pid], pid))
+                    self.stop_workers([newest])
+
+            if self.models_changed():
+                self.rolling_restart()
+
+            for pid, status in self.reap():
+                if status:
+                    print(f"[master {os.getpid()}] worker {pid} exited with status {status}", flush=True)
+            while len(self.workers) < self.target:
+                self.spawn()
+            time.sleep(0.2)
+
+    def rolling_restart(self):
+        """Start a new generation of workers, then retire the old one"""
+        if not self.reload_models():
+            return
+        self.generation += 1
+        old = [pid for pid, generation in self.workers.items() if generation < self.generation]
+        for _ in range(self.target):
+            self.spawn()
+        self.stop_workers(old)
+        print(f"[master {os.getpid()}] generation {self.generation} started, retiring {len(old)} workers", flush=True)
+
+    def shutdown(self):
+        print(f"[master {os.getpid()}] shutting down", flush=True)
+        self.stop_workers(list(self.workers))
+        deadline = time.time() + self.args.graceful_timeout + 1
+        while self.workers and time.time() < deadline:
+            self.reap()
+            time.sleep(0.1)
+        self.stop_workers(list(self.workers), signal.SIGKILL)
+        self.reap()
+        self.sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AgriWise AI production server')
+    parser.add_argument('--app', default='app:app', help='module:attribute of the WSGI app')
+    parser.add_argument('--host', default=os.environ.get('AGRIWISE_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=int(os.environ.get('AGRIWISE_WORKERS', os.cpu_count() or 1)))
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('AGRIWISE_THREADS', 8)),
+                        help='request threads per worker')
+    parser.add_argument('--backlog', type=int, default=2048)
+    parser.add_argument('--graceful-timeout', type=float, default=30,
+                        help='seconds a stopping worker may spend finishing requests')
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args(argv)
+
+    RequestHandler.access_log = args.access_log
+    # Inference thread pools size themselves to this worker's share of the CPUs
+    os.environ['AGRIWISE_WORKERS'] = str(args.workers)
+    # Workers forward admin reload requests here
+    os.environ['AGRIWISE_MASTER_PID'] = str(os.getpid())
+    Master(args).run()
+
+
+if __name__ == '__main__':
+    main()
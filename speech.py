@@ -0,0 +1,484 @@
+"""Streaming speech-to-text
+
+Audio arrives in arbitrary-sized chunks and flows through:
+
+    decoder -> resampler -> ring buffer -> normalizer -> recognizer
+
+Only a few fixed-size frames are held in memory per stream, so a long
+recording costs no more than a short one. Recognizers are pluggable: Vosk
+when it is installed and a model is configured, otherwise an energy-based
+stand-in that segments speech without transcribing it.
+"""
+import json
+import os
+import queue
+import shutil
+import struct
+import subprocess
+import threading
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 4000  # 250 ms at 16 kHz
+RING_FRAMES = 4
+
+WAV_MIMETYPES = {'audio/wav', 'audio/x-wav', 'audio/wave', 'audio/vnd.wave'}
+FFMPEG_MIMETYPES = {'audio/ogg', 'audio/opus', 'audio/webm', 'video/webm', 'audio/mpeg', 'audio/mp4'}
+
+
+class UnsupportedAudio(ValueError):
+    pass
+
+
+# Decoders: bytes in, mono float32 at the source rate out
+
+class WavDecoder:
+    """Incremental RIFF/WAVE parser for PCM (8/16/24/32-bit) and float32 data"""
+
+    def __init__(self):
+        self._header = bytearray()
+        self._remainder = b''
+        self.sample_rate = None
+        self.channels = None
+        self._dtype = None
+        self._width = None
+        self._in_data = False
+
+    def feed(self, data):
+        if not self._in_data:
+            self._header += data
+            if not self._parse_header():
+                return np.empty(0, np.float32)
+            data, self._header = bytes(self._header), None
+        return self._convert(data)
+
+    def _parse_header(self):
+        header = self._header
+        if len(header) < 12:
+            return False
+        if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise UnsupportedAudio('Not a RIFF/WAVE stream')
+        offset = 12
+        while len(header) >= offset + 8:
+            chunk_id = bytes(header[offset:offset + 4])
+            size = struct.unpack_from('<I', header, offset + 4)[0]
+            body = offset + 8
+            if chunk_id == b'data':
+                if self._dtype is None:
+                    raise UnsupportedAudio('WAV data chunk before fmt chunk')
+                # Streaming writers may leave the size as 0 or 0xFFFFFFFF; read to EOF
+                del header[:body]
+                self._in_data = True
+                return True
+            if len(header) < body + size + (size & 1):
+                return False
+            if chunk_id == b'fmt ':
+                self._parse_fmt(bytes(header[body:body + size]))
+            offset = body + size + (size & 1)
+        return False
+
+    def _parse_fmt(self, fmt):
+        audio_format, channels, rate, _, _, bits = struct.unpack_from('<HHIIHH', fmt)
+        if audio_format == 0xFFFE and len(fmt) >= 26:  # WAVE_FORMAT_EXTENSIBLE
+            audio_format = struct.unpack_from('<H', fmt, 24)[0]
+        if audio_format == 1 and bits in (8, 16, 24, 32):
+            self._dtype = {8: 'u1', 16: '<i2', 24: None, 32: '<i4'}[bits]
+        elif audio_format == 3 and bits == 32:
+            self._dtype = '<f4'
+        else:
+            raise UnsupportedAudio(f'Unsupported WAV encoding (format {audio_format}, {bits}-bit)')
+        self._width = bits // 8
+        self.sample_rate = rate
+        self.channels = channels
+
+    def _convert(self, data):
+        frame_bytes = self._width * self.channels
+        data = self._remainder + data
+        usable = len(data) - len(data) % frame_bytes
+        self._remainder = data[usable:]
+        raw = np.frombuffer(data, dtype=np.uint8, count=usable)
+
+        if self._width == 3:
+            raw = raw.reshape(-1, 3)
+            samples = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                       | (raw[:, 2].astype(np.int8).astype(np.int32) << 16)).astype(np.float32) / 8388608
+        else:
+            samples = raw.view(self._dtype).astype(np.float32)
+            if self._dtype == 'u1':
+                samples = (samples - 128) / 128
+            elif self._dtype == '<i2':
+                samples /= 32768
+            elif self._dtype == '<i4':
+                samples /= 2147483648
+
+        if self.channels > 1:
+            samples = samples.reshape(-1, self.channels).mean(axis=1)
+        return samples
+
+    def close(self):
+        if not self._in_data:
+            raise UnsupportedAudio('Incomplete WAV header')
+        return np.empty(0, np.float32)
+
+
+class FFmpegDecoder:
+    """Decode compressed audio (Ogg/Opus, WebM, ...) through an ffmpeg subprocess"""
+
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self):
+        executable = shutil.which('ffmpeg')
+        if executable is None:
+            raise UnsupportedAudio('Compressed audio needs ffmpeg on the server; send WAV instead')
+        self._process = subprocess.Popen(
+            [executable, '-loglevel', 'error', '-i', 'pipe:0', '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+        )
+        self._output = queue.Queue()
+        self._remainder = b''
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        for block in iter(lambda: self._process.stdout.read1(1 << 16), b''):
+            self._output.put(block)
+        self._output.put(None)
+
+    def _drain(self, wait):
+        blocks = []
+        while True:
+            try:
+                block = self._output.get(block=wait)
+            except queue.Empty:
+                break
+            if block is None:
+                break
+            blocks.append(block)
+        data = self._remainder + b''.join(blocks)
+        usable = len(data) - len(data) % 2
+        self._remainder = data[usable:]
+        return np.frombuffer(data, dtype='<i2', count=usable // 2).astype(np.float32) / 32768
+
+    def feed(self, data):
+        self._process.stdin.write(data)
+        self._process.stdin.flush()
+        return self._drain(wait=False)
+
+    def close(self):
+        self._process.stdin.close()
+        samples = self._drain(wait=True)
+        if self._process.wait() != 0:
+            raise UnsupportedAudio('ffmpeg could not decode the audio')
+        return samples
+
+    def abort(self):
+        if self._process.poll() is None:
+            self._process.kill()
+
+
+def decoder_for(mimetype, head=b''):
+    """Pick a decoder from the content type, sniffing the first bytes if unspecific"""
+    if mimetype in WAV_MIMETYPES or head[:4] == b'RIFF':
+        return WavDecoder()
+    if mimetype in FFMPEG_MIMETYPES or head[:4] in (b'OggS', b'\x1aE\xdf\xa3'):
+        return FFmpegDecoder()
+    raise UnsupportedAudio(f'Unsupported audio type {mimetype or "unknown"!r}')
+
+
+# Signal conditioning
+
+class Resampler:
+    """Streaming resampler: windowed-sinc low-pass (when downsampling) + linear interpolation"""
+
+    def __init__(self, source_rate, target_rate=SAMPLE_RATE, taps=31):
+        self.step = source_rate / target_rate
+        self._pos = 0.0
+        self._tail = np.zeros(1, np.float32)
+        self._fir = None
+        if source_rate > target_rate:
+            n = np.arange(taps) - (taps - 1) / 2
+            cutoff = 0.5 / self.step
+            fir = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(taps)
+            self._fir = (fir / fir.sum()).astype(np.float32)
+            self._history = np.zeros(taps - 1, np.float32)
+
+    def process(self, samples):
+        if self.step == 1.0 or not len(samples):
+            return samples
+        if self._fir is not None:
+            padded = np.concatenate((self._history, samples))
+            self._history = padded[-(len(self._fir) - 1):]
+            samples = np.convolve(padded, self._fir, mode='valid').astype(np.float32)
+
+        buf = np.concatenate((self._tail, samples))
+        last = len(buf) - 1
+        if last <= self._pos:
+            self._pos -= len(samples)
+            self._tail = buf[-1:]
+            return np.empty(0, np.float32)
+        count = int(np.ceil((last - self._pos) / self.step))
+        positions = self._pos + self.step * np.arange(count)
+        out = np.interp(positions, np.arange(len(buf)), buf).astype(np.float32)
+        self._pos = self._pos + self.step * count - last
+        self._tail = buf[-1:]
+        return out
+
+
+class RingBuffer:
+    """Fixed-capacity float32 FIFO"""
+
+    def __init__(self, capacity):
+        self._data = np.zeros(capacity, np.float32)
+        self._start = 0
+        self.size = 0
+
+    @property
+    def capacity(self):
+        return len(self._data)
+
+    def write(self, samples):
+        """Copy as many samples as fit; return how many were taken"""
+        n = min(len(samples), self.capacity - self.size)
+        end = (self._start + self.size) % self.capacity
+        first = min(n, self.capacity - end)
+        self._data[end:end + first] = samples[:first]
+        self._data[:n - first] = samples[first:n]
+        self.size += n
+        return n
+
+    def read_into(self, out):
+        n = len(out)
+        first = min(n, self.capacity - self._start)
+        out[:first] = self._data[self._start:self._start + first]
+        out[first:] = self._data[:n - first]
+        self._start = (self._start + n) % self.capacity
+        self.size -= n
+        return out
+
+
+class Normalizer:
+    """DC removal and slow automatic gain control towards a target RMS"""
+
+    def __init__(self, target_rms=0.1, max_gain=10.0, smoothing=0.3):
+        self.target_rms = target_rms
+        self.max_gain = max_gain
+        self.smoothing = smoothing
+        self._level = None
+
+    def process(self, frame):
+        frame -= frame.mean()
+        rms = float(np.sqrt(np.dot(frame, frame) / len(frame)))
+        self._level = rms if self._level is None else self._level + self.smoothing * (rms - self._level)
+        gain = min(self.max_gain, self.target_rms / max(self._level, 1e-6))
+        frame *= gain
+        np.clip(frame, -1.0, 1.0, out=frame)
+        return frame
+
+
+# Recognizers: start(language) returns a session with accept(frame) and finish()
+
+class STTEngine:
+    name = 'base'
+
+    def start(self, language):
+        raise NotImplementedError
+
+
+class EnergyEngine(STTEngine):
+    """Offline stand-in: detects speech segments by frame energy, no vocabulary"""
+
+    name = 'energy'
+
+    def start(self, language):
+        return _EnergySession()
+
+
+class _EnergySession:
+    window = 320  # 20 ms
+
+    def __init__(self):
+        self.noise = None
+        self.segments = []
+        self._speech = 0
+        self._silence = 0
+        self._snr = []
+        self.samples = 0
+
+    def accept(self, frame):
+        windows = frame[:len(frame) - len(frame) % self.window].reshape(-1, self.window)
+        energy = np.maximum((windows * windows).mean(axis=1), 1e-10)
+        partial = None
+        for e in energy:
+            if self.noise is None:
+                self.noise = e
+            snr = 10 * np.log10(e / self.noise)
+            if snr > 9:
+                self._speech += 1
+                self._silence = 0
+                self._snr.append(snr)
+            else:
+                self.noise += 0.05 * (e - self.noise)
+                self._silence += 1
+                if self._speech and self._silence >= 15:  # 300 ms pause closes a segment
+                    partial = self._close_segment()
+        self.samples += len(frame)
+        return partial
+
+    def _close_segment(self):
+        if self._speech >= 5:
+            self.segments.append(self._speech * self.window / SAMPLE_RATE)
+        self._speech = 0
+        return self.text() or None
+
+    def text(self):
+        return ' '.join(f'[speech {seconds:.1f}s]' for seconds in self.segments)
+
+    def finish(self):
+        self._close_segment()
+        confidence = min(1.0, float(np.mean(self._snr)) / 30) if self._snr else 0.0
+        return {'text': self.text(), 'confidence': round(confidence, 2)}
+
+
+class VoskEngine(STTEngine):
+    """Offline Kaldi recognizer; models come from AGRIWISE_VOSK_MODEL[_<LANG>]"""
+
+    name = 'vosk'
+
+    def __init__(self):
+        import vosk
+
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self._models = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def model_path(language):
+        return (os.environ.get(f'AGRIWISE_VOSK_MODEL_{language.upper()}')
+                or os.environ.get('AGRIWISE_VOSK_MODEL'))
+
+    def start(self, language):
+        path = self.model_path(language)
+        if not path:
+            raise UnsupportedAudio(f'No Vosk model configured for language {language!r}')
+        with self._lock:
+            if path not in self._models:
+                self._models[path] = self._vosk.Model(path)
+        recognizer = self._vosk.KaldiRecognizer(self._models[path], SAMPLE_RATE)
+        recognizer.SetWords(True)
+        return _VoskSession(recognizer)
+
+
+class _VoskSession:
+    def __init__(self, recognizer):
+        self.recognizer = recognizer
+        self.final = []
+        self.confidences = []
+
+    def _collect(self, result):
+        result = json.loads(result)
+        if result.get('text'):
+            self.final.append(result['text'])
+            self.confidences.extend(word['conf'] for word in result.get('result', []))
+
+    def accept(self, frame):
+        pcm = (frame * 32767).astype('<i2').tobytes()
+        if self.recognizer.AcceptWaveform(pcm):
+            self._collect(self.recognizer.Result())
+            return ' '.join(self.final)
+        partial = json.loads(self.recognizer.PartialResult()).get('partial')
+        return ' '.join(self.final + [partial]) if partial else None
+
+    def finish(self):
+        self._collect(self.recognizer.FinalResult())
+        confidence = float(np.mean(self.confidences)) if self.confidences else 0.0
+        return {'text': ' '.join(self.final), 'confidence': round(confidence, 2)}
+
+
+ENGINES = {
+    EnergyEngine.name: EnergyEngine,
+    VoskEngine.name: VoskEngine,
+}
+
+
+def default_engine():
+    """AGRIWISE_STT_ENGINE, else Vosk when installed and configured, else the energy stand-in"""
+    name = os.environ.get('AGRIWISE_STT_ENGINE')
+    if name:
+        return ENGINES[name]()
+    if os.environ.get('AGRIWISE_VOSK_MODEL'):
+        try:
+            return VoskEngine()
+        except ImportError:
+            pass
+    return EnergyEngine()
+
+
+def transcribe_stream(chunks, engine, language, mimetype=None, frame_samples=FRAME_SAMPLES):
+    """Return a generator of ``{'partial': text}`` events followed by a final result
+
+    The first chunk is read and the format checked up front, so unsupported
+    audio raises UnsupportedAudio here rather than mid-stream. The final event
+    carries ``text``, ``confidence``, ``duration`` (seconds of audio),
+    ``language`` and ``engine``.
+    """
+    chunks = iter(chunks)
+    head = b''
+    for chunk in chunks:
+        # Enough bytes to sniff the format, however small the client's chunks
+        head += chunk
+        if len(head) >= 12:
+            break
+    decoder = decoder_for(mimetype, head)
+    session = engine.start(language)
+    return _transcribe(_prepend(head, chunks), decoder, session, engine, language, frame_samples)
+
+
+def _transcribe(chunks, decoder, session, engine, language, frame_samples):
+    ring = RingBuffer(frame_samples * RING_FRAMES)
+    frame = np.empty(frame_samples, np.float32)
+    normalizer = Normalizer()
+    resampler = None
+    duration = 0
+    last_partial = None
+
+    def frames(samples):
+        nonlocal resampler, duration
+        if not len(samples):
+            return  # nothing decoded yet, e.g. the WAV header is still incomplete
+        if resampler is None:
+            resampler = Resampler(decoder.sample_rate)
+        samples = resampler.process(samples)
+        duration += len(samples)
+        while len(samples):
+            taken = ring.write(samples)
+            samples = samples[taken:]
+            while ring.size >= frame_samples:
+                yield normalizer.process(ring.read_into(frame))
+
+    try:
+        for chunk in chunks:
+            for f in frames(decoder.feed(chunk)):
+                partial = session.accept(f)
+                if partial and partial != last_partial:
+                    last_partial = partial
+                    yield {'partial': partial}
+        for f in frames(decoder.close()):
+            session.accept(f)
+        if ring.size:
+            tail = ring.read_into(np.empty(ring.size, np.float32))
+            session.accept(normalizer.process(np.pad(tail, (0, frame_samples - len(tail)))))
+    finally:
+        if hasattr(decoder, 'abort'):
+            decoder.abort()
+
+    result = session.finish()
+    result.update({'duration': round(duration / SAMPLE_RATE, 2), 'language': language, 'engine': engine.name})
+    yield result
+
+
+def _prepend(head, chunks):
+    if head:
+        yield head
+    yield from chunks
@@ -1,6 +1,11 @@
+import hashlib
+import io
+from concurrent.futures import ThreadPoolExecutor
+
 import streamlit as st
-import random
-from datetime import datetime, timedelta
+from PIL import Image
+
+from agriwise import get_engine
 
 # Page config with classic sidebar
 st.set_page_config(
@@ -113,195 +118,107 @@ def main():
     else:
         show_dashboard()
 
-class AgriWiseAI:
-    def __init__(self):
-        self.crop_diseases = {
-            'healthy': 'Healthy plant - Continue current care routine',
-            'early_blight': 'Early Blight - Apply copper-based fungicide and remove affected leaves',
-            'late_blight': 'Late Blight - Apply fungicide immediately and avoid overhead watering',
-            'leaf_mold': 'Leaf Mold - Improve air circulation and reduce humidity',
-            'spider_mites': 'Spider Mites - Use insecticidal soap or neem oil',
-            'target_spot': 'Target Spot - Apply fungicide and improve plant spacing'
-        }
-        self.crops = ['tomato', 'potato', 'corn', 'wheat', 'rice', 'beans']
-        random.seed(42)
-    
-    def predict_disease(self, image_uploaded):
-        """Predict crop disease (simulated)"""
-        try:
-            # Simulate AI analysis
-            diseases = list(self.crop_diseases.keys())
-            prediction = random.choice(diseases)
-            confidence = random.uniform(0.7, 0.95)
-            
-            return {
-                'disease': prediction,
-                'description': self.crop_diseases.get(prediction, 'Unknown disease'),
-                'confidence': round(confidence, 2),
-                'recommendations': self._get_recommendations(prediction)
-            }
-        except Exception as e:
-            return {'error': str(e)}
-    
-    def _get_recommendations(self, disease):
-        """Get treatment recommendations"""
-        recommendations = {
-            'healthy': ['Continue current care routine', 'Monitor for any changes'],
-            'early_blight': ['Apply copper-based fungicide', 'Remove affected leaves', 'Improve air circulation'],
-            'late_blight': ['Apply fungicide immediately', 'Remove all affected parts', 'Avoid overhead watering'],
-            'leaf_mold': ['Reduce humidity', 'Improve ventilation', 'Apply fungicide if severe'],
-            'spider_mites': ['Apply insecticidal soap', 'Use neem oil', 'Increase humidity'],
-            'target_spot': ['Apply fungicide', 'Improve plant spacing', 'Remove affected leaves']
-        }
-        return recommendations.get(disease, ['Consult local agricultural expert'])
-    
-    def get_weather(self, location):
-        """Get weather forecast (simulated)"""
-        weather_data = []
-        base_temp = random.uniform(20, 30)
-        base_rainfall = random.uniform(0, 20)
-        
-        for i in range(7):
-            date = datetime.now() + timedelta(days=i)
-            temp = base_temp + random.uniform(-5, 5)
-            rainfall = base_rainfall + random.uniform(-5, 10)
-            humidity = random.uniform(40, 80)
-            
-            weather_data.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'temperature': round(temp, 1),
-                'rainfall': round(rainfall, 1),
-                'humidity': round(humidity, 1),
-                'condition': self._get_weather_condition(temp, humidity, rainfall)
-            })
-        return weather_data
-    
-    def _get_weather_condition(self, temp, humidity, rainfall):
-        """Determine weather condition"""
-        if rainfall > 10:
-            return '🌧️ Rainy'
-        elif temp > 25 and humidity < 50:
-            return '☀️ Sunny'
-        elif humidity > 70:
-            return '☁️ Cloudy'
-        else:
-            return '⛅ Partly Cloudy'
-    
-    def get_market_prices(self, crop):
-        """Get market prices (simulated)"""
-        try:
-            base_prices = {
-                'tomato': 50, 'potato': 30, 'corn': 25, 
-                'wheat': 35, 'rice': 40, 'beans': 45
-            }
-            current = base_prices.get(crop, 30)
-            forecast = current + random.uniform(-10, 15)
-            
-            return {
-                'crop': crop,
-                'current_price': round(current, 2),
-                'forecast_price': round(forecast, 2),
-                'trend': '📈 UP' if forecast > current else '📉 DOWN',
-                'confidence': round(random.uniform(0.6, 0.9), 2),
-                'recommendation': self._get_market_recommendation(current, forecast)
-            }
-        except Exception as e:
-            st.error(f"Error in market analysis: {str(e)}")
-            return {
-                'crop': crop,
-                'current_price': 30.0,
-                'forecast_price': 32.0,
-                'trend': '📊 STABLE',
-                'confidence': 0.7,
-                'recommendation': 'Market data temporarily unavailable'
-            }
-    
-    def _get_market_recommendation(self, current, forecast):
-        """Get market recommendations"""
-        try:
-            if forecast > current * 1.1:
-                return "Consider holding harvest for better prices"
-            elif forecast < current * 0.9:
-                return "Consider selling soon to avoid price drops"
-            else:
-                return "Prices are stable, plan harvest based on crop readiness"
-        except Exception as e:
-            return "Consult local market experts for recommendations"
-    
-    def assess_loan(self, income, land, experience, credit_score, age, crop_yield):
-        """Assess loan eligibility (simulated)"""
-        try:
-            # Validate inputs
-            if not all(isinstance(x, (int, float)) for x in [income, land, experience, credit_score, age, crop_yield]):
-                st.error("Please enter valid numbers for all fields")
-                return None
-            
-            # Simple scoring system
-            score = 0
-            if income > 5000: score += 2
-            elif income > 3000: score += 1
-            
-            if land > 5: score += 2
-            elif land > 2: score += 1
-            
-            if experience > 10: score += 2
-            elif experience > 5: score += 1
-            
-            if credit_score > 700: score += 2
-            elif credit_score > 600: score += 1
-            
-            if age > 25 and age < 60: score += 1
-            
-            if crop_yield > 1000: score += 1
-            
-            eligible = score >= 4
-            probability = min(score / 8, 0.95)
-            
-            # Calculate loan amount
-            base_amount = income * 3
-            if credit_score > 700: base_amount *= 1.2
-            if experience > 10: base_amount *= 1.1
-            if land > 5: base_amount *= 1.15
-            
-            recommended_amount = min(base_amount, 50000)
-            
-            # Risk assessment
-            if score >= 6:
-                risk_level = 'Low'
-                conditions = ['Standard interest rate', 'Flexible repayment terms']
-            elif score >= 4:
-                risk_level = 'Medium'
-                conditions = ['Slightly higher interest rate', 'Collateral required']
-            else:
-                risk_level = 'High'
-                conditions = ['Higher interest rate', 'Guarantor required', 'Shorter repayment period']
-            
-            return {
-                'eligible': eligible,
-                'probability': round(probability, 2),
-                'recommended_amount': round(recommended_amount, 2),
-                'risk_level': risk_level,
-                'conditions': conditions,
-                'score': score
-            }
-        except Exception as e:
-            st.error(f"Error in loan assessment: {str(e)}")
-            return {
-                'eligible': False,
-                'probability': 0.0,
-                'recommended_amount': 0.0,
-                'risk_level': 'Error',
-                'conditions': ['Please check your input values'],
-                'score': 0
-            }
+# Day conditions and price trends as the engine reports them, with their display labels
+CONDITION_LABELS = {
+    'Rainy': '🌧️ Rainy',
+    'Sunny': '☀️ Sunny',
+    'Cloudy': '☁️ Cloudy',
+    'Partly Cloudy': '⛅ Partly Cloudy'
+}
+TREND_LABELS = {'up': '📈 UP', 'down': '📉 DOWN'}
 
-# Initialize AI
+# The shared engine, loaded once per process and reused by every session
 @st.cache_resource
 def load_ai():
-    return AgriWiseAI()
+    return get_engine()
 
 ai = load_ai()
 
+# Streamlit reruns this script on every interaction. Results are memoized
+# across reruns and sessions by their inputs, and the latest request on each
+# page is kept in st.session_state so it is shown again from the cache.
+FORECAST_TTL = 600
+PRICES_TTL = 3600
+LOAN_TTL = 3600
+PREVIEW_SIZE = 800
+ANALYSIS_WORKERS = 2
+MAX_SESSION_ANALYSES = 8
+
+def cached(function, *args):
+    """Call a st.cache_data function, dropping engine error results from its cache"""
+    result = function(*args)
+    if isinstance(result, dict) and 'error' in result:
+        function.clear(*args)
+    return result
+
+@st.cache_data(ttl=FORECAST_TTL, show_spinner=False)
+def weather_forecast(location):
+    """7-day forecast for a weather grid cell (or unknown place name)"""
+    return ai.predict_weather(location)
+
+@st.cache_data(ttl=PRICES_TTL, show_spinner=False)
+def market_prices(crop):
+    return ai.get_market_prices(crop)
+
+@st.cache_data(ttl=LOAN_TTL, show_spinner=False)
+def loan_assessment(farmer_data, model_version):
+    """Assessment of one applicant; the model version keeps results of replaced models out"""
+    return ai.assess_loan_eligibility(farmer_data)
+
+@st.cache_data(max_entries=256, show_spinner=False)
+def diagnose(digest, model_version, _image_bytes, _progress=None):
+    """Disease detection keyed by the upload's hash rather than its bytes"""
+    return ai.predict_crop_disease(_image_bytes, _progress)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def image_preview(digest, _image_bytes):
+    """Downscaled JPEG of an upload, so reruns do not resend the full photo"""
+    image = Image.open(io.BytesIO(_image_bytes))
+    image.draft('RGB', (PREVIEW_SIZE, PREVIEW_SIZE))
+    image = image.convert('RGB')
+    image.thumbnail((PREVIEW_SIZE, PREVIEW_SIZE))
+    preview = io.BytesIO()
+    image.save(preview, format='JPEG', quality=85)
+    return preview.getvalue()
+
+@st.cache_resource
+def analysis_executor():
+    """Threads shared by every session for analyses that run across reruns"""
+    return ThreadPoolExecutor(max_workers=ANALYSIS_WORKERS, thread_name_prefix='agriwise-analysis')
+
+class Analysis:
+    """A background analysis and the progress its work reports"""
+    
+    def __init__(self, function, *args):
+        self.fraction = 0.0
+        self.message = 'Queued'
+        self.future = analysis_executor().submit(function, *args, self.progress)
+    
+    def progress(self, fraction, message=None):
+        self.fraction = max(0.0, min(1.0, float(fraction)))
+        if message:
+            self.message = message
+    
+    def failed(self):
+        return self.future.done() and self.future.exception() is not None
+
+def start_analysis(key, function, *args):
+    """Run ``function(*args, progress)`` in the background, once per key and session"""
+    analyses = st.session_state.setdefault('analyses', {})
+    analysis = analyses.get(key)
+    if analysis is None or analysis.failed():
+        analysis = analyses[key] = Analysis(function, *args)
+        while len(analyses) > MAX_SESSION_ANALYSES:
+            analyses.pop(next(iter(analyses)))
+    return analysis
+
+@st.fragment(run_every=0.5)
+def analysis_progress(analysis):
+    """Poll a running analysis without rerunning the rest of the page"""
+    if analysis.future.done():
+        st.rerun()
+    st.progress(analysis.fraction, text=f"🤖 {analysis.message}...")
+
 def show_dashboard():
     st.title("🌾 Welcome to AgriWise AI")
     
@@ -355,11 +272,24 @@ def show_disease():
     uploaded_file = st.file_uploader("Upload crop image", type=['jpg', 'jpeg', 'png'])
     
     if uploaded_file is not None:
-        st.image(uploaded_file, caption="Uploaded Image", use_column_width=True)
+        image_bytes = uploaded_file.getvalue()
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        st.image(image_preview(digest, image_bytes), caption="Uploaded Image", width="stretch")
         
+        version = ai.models.version
+        key = ('disease', digest, version)
+        analysis = st.session_state.get('analyses', {}).get(key)
         if st.button("🔍 Analyze Disease", use_container_width=True):
-            with st.spinner("🤖 AI is analyzing your crop image..."):
-                result = ai.predict_disease(uploaded_file)
+            analysis = start_analysis(key, cached, diagnose, digest, version, image_bytes)
+        
+        if analysis is not None:
+            if not analysis.future.done():
+                analysis_progress(analysis)
+            else:
+                try:
+                    result = analysis.future.result()
+                except Exception as e:
+                    result = {'error': str(e)}
                 
                 if 'error' not in result:
                     st.markdown(f"""
@@ -385,8 +315,15 @@ def show_weather():
     location = st.text_input("📍 Enter your location", value="Nairobi")
     
     if st.button("🌤️ Get Weather Forecast", use_container_width=True):
+        st.session_state['weather_location'] = location
+    
+    location = st.session_state.get('weather_location')
+    if location is not None:
         with st.spinner("🌤️ Fetching weather data..."):
-            weather_data = ai.get_weather(location)
+            weather_data = cached(weather_forecast, ai.weather_key(location))
+            if 'error' in weather_data:
+                st.error(f"❌ Error: {weather_data['error']}")
+                return
             
             st.subheader(f"🌤️ 7-Day Weather Forecast for {location}")
             
@@ -394,7 +331,7 @@ def show_weather():
             for i, day in enumerate(weather_data):
                 with st.container():
                     st.markdown(f"""
-                    **{day['date']}:** {day['condition']} | 🌡️ {day['temperature']}°C | 💧 {day['rainfall']}mm | 💨 {day['humidity']}% humidity
+                    **{day['date']}:** {CONDITION_LABELS.get(day['condition'], day['condition'])} | 🌡️ {day['temperature']}°C | 💧 {day['rainfall']}mm | 💨 {day['humidity']}% humidity
                     """)
                     if i < len(weather_data) - 1:
                         st.markdown("---")
@@ -419,11 +356,15 @@ def show_market():
     crop = st.selectbox("🌾 Select Crop", ai.crops)
     
     if st.button("📊 Get Market Data", use_container_width=True):
+        st.session_state['market_crop'] = crop
+    
+    crop = st.session_state.get('market_crop')
+    if crop is not None:
         try:
             with st.spinner("📊 Analyzing market trends..."):
-                result = ai.get_market_prices(crop)
+                result = cached(market_prices, crop)
                 
-                if result:
+                if 'error' not in result:
                     # Use st.write for better dark theme compatibility
                     st.markdown("### 📊 Market Analysis Results")
                     st.markdown(f"""
@@ -431,7 +372,7 @@ def show_market():
                         <h4 style="color: #2C3E50;">{result['crop'].upper()} Market Intelligence</h4>
                         <p style="color: #2C3E50;"><strong>Current Price:</strong> KSH {result['current_price']}/kg</p>
                         <p style="color: #2C3E50;"><strong>Forecast Price:</strong> KSH {result['forecast_price']}/kg</p>
-                        <p style="color: #2C3E50;"><strong>Trend:</strong> {result['trend']}</p>
+                        <p style="color: #2C3E50;"><strong>Trend:</strong> {TREND_LABELS.get(result['trend'], result['trend'])}</p>
                         <p style="color: #2C3E50;"><strong>Confidence:</strong> {(result['confidence'] * 100):.1f}%</p>
                         <p style="color: #2C3E50;"><strong>💡 Recommendation:</strong> {result['recommendation']}</p>
                     </div>
@@ -478,11 +419,22 @@ def show_loans():
     experience = st.number_input("🌱 Farming Experience (Years)", min_value=0, value=5)
     
     if st.button("💰 Assess Loan Eligibility", use_container_width=True):
+        st.session_state['loan_applicant'] = {
+            'monthly_income': monthly_income,
+            'land_size': land_size,
+            'crop_yield': crop_yield,
+            'credit_score': credit_score,
+            'age': age,
+            'farming_experience': experience
+        }
+    
+    applicant = st.session_state.get('loan_applicant')
+    if applicant is not None:
         try:
             with st.spinner("🤖 Analyzing loan eligibility..."):
-                result = ai.assess_loan(monthly_income, land_size, experience, credit_score, age, crop_yield)
+                result = cached(loan_assessment, applicant, ai.models.version)
                 
-                if result:
+                if 'error' not in result:
                     status_icon = "✅" if result['eligible'] else "❌"
                     status_text = "ELIGIBLE" if result['eligible'] else "NOT ELIGIBLE"
                     
@@ -495,7 +447,6 @@ def show_loans():
                         <p style="color: #2C3E50;"><strong>Probability:</strong> {(result['probability'] * 100):.1f}%</p>
                         <p style="color: #2C3E50;"><strong>Recommended Amount:</strong> KSH {result['recommended_amount']:,.2f}</p>
                         <p style="color: #2C3E50;"><strong>Risk Level:</strong> {result['risk_level']}</p>
-                        <p style="color: #2C3E50;"><strong>Score:</strong> {result['score']}/8</p>
                         <h5 style="color: #2C3E50;">📋 Conditions:</h5>
                         <ul style="color: #2C3E50;">
                             {''.join([f'<li style="color: #2C3E50;">{condition}</li>' for condition in result['conditions']])}
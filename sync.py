@@ -0,0 +1,119 @@
+"""Offline sync bundles for low-connectivity clients
+
+``GET /api/sync?region=Nairobi&since=<version>`` returns in one response what
+the web client otherwise fetches action by action: the region's 7-day
+forecast, current prices for every crop and the disease/treatment tables.
+
+A bundle's version is the short content hash of each section, in
+``SECTIONS`` order, joined with dots (``3f2a...c1.91b0...7e.0d4c...a2``).
+A client that sends the version it holds gets back only the sections whose
+hash changed; an unknown or malformed ``since`` gets the full bundle::
+
+    {"version": "...", "region": "nairobi", "delta": true,
+     "sections": {"forecast": [...]}, "unchanged": ["prices", "diseases"]}
+
+Sections are rebuilt at most every ``ttl`` seconds, so versions are stable
+between refreshes, and recently served bundles are kept with their encoded
+bodies.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import http_caching
+from weather import normalize_location
+
+SECTIONS = ('forecast', 'prices', 'diseases')
+
+
+class SyncService:
+    """Builds, versions and caches sync bundles from an AgriWiseAI instance"""
+
+    def __init__(self, ai_system, ttl=300, max_entries=256):
+        self.ai_system = ai_system
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sections = OrderedDict()  # (section, region) -> (expires, digest, data)
+        self._bodies = OrderedDict()  # (region, version, changed) -> Representation
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, ai_system):
+        return cls(ai_system, ttl=float(os.environ.get('AGRIWISE_SYNC_TTL', 300)))
+
+    def bundle(self, region, since=None):
+        """Return (version, bundle dict) for ``region``, as a delta against ``since`` if given"""
+        region, version, sections, changed = self._resolve(region, since)
+        return version, self._document(region, version, sections, changed)
+
+    def representation(self, region, since=None):
+        """The bundle as an http_caching.Representation, versioned and compressed once per coding"""
+        region, version, sections, changed = self._resolve(region, since)
+        key = (region, version, changed)
+        with self._lock:
+            representation = self._bodies.get(key)
+            if representation is not None:
+                self._bodies.move_to_end(key)
+                return representation
+
+        document = self._document(region, version, sections, changed)
+        representation = http_caching.Representation(http_caching.canonical_json(document), version)
+        with self._lock:
+            self._bodies[key] = representation
+            while len(self._bodies) > self.max_entries:
+                self._bodies.popitem(last=False)
+        return representation
+
+    def _resolve(self, region, since):
+        region = normalize_location(region)
+        sections = {
+            'forecast': self._forecast(region),
+            'prices': self._section('prices', '', self._prices),
+            'diseases': self._section('diseases', '', self._diseases),
+        }
+        digests = [sections[name][0] for name in SECTIONS]
+        version = '.'.join(digests)
+
+        # None means a full bundle; otherwise the sections that differ from ``since``
+        held = since.split('.') if since else []
+        if len(held) != len(SECTIONS):
+            return region, version, sections, None
+        changed = tuple(name for name, old, new in zip(SECTIONS, held, digests) if old != new)
+        return region, version, sections, changed
+
+    def _document(self, region, version, sections, changed):
+        included = SECTIONS if changed is None else changed
+        return {
+            'version': version,
+            'region': region,
+            'delta': changed is not None,
+            'sections': {name: sections[name][1] for name in included},
+            'unchanged': [name for name in SECTIONS if name not in included],
+        }
+
+    def _section(self, name, region, build):
+        """(digest, data) for a section, rebuilt once its ttl has passed"""
+        key = (name, region)
+        now = time.time()
+        entry = self._sections.get(key)
+        if entry is None or entry[0] <= now:
+            data = build()
+            entry = (now + self.ttl, http_caching.digest(data), data)
+        with self._lock:
+            self._sections[key] = entry
+            self._sections.move_to_end(key)
+            while len(self._sections) > self.max_entries:
+                self._sections.popitem(last=False)
+        return entry[1], entry[2]
+
+    def _forecast(self, region):
+        # Keyed by grid cell, so every name and spelling of a place shares one section
+        key = self.ai_system.weather_key(region)
+        return self._section('forecast', key, lambda: self.ai_system.weather_service.forecast(key))
+
+    def _prices(self):
+        return {crop: self.ai_system.get_market_prices(crop) for crop in self.ai_system.crops}
+
+    def _diseases(self):
+        return self.ai_system.reference_data()['diseases']
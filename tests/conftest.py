@@ -0,0 +1,15 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Runtime files written by modules under test go to a scratch directory, not data/
+_scratch = tempfile.mkdtemp(prefix='agriwise-tests-')
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+os.environ.setdefault('AGRIWISE_AUDIO_CACHE_DIR', os.path.join(_scratch, 'audio'))
+os.environ.setdefault('AGRIWISE_JOBS_DB', os.path.join(_scratch, 'jobs.sqlite3'))
+# The offline TTS stand-in, so tests never reach the network
+os.environ.setdefault('AGRIWISE_TTS_ENGINES', 'tone')
@@ -0,0 +1,69 @@
+import re
+
+import pytest
+
+import http_caching
+
+
+@pytest.fixture(scope='module')
+def client():
+    import app
+
+    return app.app.test_client()
+
+
+@pytest.mark.parametrize('query', ['lat=0&lon=37&limit=0', 'lat=0&lon=37&limit=-1', 'q=Nai&limit=0'])
+def test_locations_rejects_limit_below_one(client, query):
+    response = client.get(f'/api/locations?{query}')
+    assert response.status_code == 400
+    assert 'limit' in response.get_json()['error']
+
+
+def test_locations_nearby(client):
+    body = client.get('/api/locations?lat=-0.9&lon=36.9&limit=2').get_json()
+    assert len(body['towns']) == 2 and len(body['markets']) == 2
+
+
+def test_tts_synthesizes_short_text(client):
+    response = client.post('/api/text-to-speech', json={'text': 'Habari', 'engine': 'tone'})
+    assert response.status_code == 200
+    assert client.get(response.get_json()['audio_url']).status_code == 200
+
+
+def test_tts_rejects_long_text(client):
+    import app
+
+    response = client.post('/api/text-to-speech', json={'text': 'x' * (app.MAX_TTS_CHARS + 1), 'engine': 'tone'})
+    assert response.status_code == 400
+    assert 'characters' in response.get_json()['error']
+
+
+def test_tts_rejects_engines_not_enabled(client, monkeypatch):
+    import app
+
+    monkeypatch.setattr(app, 'TTS_ENGINES', {'gtts'})
+    response = client.post('/api/text-to-speech', json={'text': 'Habari', 'engine': 'tone'})
+    assert response.status_code == 400
+    assert 'tone' in response.get_json()['error']
+
+
+def test_dashboard_follows_changed_assets(client, monkeypatch, tmp_path):
+    import app
+
+    image = tmp_path / 'images' / 'happy2.jpg'
+    image.parent.mkdir()
+    image.write_bytes(b'first')
+    assets = http_caching.StaticAssets(str(tmp_path))
+    monkeypatch.setattr(app, 'assets', assets)
+    monkeypatch.setitem(app.app.jinja_env.globals, 'asset_url', assets.url)
+    monkeypatch.setattr(app, '_index_page', None)
+
+    def image_url():
+        return re.search(r'/static/images/happy2\.[0-9a-f]{12}\.jpg', client.get('/').get_data(as_text=True))[0]
+
+    first = image_url()
+    assert client.get(first).status_code == 200
+    image.write_bytes(b'second version')
+    second = image_url()
+    assert second != first
+    assert client.get(second).status_code == 200
@@ -0,0 +1,42 @@
+import io
+
+import pytest
+from PIL import Image
+
+from agriwise import get_engine
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return get_engine()
+
+
+def png(colour):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), colour).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def no_batchers(engine, monkeypatch):
+    def refuse(item):
+        raise AssertionError('went through the micro-batcher')
+    monkeypatch.setattr(engine.models, 'loan_batcher', refuse)
+    monkeypatch.setattr(engine.models, 'disease_batcher', refuse)
+
+
+def test_unbatched_loan_matches_batched(engine):
+    record = {'income': 2500, 'land_size': 4, 'credit_score': 720}
+    batched = engine.assess_loan_eligibility(record)
+    assert 'error' not in batched
+    assert engine.assess_loan_eligibility(record, batched=False) == batched
+
+
+def test_unbatched_diagnosis_matches_batched(engine):
+    image = png((90, 140, 60))
+    assert engine.diagnose_image(image, batched=False) == engine.diagnose_image(image)
+
+
+def test_unbatched_calls_skip_the_batcher(engine, no_batchers):
+    assert 'eligible' in engine.assess_loan_eligibility({'income': 2500}, batched=False)
+    assert 'disease' in engine.diagnose_image(png((0, 0, 0)), batched=False)
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from gazetteer import Gazetteer, KDTree, parse_coordinates, unit_vectors
+
+
+@pytest.fixture(scope='module')
+def gazetteer():
+    return Gazetteer.load()
+
+
+def test_kdtree_matches_brute_force():
+    rng = np.random.default_rng(0)
+    points = unit_vectors(rng.uniform(-12, 5, 500), rng.uniform(28, 42, 500))
+    tree = KDTree(points)
+    for query in unit_vectors(rng.uniform(-12, 5, 50), rng.uniform(28, 42, 50)):
+        expected = np.argsort(((points - query) ** 2).sum(axis=1), kind='stable')[:5]
+        assert [index for _, index in tree.nearest(query.tolist(), 5)] == expected.tolist()
+
+
+def test_resolve_names_and_coordinates(gazetteer):
+    nairobi = gazetteer.resolve('Nairobi')
+    assert nairobi.place.name == 'Nairobi'
+    for text in ('nairobi', '  NAIROBI ', 'Nairobi, Kenya', 'Nairbi', f'{nairobi.lat},{nairobi.lon}'):
+        assert gazetteer.resolve(text).cell == nairobi.cell
+    assert gazetteer.resolve('Atlantis') is None
+    assert gazetteer.resolve('91,0') is None
+
+
+def test_nearest_is_sorted_by_distance(gazetteer):
+    found = gazetteer.nearest(-0.9, 36.9, 'market', 5)
+    assert len(found) == 5
+    assert [km for km, _ in found] == sorted(km for km, _ in found)
+    assert all(place.kind == 'market' for _, place in found)
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('-1.29,36.82', (-1.29, 36.82)),
+    (' 0 , 37 ', (0.0, 37.0)),
+    ('-91,0', None),
+    ('0,181', None),
+    ('Nairobi', None),
+])
+def test_parse_coordinates(text, expected):
+    assert parse_coordinates(text) == expected
+
+
+def test_autocomplete_prefix(gazetteer):
+    names = [place.name for place in gazetteer.complete('Ki', limit=20)]
+    assert names and all(name.lower().startswith('ki') for name in names)
+    # Shortest names first
+    assert [len(name) for name in names] == sorted(len(name) for name in names)
+
+
+@pytest.mark.parametrize('k', [0, -1])
+def test_nearest_without_results(gazetteer, k):
+    assert gazetteer.nearest(-0.9, 36.9, 'town', k) == []
+    assert KDTree(unit_vectors([0.0, 1.0], [37.0, 37.0])).nearest([1.0, 0.0, 0.0], k) == []
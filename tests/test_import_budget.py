@@ -0,0 +1,68 @@
+"""Budget for the cost of ``import app``, model loading included
+
+Each probe imports ``app`` in a fresh interpreter; the median of a few cold
+imports is held to the budget so one slow run does not fail the suite.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_SECONDS = 3.0
+MAX_RSS_MB = 256.0
+RUNS = 3
+
+# Only the endpoints that need these may import them. (pandas and scipy are
+# still pulled in by sklearn when the pickled forests are loaded.)
+LAZY_MODULES = [
+    'cv2', 'PIL.Image', 'gtts', 'speech_recognition', 'plotly', 'matplotlib',
+    'seaborn',
+]
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+rss_kb = None
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_kb': rss_kb,
+    'eager': [name for name in %r if name in sys.modules],
+}))
+''' % (LAZY_MODULES,)
+
+
+def probe():
+    completed = subprocess.run(
+        [sys.executable, '-c', PROBE], cwd=ROOT, capture_output=True, text=True
+    )
+    assert completed.returncode == 0, f'import app failed:\n{completed.stderr}'
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+@pytest.fixture(scope='module')
+def imports():
+    return [probe() for _ in range(RUNS)]
+
+
+def test_import_time(imports):
+    seconds = statistics.median(r['seconds'] for r in imports)
+    assert seconds <= MAX_SECONDS, f'import app took {seconds * 1000:.0f} ms (budget {MAX_SECONDS * 1000:.0f} ms)'
+
+
+def test_import_memory(imports):
+    rss_mb = statistics.median(r['rss_kb'] for r in imports) / 1024
+    assert rss_mb <= MAX_RSS_MB, f'import app left {rss_mb:.1f} MiB resident (budget {MAX_RSS_MB:.0f} MiB)'
+
+
+def test_heavy_dependencies_stay_lazy(imports):
+    assert sorted({name for r in imports for name in r['eager']}) == []
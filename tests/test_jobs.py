@@ -0,0 +1,43 @@
+import os
+import time
+
+import pytest
+
+from jobs import DONE, FAILED, JobManager
+
+
+def crash(payload, progress):
+    os._exit(1)
+
+
+def echo(payload, progress):
+    return payload
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = JobManager(str(tmp_path / 'jobs.sqlite3'), max_workers=1, poll_interval=0.05)
+    manager.register('crash', crash)
+    manager.register('echo', echo)
+    yield manager
+    manager._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def wait_for(manager, job_id, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job['status'] in (DONE, FAILED):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'job still {job["status"]} after {timeout}s')
+
+
+def test_dead_worker_fails_its_job_and_the_pool_recovers(manager):
+    crashed = wait_for(manager, manager.submit('crash', {})['id'])
+    assert crashed['status'] == FAILED
+    assert 'worker process died' in crashed['error']
+
+    job = wait_for(manager, manager.submit('echo', {'n': 1})['id'])
+    assert job['status'] == DONE
+    assert job['result'] == {'n': 1}
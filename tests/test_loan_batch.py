@@ -0,0 +1,66 @@
+import io
+import json
+
+import pytest
+
+import loan_batch
+from agriwise import LOAN_CONDITIONS, get_engine
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return get_engine()
+
+
+def strict_loads(line):
+    def reject(constant):
+        raise ValueError(f'{constant} is not valid JSON')
+    return json.loads(line, parse_constant=reject)
+
+
+def assess(engine, body):
+    records = loan_batch.iter_records(io.BytesIO(body.encode()), 'application/x-ndjson')
+    output = ''.join(loan_batch.stream_assessments(engine, records, LOAN_CONDITIONS))
+    return [strict_loads(line) for line in output.splitlines()]
+
+
+def test_valid_rows_carry_their_id(engine):
+    results = assess(engine, '{"id": "a1", "monthly_income": 20000}\n{"farmer_id": 7, "land_size": 2}\n')
+    assert [result['id'] for result in results] == ['a1', 7]
+    assert all('eligible' in result for result in results)
+
+
+@pytest.mark.parametrize('value', ['NaN', 'Infinity', '-Infinity', '1e400', '-1e308'])
+def test_non_finite_values_are_row_errors(engine, value):
+    body = '{"id": 1, "monthly_income": 20000}\n{"id": 2, "monthly_income": %s}\n{"id": 3}\n' % value
+    results = assess(engine, body)
+    assert [result['row'] for result in results] == [1, 2, 3]
+    assert [result['id'] for result in results] == [1, 2, 3]
+    assert 'monthly_income' in results[1]['error']
+    assert 'error' not in results[0] and 'error' not in results[2]
+
+
+def test_parse_errors_keep_the_batch_going(engine):
+    results = assess(engine, '{"id": 1}\nnot json\n[1, 2]\n')
+    assert results[0]['id'] == 1
+    assert [result['row'] for result in results[1:]] == [2, 3]
+    assert all('error' in result for result in results[1:])
+
+
+def test_invalid_row_does_not_split_the_chunk(engine):
+    calls = []
+
+    def score(features):
+        calls.append(len(features))
+        return engine.score_loans(features)
+
+    body = ''.join('{"id": %d, "monthly_income": %d}\n' % (i, 1000 * i) for i in range(500))
+    body += '{"id": "bad", "monthly_income": NaN}\n{"id": "worse", "land_size": "ten"}\n'
+    records = loan_batch.iter_records(io.BytesIO(body.encode()), 'application/x-ndjson')
+    output = ''.join(loan_batch.stream_assessments(engine, records, LOAN_CONDITIONS, score=score))
+    results = [strict_loads(line) for line in output.splitlines()]
+    assert calls == [500]
+    assert [result['row'] for result in results] == list(range(1, 503))
+    assert [result['id'] for result in results[-2:]] == ['bad', 'worse']
+    assert all('error' in result for result in results[-2:])
+    assert not any('error' in result for result in results[:-2])
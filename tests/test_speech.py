@@ -0,0 +1,46 @@
+import struct
+
+import numpy as np
+import pytest
+
+import speech
+
+
+def wav_bytes(samples, rate=8000):
+    pcm = (np.clip(samples, -1, 1) * 32767).astype('<i2').tobytes()
+    header = b'RIFF' + struct.pack('<I', 36 + len(pcm)) + b'WAVE'
+    header += b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, rate, rate * 2, 2, 16)
+    header += b'data' + struct.pack('<I', len(pcm))
+    return header + pcm
+
+
+def pieces(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.fixture
+def tone():
+    t = np.arange(8000) / 8000
+    return 0.5 * np.sin(2 * np.pi * 440 * t) * (np.sin(2 * np.pi * 2 * t) > 0)
+
+
+@pytest.mark.parametrize('size', [1, 16, 43, 1000])
+def test_wav_decoder_small_chunks(tone, size):
+    decoder = speech.WavDecoder()
+    decoded = np.concatenate([decoder.feed(piece) for piece in pieces(wav_bytes(tone), size)] + [decoder.close()])
+    assert decoder.sample_rate == 8000
+    np.testing.assert_allclose(decoded, tone, atol=2 / 32768)
+
+
+@pytest.mark.parametrize('size', [1, 16, 43])
+def test_transcribe_stream_small_chunks(tone, size):
+    data = wav_bytes(tone)
+    whole = list(speech.transcribe_stream([data], speech.EnergyEngine(), 'en'))[-1]
+    chunked = list(speech.transcribe_stream(pieces(data, size), speech.EnergyEngine(), 'en'))[-1]
+    assert chunked == whole
+    assert chunked['duration'] == 1.0
+
+
+def test_incomplete_header():
+    with pytest.raises(speech.UnsupportedAudio):
+        list(speech.transcribe_stream([b'RIFF', b'\0\0\0\0WAVEfmt '], speech.EnergyEngine(), 'en'))
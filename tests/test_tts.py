@@ -0,0 +1,27 @@
+import os
+
+import tts
+
+
+def test_lookup_finds_audio_written_by_another_process(tmp_path):
+    writer = tts.AudioCache(str(tmp_path))
+    reader = tts.AudioCache(str(tmp_path))  # indexed before the file existed
+    filename, cached = writer.get_or_synthesize('Mvua itanyesha kesho', 'sw', tts.ToneTTSBackend())
+    assert not cached
+
+    path = reader.lookup(filename)
+    assert path == os.path.join(str(tmp_path), filename)
+    assert reader.stats()['files'] == 1
+    assert reader.stats()['bytes'] == os.path.getsize(path)
+
+    _, cached = reader.get_or_synthesize('Mvua itanyesha kesho', 'sw', tts.ToneTTSBackend())
+    assert cached
+
+
+def test_lookup_misses(tmp_path):
+    cache = tts.AudioCache(str(tmp_path))
+    (tmp_path / '.partial.wav.1.2').write_bytes(b'x')
+    assert cache.lookup('missing.wav') is None
+    assert cache.lookup('.partial.wav.1.2') is None
+    assert cache.lookup('../conftest.py') is None
+    assert cache.stats()['files'] == 0
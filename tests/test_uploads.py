@@ -0,0 +1,43 @@
+import io
+
+import pytest
+
+import uploads
+
+
+class Trickle(io.RawIOBase):
+    """A chunked request body: at most ``size`` bytes per read, length unknown"""
+
+    def __init__(self, data, size=1000):
+        self._data = io.BytesIO(data)
+        self._size = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self._data.read(min(len(b), self._size))
+        b[:len(chunk)] = chunk
+        return len(chunk)
+
+
+@pytest.mark.parametrize('limit', [100, 4096, 300 * 1024])
+def test_chunked_body_at_exact_limit(limit):
+    body = bytes(range(256)) * (limit // 256) + b'x' * (limit % 256)
+    assert bytes(uploads.read_body(Trickle(body), None, limit)) == body
+    assert bytes(uploads.read_body(io.BytesIO(body), len(body), limit)) == body
+
+
+@pytest.mark.parametrize('limit', [100, 4096, 300 * 1024])
+def test_chunked_body_over_limit(limit):
+    with pytest.raises(uploads.UploadTooLarge):
+        uploads.read_body(Trickle(b'x' * (limit + 1)), None, limit)
+    with pytest.raises(uploads.UploadTooLarge):
+        uploads.read_body(io.BytesIO(b'x' * (limit + 1)), limit + 1, limit)
+
+
+def test_chunked_body_under_limit_after_larger_body():
+    uploads.read_body(Trickle(b'y' * 200000), None, 1 << 20)  # leaves a large thread buffer
+    assert bytes(uploads.read_body(Trickle(b'abc'), None, 100)) == b'abc'
+    with pytest.raises(uploads.UploadTooLarge):
+        uploads.read_body(Trickle(b'z' * 150), None, 100)
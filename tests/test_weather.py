@@ -0,0 +1,53 @@
+import threading
+from datetime import date
+
+import pytest
+
+from weather import LocalWeatherProvider, WeatherProvider, WeatherService
+
+START = date(2026, 10, 17)
+
+
+class CountingProvider(WeatherProvider):
+    """Local forecasts, recording each call; the first call waits until released"""
+
+    name = 'counting'
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def forecast_fields(self, locations, start, days=7):
+        self.calls.append(list(locations))
+        self.started.set()
+        self.release.wait(5)
+        return LocalWeatherProvider().forecast_fields(locations, start, days)
+
+
+def test_concurrent_requests_share_one_provider_call():
+    provider = CountingProvider()
+    service = WeatherService(provider, today=lambda: START)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(service.forecast('Nairobi'))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    provider.started.wait(5)
+    provider.release.set()
+    for thread in threads:
+        thread.join()
+    assert provider.calls == [['nairobi']]
+    assert all(result == results[0] for result in results)
+    assert service.misses == 1 and service.hits + service.coalesced == 7
+
+
+def test_failed_fetch_is_not_cached():
+    class Failing(WeatherProvider):
+        def forecast_fields(self, locations, start, days=7):
+            raise RuntimeError('upstream down')
+
+    service = WeatherService(Failing(), today=lambda: START)
+    with pytest.raises(RuntimeError):
+        service.forecast('Nairobi')
+    service.provider = LocalWeatherProvider()
+    assert len(service.forecast('Nairobi')) == 7
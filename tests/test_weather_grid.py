@@ -0,0 +1,40 @@
+from datetime import date
+
+import numpy as np
+import pytest
+
+from gazetteer import format_point
+from weather import FIELDS, LocalWeatherProvider
+from weather_grid import GriddedWeatherProvider, WeatherGrid, build_tile
+
+START = date(2026, 10, 17)
+
+
+@pytest.fixture
+def gridded(tmp_path):
+    build_tile('east-africa', LocalWeatherProvider(), START, days=10, grid_dir=str(tmp_path))
+    return GriddedWeatherProvider(WeatherGrid(str(tmp_path)), LocalWeatherProvider())
+
+
+def test_grid_points_match_the_provider(gridded):
+    points = [format_point(lat, lon) for lat, lon in [(-1.25, 36.75), (0.0, 34.5), (-4.0, 39.75)]]
+    expected = LocalWeatherProvider().forecast_fields(points, START)
+    got = gridded.forecast_fields(points, START)
+    for name in FIELDS:
+        np.testing.assert_allclose(got[name], expected[name], atol=1e-4)
+
+
+def test_between_grid_points_is_interpolated(gridded):
+    got = gridded.forecast_fields(['-1.125,36.750', '-1.000,36.750', '-1.250,36.750'], START)
+    for name in FIELDS:
+        np.testing.assert_allclose(got[name][0], (got[name][1] + got[name][2]) / 2, atol=1e-4)
+
+
+def test_outside_tiles_falls_back_to_the_provider(gridded):
+    locations = ['Nairobi', '40.0,-100.0', '-1.25,36.75']
+    got = gridded.forecast_fields(locations, START)
+    expected = LocalWeatherProvider().forecast_fields(locations[:2], START)
+    for name in FIELDS:
+        np.testing.assert_array_equal(got[name][:2], expected[name])
+    late = gridded.forecast_fields(locations, date(2026, 10, 25))  # tile ends on the 26th
+    assert late['rainfall'].shape == (3, 7)
@@ -0,0 +1,207 @@
+"""Text-to-speech backends and a content-addressed audio cache"""
+import hashlib
+import io
+import math
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+import metrics
+from lazy_imports import lazy_import
+
+gtts = lazy_import('gtts')
+
+
+class TTSBackend:
+    """Turns text into a complete audio file"""
+
+    name = 'base'
+    mimetype = 'application/octet-stream'
+    extension = 'bin'
+
+    def synthesize(self, text, language):
+        raise NotImplementedError
+
+
+class GTTSBackend(TTSBackend):
+    """Google Translate TTS (needs network access)"""
+
+    name = 'gtts'
+    mimetype = 'audio/mpeg'
+    extension = 'mp3'
+
+    def synthesize(self, text, language):
+        buffer = io.BytesIO()
+        gtts.gTTS(text=text, lang=language, slow=False).write_to_fp(buffer)
+        return buffer.getvalue()
+
+
+class ToneTTSBackend(TTSBackend):
+    """Offline stand-in: one short deterministic tone per character, as 16 kHz WAV"""
+
+    name = 'tone'
+    mimetype = 'audio/wav'
+    extension = 'wav'
+    sample_rate = 16000
+    samples_per_char = 960  # 60 ms
+
+    def synthesize(self, text, language):
+        import numpy as np
+
+        codes = np.frombuffer(text.encode('utf-8'), dtype=np.uint8).astype(np.float64)
+        t = np.arange(self.samples_per_char) / self.sample_rate
+        freqs = 200 + 4 * codes  # 200-1220 Hz
+        envelope = np.sin(np.pi * np.arange(self.samples_per_char) / self.samples_per_char)
+        wave = (np.sin(2 * math.pi * freqs[:, None] * t[None, :]) * envelope * 12000).astype('<i2').ravel()
+        pcm = wave.tobytes()
+        header = b'RIFF' + struct.pack('<I', 36 + len(pcm)) + b'WAVE'
+        header += b'fmt ' + struct.pack('<IHHIIHH', 16, 1, 1, self.sample_rate, self.sample_rate * 2, 2, 16)
+        header += b'data' + struct.pack('<I', len(pcm))
+        return header + pcm
+
+
+BACKENDS = {
+    GTTSBackend.name: GTTSBackend,
+    ToneTTSBackend.name: ToneTTSBackend,
+}
+
+
+class AudioCache:
+    """Synthesized audio on disk, named by hash of (text, language, engine)
+
+    Files are evicted least-recently-used once their total size exceeds
+    ``max_bytes``. Concurrent requests for the same key synthesize once.
+    """
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._index = OrderedDict()  # filename -> size, least recently used first
+        self._total = 0
+        self._lock = threading.Lock()
+        self._inflight = {}  # key -> Lock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    @classmethod
+    def from_env(cls, default_directory):
+        return cls(
+            os.environ.get('AGRIWISE_AUDIO_CACHE_DIR', default_directory),
+            max_bytes=int(float(os.environ.get('AGRIWISE_AUDIO_CACHE_MB', 256)) * 1024 * 1024),
+        )
+
+    def _scan(self):
+        """Rebuild the index from disk, oldest access first"""
+        entries = []
+        for name in os.listdir(self.directory):
+            if name.startswith('.'):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+        with self._lock:
+            self._index.clear()
+            for _, name, size in sorted(entries):
+                self._index[name] = size
+            self._total = sum(self._index.values())
+
+    @staticmethod
+    def key(text, language, engine):
+        return hashlib.sha256(f'{engine}\0{language}\0{text}'.encode('utf-8')).hexdigest()
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def lookup(self, filename):
+        """Return the path of a cached file and mark it used, or None
+
+        Files written by other processes sharing the directory (job-pool
+        workers, other server workers) are adopted into the index on first use.
+        """
+        if filename.startswith('.') or os.path.basename(filename) != filename:
+            return None  # temporary files and anything outside the directory
+        path = self.path(filename)
+        with self._lock:
+            known = filename in self._index
+            if known:
+                self._index.move_to_end(filename)
+        if not known:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                return None
+            with self._lock:
+                if filename not in self._index:
+                    self._index[filename] = size
+                    self._total += size
+                    self._evict()
+        try:
+            os.utime(path)  # keep recency across restarts
+        except FileNotFoundError:
+            # Evicted by another worker sharing the directory
+            with self._lock:
+                self._total -= self._index.pop(filename, 0)
+            return None
+        return path
+
+    def get_or_synthesize(self, text, language, backend):
+        """Return (filename, cached) for the audio, synthesizing it on a miss"""
+        filename = f'{self.key(text, language, backend.name)}.{backend.extension}'
+        if self.lookup(filename) is not None:
+            with self._lock:
+                self.hits += 1
+            return filename, True
+
+        with self._lock:
+            key_lock = self._inflight.setdefault(filename, threading.Lock())
+        with key_lock:
+            if self.lookup(filename) is not None:
+                with self._lock:
+                    self.hits += 1
+                return filename, True
+
+            try:
+                with metrics.stage('tts_synthesis'):
+                    audio = backend.synthesize(text, language)
+                tmp_path = self.path(f'.{filename}.{os.getpid()}.{threading.get_ident()}')
+                with open(tmp_path, 'wb') as f:
+                    f.write(audio)
+                os.replace(tmp_path, self.path(filename))
+            finally:
+                with self._lock:
+                    self._inflight.pop(filename, None)
+
+            with self._lock:
+                self.misses += 1
+                self._total += len(audio) - self._index.pop(filename, 0)
+                self._index[filename] = len(audio)
+                self._evict()
+        return filename, False
+
+    def _evict(self):
+        """Drop least recently used files until under max_bytes (lock held)"""
+        while self._total > self.max_bytes and len(self._index) > 1:
+            filename, size = self._index.popitem(last=False)
+            self._total -= size
+            self.evictions += 1
+            try:
+                os.unlink(self.path(filename))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._index),
+                'bytes': self._total,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
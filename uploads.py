@@ -0,0 +1,119 @@
+"""Request-body helpers for binary image uploads"""
+import io
+import threading
+
+# Per-thread body buffers above this size are dropped after use instead of kept
+_KEEP_BYTES = 16 * 1024 * 1024
+
+_local = threading.local()
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class MemoryReader(io.RawIOBase):
+    """Seekable read-only file over a bytes-like object, without copying it"""
+
+    def __init__(self, buffer):
+        self._view = memoryview(buffer).cast('B')
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f'invalid whence {whence!r}')
+        if pos < 0:
+            raise ValueError('negative seek position')
+        self._pos = pos
+        return pos
+
+    def tell(self):
+        return self._pos
+
+
+def as_file(image_data):
+    """Wrap bytes-like upload data as a file object; file objects pass through"""
+    if hasattr(image_data, 'read'):
+        return image_data
+    return MemoryReader(image_data)
+
+
+def _buffer(size):
+    """This thread's reusable body buffer, grown to at least ``size`` bytes"""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None or len(buffer) < size:
+        # Replace rather than resize: a resize fails while a view is exported
+        buffer = bytearray(size)
+        if size <= _KEEP_BYTES:
+            _local.buffer = buffer
+    return buffer
+
+
+def _readinto(stream, view):
+    readinto = getattr(stream, 'readinto', None)
+    if readinto is not None:
+        return readinto(view)
+    chunk = stream.read(len(view))
+    view[:len(chunk)] = chunk
+    return len(chunk)
+
+
+def read_body(stream, content_length, limit):
+    """Stream a request body into a reused buffer and return a memoryview of it
+
+    The view is only valid until the same thread reads its next body.
+    """
+    if content_length is not None:
+        if content_length > limit:
+            raise UploadTooLarge(f'Upload exceeds {limit} bytes')
+        buffer = _buffer(content_length)
+        view = memoryview(buffer)
+        filled = 0
+        while filled < content_length:
+            n = _readinto(stream, view[filled:content_length])
+            if not n:
+                break
+            filled += n
+        return view[:filled]
+
+    # Chunked transfer encoding: grow geometrically up to the limit
+    buffer = _buffer(min(limit, 256 * 1024))
+    capacity = min(len(buffer), limit)  # a reused buffer may be larger than the limit
+    filled = 0
+    while True:
+        if filled == capacity:
+            if capacity == limit:
+                # Full at the limit: only too large if there is more to come
+                if stream.read(1):
+                    raise UploadTooLarge(f'Upload exceeds {limit} bytes')
+                break
+            grown = bytearray(min(limit, 2 * len(buffer)))
+            grown[:filled] = buffer[:filled]
+            buffer = grown
+            capacity = len(buffer)
+        with memoryview(buffer) as view:
+            n = _readinto(stream, view[filled:capacity])
+        if not n:
+            break
+        filled += n
+    if len(buffer) <= _KEEP_BYTES:
+        _local.buffer = buffer
+    return memoryview(buffer)[:filled]
@@ -0,0 +1,295 @@
+"""Image classifiers behind crop disease detection
+
+Every classifier takes an (N, 224, 224, 3) uint8 batch and returns an (N,
+classes) array of probabilities, so confidence is the model's own softmax
+rather than a made-up number.
+
+* ``OnnxClassifier`` runs a CNN exported to ONNX (fp32 or int8-quantized)
+  with onnxruntime
+* ``TorchScriptClassifier`` runs a TorchScript export
+* ``ForestClassifier`` wraps the registry's random forest over the ten colour
+  and texture statistics; it is used when no CNN is configured
+
+The CNN is selected with ``AGRIWISE_CNN_MODEL=/path/model.onnx`` (or ``.pt``).
+Class names are read from ``model.labels.json`` next to the file and default
+to the registry's disease labels. ``AGRIWISE_INTRA_OP_THREADS`` caps the
+threads one inference may use; it defaults to the CPU count divided by
+``AGRIWISE_WORKERS`` so several workers on one box do not oversubscribe it.
+
+    python vision.py build-demo models/cnn/demo.onnx   # small untrained CNN
+    python vision.py quantize models/cnn/demo.onnx models/cnn/demo.int8.onnx
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+import metrics
+import model_registry
+from lazy_imports import lazy_import
+
+ort = lazy_import('onnxruntime')
+torch = lazy_import('torch')
+
+INPUT_SIZE = 224
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+def intra_op_threads():
+    """Threads per inference: AGRIWISE_INTRA_OP_THREADS, else this worker's share of the CPUs"""
+    configured = os.environ.get('AGRIWISE_INTRA_OP_THREADS')
+    if configured:
+        return max(1, int(configured))
+    workers = max(1, int(os.environ.get('AGRIWISE_WORKERS', 1)))
+    return max(1, (os.cpu_count() or 1) // workers)
+
+
+def preprocess(images):
+    """(N, H, W, 3) uint8 -> (N, 3, H, W) float32, ImageNet-normalised"""
+    scaled = images.astype(np.float32) * np.float32(1 / 255)
+    scaled -= IMAGENET_MEAN
+    scaled /= IMAGENET_STD
+    return np.ascontiguousarray(scaled.transpose(0, 3, 1, 2))
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    np.exp(shifted, out=shifted)
+    shifted /= shifted.sum(axis=1, keepdims=True)
+    return shifted
+
+
+def _file_version(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def read_labels(model_path):
+    """Class names from ``<model>.labels.json``, else the registry's disease labels"""
+    labels_path = os.path.splitext(model_path)[0] + '.labels.json'
+    try:
+        with open(labels_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return list(model_registry.DISEASE_LABELS)
+
+
+class ImageClassifier:
+    """Maps a uint8 image batch to class probabilities"""
+
+    name = 'base'
+
+    def __init__(self, classes, version):
+        self.classes = np.asarray(classes)
+        self.version = version
+
+    def predict_proba(self, images):
+        raise NotImplementedError
+
+
+class ForestClassifier(ImageClassifier):
+    """The registry's random forest over hand-crafted colour/texture features"""
+
+    name = 'forest'
+
+    def __init__(self, model, extract_features):
+        super().__init__(model.classes_, 'forest')
+        self.model = model
+        self.extract_features = extract_features
+
+    def predict_proba(self, images):
+        return self.model.predict_proba(self.extract_features(images))
+
+
+class OnnxClassifier(ImageClassifier):
+    """A CNN exported to ONNX, run with onnxruntime on the CPU
+
+    onnxruntime's thread pools do not survive fork, so each process opens its
+    own session on first use. An output named ``probabilities`` is returned
+    as-is; any other output is treated as logits and softmaxed.
+    """
+
+    name = 'onnx'
+
+    def __init__(self, path, classes=None, threads=None):
+        super().__init__(classes if classes is not None else read_labels(path), f'onnx-{_file_version(path)}')
+        self.path = path
+        self.threads = threads or intra_op_threads()
+        self._session = None
+        self._pid = None
+        self._session_for_pid()  # fail at load time on a broken model
+
+    def _session_for_pid(self):
+        if self._pid != os.getpid():
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = self.threads
+            options.inter_op_num_threads = 1
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(self.path, sess_options=options, providers=['CPUExecutionProvider'])
+            output = session.get_outputs()[0]
+            width = output.shape[-1]
+            if isinstance(width, int) and width != len(self.classes):
+                raise ValueError(f'{self.path} has {width} outputs but {len(self.classes)} labels')
+            self._input = session.get_inputs()[0].name
+            self._output = output.name
+            self._session = session
+            self._pid = os.getpid()
+        return self._session
+
+    def predict_proba(self, images):
+        session = self._session_for_pid()
+        (scores,) = session.run([self._output], {self._input: preprocess(images)})
+        if self._output == 'probabilities':
+            return scores
+        return softmax(scores.astype(np.float32, copy=False))
+
+
+class TorchScriptClassifier(ImageClassifier):
+    """A CNN exported with ``torch.jit.save``, run on the CPU; it returns logits"""
+
+    name = 'torchscript'
+
+    def __init__(self, path, classes=None, threads=None):
+        super().__init__(classes if classes is not None else read_labels(path), f'torchscript-{_file_version(path)}')
+        self.path = path
+        self.threads = threads or intra_op_threads()
+        self.module = torch.jit.load(path, map_location='cpu').eval()
+        self._pid = None
+
+    def predict_proba(self, images):
+        if self._pid != os.getpid():
+            torch.set_num_threads(self.threads)
+            self._pid = os.getpid()
+        with torch.inference_mode():
+            logits = self.module(torch.from_numpy(preprocess(images)))
+        return softmax(logits.numpy().astype(np.float32, copy=False))
+
+
+CLASSIFIERS = {
+    '.onnx': OnnxClassifier,
+    '.pt': TorchScriptClassifier,
+    '.ts': TorchScriptClassifier,
+}
+
+
+def load_classifier(path, classes=None, threads=None):
+    """Open a CNN export, choosing the runtime by file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in CLASSIFIERS:
+        raise ValueError(f'Unsupported model format {extension!r} (expected {", ".join(CLASSIFIERS)})')
+    with metrics.stage('model_load'):
+        return CLASSIFIERS[extension](path, classes, threads)
+
+
+def from_env(fallback):
+    """The CNN named by AGRIWISE_CNN_MODEL, or ``fallback`` when unset or unusable"""
+    path = os.environ.get('AGRIWISE_CNN_MODEL')
+    if not path:
+        return fallback
+    try:
+        return load_classifier(path)
+    except Exception as e:
+        print(f"Could not load CNN model {path} ({e}), using the {fallback.name} classifier")
+        return fallback
+
+
+def build_demo_model(path, classes=model_registry.DISEASE_LABELS, seed=42):
+    """Write a small, untrained CNN with the production input/output contract
+
+    Three stride-2 3x3 convolutions (16/32/64 channels), global average
+    pooling and a linear head. Its predictions are meaningless; it exists to
+    exercise and benchmark the serving path until a trained export is dropped
+    in with the same interface.
+    """
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    rng = np.random.default_rng(seed)
+    initializers = []
+    nodes = []
+    channels = [3, 16, 32, 64]
+    previous = 'image'
+    for i, (c_in, c_out) in enumerate(zip(channels, channels[1:])):
+        weight = rng.normal(0, np.sqrt(2 / (9 * c_in)), (c_out, c_in, 3, 3)).astype(np.float32)
+        initializers += [numpy_helper.from_array(weight, f'conv{i}.weight'),
+                         numpy_helper.from_array(np.zeros(c_out, np.float32), f'conv{i}.bias')]
+        nodes += [
+            helper.make_node('Conv', [previous, f'conv{i}.weight', f'conv{i}.bias'], [f'conv{i}'],
+                             kernel_shape=[3, 3], strides=[2, 2], pads=[1, 1, 1, 1]),
+            helper.make_node('Relu', [f'conv{i}'], [f'relu{i}']),
+        ]
+        previous = f'relu{i}'
+    head = rng.normal(0, np.sqrt(1 / channels[-1]), (len(classes), channels[-1])).astype(np.float32)
+    initializers += [numpy_helper.from_array(head, 'head.weight'),
+                     numpy_helper.from_array(np.zeros(len(classes), np.float32), 'head.bias')]
+    nodes += [
+        helper.make_node('GlobalAveragePool', [previous], ['pooled']),
+        helper.make_node('Flatten', ['pooled'], ['embedding']),
+        helper.make_node('Gemm', ['embedding', 'head.weight', 'head.bias'], ['logits'], transB=1),
+    ]
+    graph = helper.make_graph(
+        nodes, 'agriwise_demo_cnn',
+        [helper.make_tensor_value_info('image', TensorProto.FLOAT, ['batch', 3, INPUT_SIZE, INPUT_SIZE])],
+        [helper.make_tensor_value_info('logits', TensorProto.FLOAT, ['batch', len(classes)])],
+        initializer=initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    onnx.save(model, path)
+    with open(os.path.splitext(path)[0] + '.labels.json', 'w') as f:
+        json.dump(list(classes), f)
+    return path
+
+
+def quantize(source, destination):
+    """Write an int8 (dynamically quantized weights) copy of an ONNX model"""
+    import shutil
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(source, destination, weight_type=QuantType.QUInt8)
+    labels = os.path.splitext(source)[0] + '.labels.json'
+    if os.path.exists(labels):
+        shutil.copyfile(labels, os.path.splitext(destination)[0] + '.labels.json')
+    return destination
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AgriWise AI image classifier tools')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    demo = commands.add_parser('build-demo', help='write a small untrained CNN in ONNX format')
+    demo.add_argument('path')
+    demo.add_argument('--seed', type=int, default=42)
+
+    quant = commands.add_parser('quantize', help='write an int8 copy of an ONNX model')
+    quant.add_argument('source')
+    quant.add_argument('destination')
+
+    check = commands.add_parser('check', help='load a model and classify a blank image')
+    check.add_argument('path')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build-demo':
+        print(f'Wrote {build_demo_model(args.path, seed=args.seed)}')
+    elif args.command == 'quantize':
+        print(f'Wrote {quantize(args.source, args.destination)}')
+    elif args.command == 'check':
+        classifier = load_classifier(args.path)
+        probabilities = classifier.predict_proba(np.zeros((1, INPUT_SIZE, INPUT_SIZE, 3), np.uint8))
+        print(f'{classifier.version}: {len(classifier.classes)} classes, '
+              f'{classifier.threads} threads, sum of probabilities {probabilities.sum():.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,315 @@
+"""Weather forecast providers and the cached, coalescing forecast service"""
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import date, timedelta
+
+import numpy as np
+
+FORECAST_DAYS = 7
+FIELDS = ('temperature', 'humidity', 'rainfall', 'wind_speed')
+CONDITIONS = ('Rainy', 'Sunny', 'Cloudy', 'Partly Cloudy')
+
+
+def normalize_location(location):
+    """Cache identity of a free-text location"""
+    return ' '.join(str(location).split()).lower()
+
+
+def condition_codes(temperature, humidity, rainfall):
+    """Index into CONDITIONS for every element of same-shaped field arrays"""
+    return np.select(
+        [rainfall > 10, (temperature > 25) & (humidity < 50), humidity > 70],
+        [0, 1, 2],
+        default=3
+    ).astype(np.uint8)
+
+
+def weather_conditions(temperature, humidity, rainfall):
+    """Classify days element-wise from their temperature, humidity and rainfall"""
+    return np.asarray(CONDITIONS)[condition_codes(temperature, humidity, rainfall)]
+
+
+def _location_seeds(locations):
+    return np.array([
+        int.from_bytes(hashlib.blake2b(normalize_location(loc).encode(), digest_size=8).digest(), 'little')
+        for loc in locations
+    ], dtype=np.uint64)
+
+
+def _mix(x):
+    """splitmix64 finalizer, applied element-wise to a uint64 array"""
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+
+def _uniform(seeds, ordinals, stream, low, high):
+    """Counter-based uniforms for every (seed, ordinal) pair: shape (N, len(ordinals))
+
+    Each value depends only on its location, calendar day and stream, so a
+    forecast is reproducible regardless of which other locations share the call.
+    """
+    counters = (ordinals.astype(np.uint64) << np.uint64(8)) | np.uint64(stream)
+    x = _mix(seeds[:, None] ^ _mix(counters)[None, :])
+    unit = (x >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+    return low + (high - low) * unit
+
+
+class WeatherProvider:
+    """Source of daily forecast fields for many locations at once"""
+
+    name = 'base'
+
+    def forecast_fields(self, locations, start, days=FORECAST_DAYS):
+        """Return {field: (len(locations), days) float array} for FIELDS"""
+        raise NotImplementedError
+
+    async def forecast_fields_async(self, locations, start, days=FORECAST_DAYS):
+        """Async variant; providers doing network I/O override this"""
+        return self.forecast_fields(locations, start, days)
+
+
+class LocalWeatherProvider(WeatherProvider):
+    """Offline stand-in seeded per location and calendar day"""
+
+    name = 'local'
+
+    def forecast_fields(self, locations, start, days=FORECAST_DAYS):
+        seeds = _location_seeds(locations)
+        ordinals = np.arange(start.toordinal(), start.toordinal() + days)
+        climate = np.array([0], dtype=np.int64)  # per-location constants, independent of date
+
+        base_temp = _uniform(seeds, climate, 0, 20, 30)
+        base_humidity = _uniform(seeds, climate, 1, 40, 80)
+        return {
+            'temperature': base_temp + _uniform(seeds, ordinals, 2, -5, 5),
+            'humidity': base_humidity + _uniform(seeds, ordinals, 3, -10, 10),
+            'rainfall': _uniform(seeds, ordinals, 4, 0, 20),
+            'wind_speed': _uniform(seeds, ordinals, 5, 0, 15),
+        }
+
+
+class HTTPWeatherProvider(WeatherProvider):
+    """Remote forecast service at AGRIWISE_WEATHER_URL, over pooled keep-alive connections
+
+    POSTs ``{"locations": [...], "start": "YYYY-MM-DD", "days": n}`` and expects
+    ``{field: [[value per day] per location]}`` back for every name in FIELDS.
+    """
+
+    name = 'http'
+
+    def __init__(self, url=None, timeout=10, max_connections=100):
+        self.url = url or os.environ['AGRIWISE_WEATHER_URL']
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._session = None
+        self._clients = {}  # event loop -> httpx.AsyncClient
+        self._lock = threading.Lock()
+
+    def _payload(self, locations, start, days):
+        return {'locations': list(locations), 'start': start.isoformat(), 'days': days}
+
+    @staticmethod
+    def _fields(body):
+        return {name: np.asarray(body[name], dtype=np.float64) for name in FIELDS}
+
+    def forecast_fields(self, locations, start, days=FORECAST_DAYS):
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.mount(self.url, HTTPAdapter(pool_maxsize=self.max_connections))
+                    self._session = session
+        response = self._session.post(self.url, json=self._payload(locations, start, days), timeout=self.timeout)
+        response.raise_for_status()
+        return self._fields(response.json())
+
+    async def forecast_fields_async(self, locations, start, days=FORECAST_DAYS):
+        # httpx clients are bound to the event loop that created them
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            import httpx
+
+            client = self._clients[loop] = httpx.AsyncClient(
+                timeout=self.timeout, limits=httpx.Limits(max_connections=self.max_connections)
+            )
+        response = await client.post(self.url, json=self._payload(locations, start, days))
+        response.raise_for_status()
+        return self._fields(response.json())
+
+
+class DelayedProvider(WeatherProvider):
+    """Wraps a provider with a fixed delay per call, to stand in for a remote service"""
+
+    def __init__(self, inner, latency):
+        self.inner = inner
+        self.latency = latency
+        self.name = f'{inner.name}+{int(latency * 1000)}ms'
+
+    def forecast_fields(self, locations, start, days=FORECAST_DAYS):
+        time.sleep(self.latency)
+        return self.inner.forecast_fields(locations, start, days)
+
+    async def forecast_fields_async(self, locations, start, days=FORECAST_DAYS):
+        await asyncio.sleep(self.latency)
+        return await self.inner.forecast_fields_async(locations, start, days)
+
+
+PROVIDERS = {
+    LocalWeatherProvider.name: LocalWeatherProvider,
+    HTTPWeatherProvider.name: HTTPWeatherProvider,
+}
+
+
+class WeatherService:
+    """Per-(location, forecast date) cache in front of a provider
+
+    Concurrent requests for the same uncached key are coalesced so the provider
+    is asked once (single-flight).
+    """
+
+    def __init__(self, provider=None, ttl=1800, max_entries=10000, days=FORECAST_DAYS, today=date.today):
+        self.provider = provider or LocalWeatherProvider()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.days = days
+        self.today = today
+        self._entries = OrderedDict()  # key -> (expires, forecast)
+        self._inflight = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls):
+        provider = PROVIDERS[os.environ.get('AGRIWISE_WEATHER_PROVIDER', 'local')]()
+        latency = float(os.environ.get('AGRIWISE_WEATHER_LATENCY_MS', 0)) / 1000
+        if latency:
+            provider = DelayedProvider(provider, latency)
+        if os.environ.get('AGRIWISE_WEATHER_GRID', '1') != '0':
+            # Prebuilt region tiles answer first; the provider covers everything else
+            from weather_grid import GriddedWeatherProvider
+
+            provider = GriddedWeatherProvider.from_env(provider)
+        return cls(provider, ttl=float(os.environ.get('AGRIWISE_WEATHER_TTL', 1800)))
+
+    def forecast(self, location):
+        return self.forecast_many([location])[location]
+
+    def forecast_many(self, locations):
+        """Forecast every location, asking the provider only for uncached ones"""
+        start = self.today()
+        keys, found, owned, waiting = self._claim(locations, start)
+        if owned:
+            try:
+                fields = self.provider.forecast_fields([key[0] for key in owned], start, self.days)
+            except BaseException as e:
+                self._abandon(owned, e)
+                raise
+            self._complete(owned, self._records(fields, len(owned), start), found)
+
+        for key, future in waiting.items():
+            found[key] = future.result()
+        return {loc: found[key] for loc, key in keys.items()}
+
+    async def forecast_async(self, location):
+        return (await self.forecast_many_async([location]))[location]
+
+    async def forecast_many_async(self, locations):
+        """forecast_many for event loops: awaits the provider and coalesced requests"""
+        start = self.today()
+        keys, found, owned, waiting = self._claim(locations, start)
+        if owned:
+            try:
+                fields = await self.provider.forecast_fields_async([key[0] for key in owned], start, self.days)
+            except BaseException as e:
+                self._abandon(owned, e)
+                raise
+            self._complete(owned, self._records(fields, len(owned), start), found)
+
+        for key, future in waiting.items():
+            found[key] = await asyncio.wrap_future(future)
+        return {loc: found[key] for loc, key in keys.items()}
+
+    def _claim(self, locations, start):
+        """Split keys into cached, to-fetch (owned) and being-fetched-elsewhere (waiting)"""
+        now = time.time()
+        keys = {loc: (normalize_location(loc), start.isoformat()) for loc in locations}
+        found = {}
+        owned = {}    # key -> Future this call must fulfil
+        waiting = {}  # key -> Future another call is fulfilling
+
+        with self._lock:
+            for key in set(keys.values()):
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                    self.hits += 1
+                elif key in self._inflight:
+                    waiting[key] = self._inflight[key]
+                    self.coalesced += 1
+                else:
+                    owned[key] = self._inflight[key] = Future()
+                    self.misses += 1
+        return keys, found, owned, waiting
+
+    def _complete(self, owned, fetched, found):
+        expires = time.time() + self.ttl
+        with self._lock:
+            for key, forecast in zip(owned, fetched):
+                self._entries[key] = (expires, forecast)
+                self._entries.move_to_end(key)
+                del self._inflight[key]
+                owned[key].set_result(forecast)
+                found[key] = forecast
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _abandon(self, owned, error):
+        with self._lock:
+            for key, future in owned.items():
+                del self._inflight[key]
+                future.set_exception(error)
+
+    def _records(self, fields, count, start):
+        """Build per-location lists of day records from vectorized provider fields"""
+        conditions = weather_conditions(fields['temperature'], fields['humidity'], fields['rainfall'])
+        rounded = {name: np.round(values, 1).tolist() for name, values in fields.items()}
+        conditions = conditions.tolist()
+        dates = [(start + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(self.days)]
+
+        return [
+            [
+                {
+                    'date': dates[d],
+                    'temperature': rounded['temperature'][n][d],
+                    'humidity': rounded['humidity'][n][d],
+                    'rainfall': rounded['rainfall'][n][d],
+                    'wind_speed': rounded['wind_speed'][n][d],
+                    'condition': conditions[n][d],
+                }
+                for d in range(self.days)
+            ]
+            for n in range(count)
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'provider': self.provider.name,
+            }
@@ -0,0 +1,349 @@
+"""Gridded weather forecasts: memory-mapped region tiles of (days, lat, lon) arrays
+
+``python weather_grid.py build`` asks the weather provider for every grid
+point of a region (the gazetteer's weather cells, ``GRID_STEP`` degrees
+apart) in one call, and stores each field as a ``(days, lat, lon)`` float32
+array, with the day conditions classified over the whole tile by one
+``np.select``::
+
+    data/weather/
+        east-africa/
+            2026-10-17/
+                grid.json           # region, start date, origin, step, shape, provider
+                temperature.npy     # float32 (days, lat, lon)
+                humidity.npy
+                rainfall.npy
+                wind_speed.npy
+                condition.npy       # uint8 index into weather.CONDITIONS
+
+Servers memory-map the newest tile covering the requested days, so one
+process serves a whole country's forecast without recomputing it: point
+queries are array reads, exact at grid points and bilinear in between.
+Build nightly with a few spare days, so a late build is not an outage::
+
+    30 2 * * *  cd /srv/agriwise && python weather_grid.py build
+"""
+import argparse
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from gazetteer import GRID_STEP, format_point, parse_coordinates
+from weather import CONDITIONS, FIELDS, FORECAST_DAYS, PROVIDERS, WeatherProvider, condition_codes
+
+GRID_DIR = os.environ.get(
+    'AGRIWISE_WEATHER_GRID_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'weather')
+)
+GRID_FILE = 'grid.json'
+BUILD_DAYS = FORECAST_DAYS + 3
+MAX_MAP_CELLS = 20000
+
+# Tile extents as (lat_min, lat_max, lon_min, lon_max): Kenya and its neighbours
+REGIONS = {
+    'east-africa': (-12.0, 5.0, 28.0, 42.0),
+}
+
+
+def grid_axes(bounds, step=GRID_STEP):
+    """Latitudes and longitudes of the grid points within ``bounds``"""
+    lat_min, lat_max, lon_min, lon_max = bounds
+    lats = np.round(np.arange(np.ceil(lat_min / step), np.floor(lat_max / step) + 1) * step, 6)
+    lons = np.round(np.arange(np.ceil(lon_min / step), np.floor(lon_max / step) + 1) * step, 6)
+    if len(lats) < 2 or len(lons) < 2:
+        raise ValueError(f'Bounds {bounds} hold fewer than 2x2 grid points at step {step}')
+    return lats, lons
+
+
+def build_tile(region, provider, start, days=BUILD_DAYS, step=GRID_STEP, grid_dir=GRID_DIR, bounds=None):
+    """Forecast every grid point of a region with one provider call and store the tile"""
+    lats, lons = grid_axes(bounds or REGIONS[region], step)
+    points = [format_point(lat, lon) for lat in lats.tolist() for lon in lons.tolist()]
+    fields = provider.forecast_fields(points, start, days)
+
+    # Provider rows are points in row-major (lat, lon) order; tiles are day-major
+    tile = {
+        name: np.ascontiguousarray(
+            np.asarray(fields[name], dtype=np.float32).reshape(len(lats), len(lons), days).transpose(2, 0, 1))
+        for name in FIELDS
+    }
+    tile['condition'] = condition_codes(tile['temperature'], tile['humidity'], tile['rainfall'])
+    meta = {
+        'region': region,
+        'start': start.isoformat(),
+        'shape': [days, len(lats), len(lons)],
+        'lat0': float(lats[0]),
+        'lon0': float(lons[0]),
+        'step': step,
+        'provider': provider.name,
+        'built': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+    path = os.path.join(grid_dir, region, start.isoformat())
+    staging = path + '.new'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, values in tile.items():
+        np.save(os.path.join(staging, f'{name}.npy'), values)
+    with open(os.path.join(staging, GRID_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+
+    # Swap directories; readers holding the old mmaps keep the unlinked files
+    retired = path + '.old'
+    shutil.rmtree(retired, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, retired)
+    os.replace(staging, path)
+    shutil.rmtree(retired, ignore_errors=True)
+    return meta
+
+
+def prune_tiles(today, grid_dir=GRID_DIR):
+    """Delete tiles whose last day is before ``today``; returns their paths"""
+    removed = []
+    for path in _tile_paths(grid_dir):
+        tile = Tile(path)
+        if tile.start + timedelta(days=tile.days) <= today:
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+
+def _tile_paths(grid_dir):
+    if not os.path.isdir(grid_dir):
+        return []
+    paths = []
+    for region in sorted(os.listdir(grid_dir)):
+        region_dir = os.path.join(grid_dir, region)
+        if not os.path.isdir(region_dir):
+            continue
+        for name in sorted(os.listdir(region_dir)):
+            path = os.path.join(region_dir, name)
+            if not name.endswith(('.new', '.old')) and os.path.isfile(os.path.join(path, GRID_FILE)):
+                paths.append(path)
+    return paths
+
+
+class Tile:
+    """One region's forecast for a run of days, memory-mapped"""
+
+    def __init__(self, path):
+        with open(os.path.join(path, GRID_FILE)) as f:
+            meta = json.load(f)
+        self.path = path
+        self.region = meta['region']
+        self.start = date.fromisoformat(meta['start'])
+        self.days, self.nlat, self.nlon = meta['shape']
+        self.lat0, self.lon0, self.step = meta['lat0'], meta['lon0'], meta['step']
+        self.lat1 = self.lat0 + (self.nlat - 1) * self.step
+        self.lon1 = self.lon0 + (self.nlon - 1) * self.step
+        # Plain ndarray views of the maps: same pages, without np.memmap's per-index overhead
+        self.fields = {name: np.asarray(np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')) for name in FIELDS}
+        self.condition = np.asarray(np.load(os.path.join(path, 'condition.npy'), mmap_mode='r'))
+
+    def offset(self, start, days):
+        """Index of ``start`` in the tile, or None if the tile does not cover all ``days``"""
+        offset = (start - self.start).days
+        return offset if offset >= 0 and offset + days <= self.days else None
+
+    def contains(self, lat, lon):
+        return (lat >= self.lat0) & (lat <= self.lat1) & (lon >= self.lon0) & (lon <= self.lon1)
+
+    def sample(self, lat, lon, offset, days):
+        """{field: (N, days)} at points inside the tile: bilinear between grid points, exact on them"""
+        # Rounding drops float noise, so points on the grid hit it exactly
+        fi = np.round((np.asarray(lat, dtype=np.float64) - self.lat0) / self.step, 6)
+        fj = np.round((np.asarray(lon, dtype=np.float64) - self.lon0) / self.step, 6)
+        i = np.clip(np.floor(fi).astype(np.intp), 0, self.nlat - 2)
+        j = np.clip(np.floor(fj).astype(np.intp), 0, self.nlon - 2)
+        di = (fi - i)[:, None]
+        dj = (fj - j)[:, None]
+        # The four corners of each point's cell, and their weights
+        rows = np.stack([i, i + 1, i, i + 1])
+        cols = np.stack([j, j, j + 1, j + 1])
+        weights = np.stack([(1 - di) * (1 - dj), di * (1 - dj), (1 - di) * dj, di * dj])  # (4, N, 1)
+        sampled = {}
+        for name, values in self.fields.items():
+            corners = values[offset:offset + days, rows, cols].transpose(1, 2, 0)  # (4, N, days)
+            sampled[name] = (corners * weights).sum(axis=0)
+        return sampled
+
+    def window(self, bounds):
+        """Index slices of the grid points within ``bounds``, or None if there are none"""
+        lat_min, lat_max, lon_min, lon_max = bounds
+        i0 = max(0, int(np.ceil(round((lat_min - self.lat0) / self.step, 6))))
+        i1 = min(self.nlat - 1, int(np.floor(round((lat_max - self.lat0) / self.step, 6))))
+        j0 = max(0, int(np.ceil(round((lon_min - self.lon0) / self.step, 6))))
+        j1 = min(self.nlon - 1, int(np.floor(round((lon_max - self.lon0) / self.step, 6))))
+        if i0 > i1 or j0 > j1:
+            return None
+        return slice(i0, i1 + 1), slice(j0, j1 + 1)
+
+
+class WeatherGrid:
+    """Read side used by the API: the tiles under ``grid_dir``, rescanned as builds replace them"""
+
+    def __init__(self, grid_dir=GRID_DIR, refresh_interval=60):
+        self.grid_dir = grid_dir
+        self.refresh_interval = refresh_interval
+        self._tiles = []  # newest start first
+        self._opened = {}  # path -> (mtime of grid.json, Tile)
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def tiles(self):
+        now = time.monotonic()
+        if self._checked is None or now - self._checked > self.refresh_interval:
+            self._refresh(now)
+        return self._tiles
+
+    def _refresh(self, now):
+        with self._lock:
+            self._checked = now
+            opened = {}
+            for path in _tile_paths(self.grid_dir):
+                try:
+                    mtime = os.stat(os.path.join(path, GRID_FILE)).st_mtime_ns
+                    cached = self._opened.get(path)
+                    opened[path] = cached if cached and cached[0] == mtime else (mtime, Tile(path))
+                except (OSError, ValueError, KeyError):
+                    continue  # being replaced or pruned; picked up on the next scan
+            self._opened = opened
+            self._tiles = sorted((tile for _, tile in opened.values()), key=lambda tile: tile.start, reverse=True)
+
+    def covering(self, start, days):
+        """[(tile, offset)] for tiles holding ``days`` days from ``start``, newest first"""
+        found = []
+        for tile in self.tiles():
+            offset = tile.offset(start, days)
+            if offset is not None:
+                found.append((tile, offset))
+        return found
+
+    def map(self, start, day=0, bounds=None):
+        """One day's fields and conditions at the grid points within ``bounds`` (default: a whole tile)
+
+        Returns None if no tile covers the day and area.
+        """
+        for tile, offset in self.covering(start + timedelta(days=day), 1):
+            window = tile.window(bounds) if bounds else (slice(None), slice(None))
+            if window is None:
+                continue
+            rows, cols = window
+            lats = tile.lat0 + np.arange(tile.nlat)[rows] * tile.step
+            lons = tile.lon0 + np.arange(tile.nlon)[cols] * tile.step
+            if len(lats) * len(lons) > MAX_MAP_CELLS:
+                raise ValueError(f'At most {MAX_MAP_CELLS} grid points per map')
+            result = {
+                'region': tile.region,
+                'date': (start + timedelta(days=day)).isoformat(),
+                'step': tile.step,
+                'lats': np.round(lats, 6).tolist(),
+                'lons': np.round(lons, 6).tolist(),
+                'conditions': list(CONDITIONS),
+                'condition': np.asarray(tile.condition[offset, rows, cols]).tolist(),
+            }
+            for name, values in tile.fields.items():
+                result[name] = np.round(np.asarray(values[offset, rows, cols], dtype=np.float64), 1).tolist()
+            return result
+        return None
+
+
+class GriddedWeatherProvider(WeatherProvider):
+    """Serves ``"lat,lon"`` locations inside a tile from the grid; everything else goes to ``fallback``"""
+
+    def __init__(self, grid, fallback):
+        self.grid = grid
+        self.fallback = fallback
+        self.name = f'grid+{fallback.name}'
+
+    @classmethod
+    def from_env(cls, fallback):
+        return cls(WeatherGrid(), fallback)
+
+    def _from_tiles(self, locations, start, days):
+        """Fields with the rows tiles cover filled in, and the indices of the other locations"""
+        fields = {name: np.empty((len(locations), days)) for name in FIELDS}
+        covering = self.grid.covering(start, days)
+        if not covering:
+            return fields, list(range(len(locations)))
+
+        points = [parse_coordinates(location) for location in locations]
+        missing = [n for n, point in enumerate(points) if point is None]
+        pending = np.array([n for n, point in enumerate(points) if point is not None], dtype=np.intp)
+        coords = np.array([points[n] for n in pending], dtype=np.float64).reshape(-1, 2)
+        for tile, offset in covering:
+            if not len(pending):
+                break
+            inside = tile.contains(coords[:, 0], coords[:, 1])
+            if inside.any():
+                sampled = tile.sample(coords[inside, 0], coords[inside, 1], offset, days)
+                for name in FIELDS:
+                    fields[name][pending[inside]] = sampled[name]
+                pending, coords = pending[~inside], coords[~inside]
+        return fields, sorted(missing + pending.tolist())
+
+    @staticmethod
+    def _fill(fields, missing, fetched):
+        for name in FIELDS:
+            fields[name][missing] = fetched[name]
+        return fields
+
+    def forecast_fields(self, locations, start, days=FORECAST_DAYS):
+        fields, missing = self._from_tiles(locations, start, days)
+        if missing:
+            self._fill(fields, missing, self.fallback.forecast_fields([locations[n] for n in missing], start, days))
+        return fields
+
+    async def forecast_fields_async(self, locations, start, days=FORECAST_DAYS):
+        fields, missing = self._from_tiles(locations, start, days)
+        if missing:
+            fetched = await self.fallback.forecast_fields_async([locations[n] for n in missing], start, days)
+            self._fill(fields, missing, fetched)
+        return fields
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='AgriWise AI gridded weather tiles')
+    parser.add_argument('--grid-dir', default=GRID_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    build = commands.add_parser('build', help='forecast every grid point of a region (nightly job)')
+    build.add_argument('--region', nargs='+', default=list(REGIONS), choices=list(REGIONS))
+    build.add_argument('--start', type=date.fromisoformat, default=None, help='first day (default: today)')
+    build.add_argument('--days', type=int, default=BUILD_DAYS)
+    build.add_argument('--step', type=float, default=float(os.environ.get('AGRIWISE_GRID_STEP', GRID_STEP)))
+    build.add_argument('--provider', default=os.environ.get('AGRIWISE_WEATHER_PROVIDER', 'local'),
+                       choices=list(PROVIDERS))
+    build.add_argument('--keep', action='store_true', help='keep tiles that have run out of days')
+
+    commands.add_parser('list', help='show the stored tiles')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        start = args.start or date.today()
+        provider = PROVIDERS[args.provider]()
+        for region in args.region:
+            began = time.perf_counter()
+            meta = build_tile(region, provider, start, args.days, args.step, args.grid_dir)
+            days, nlat, nlon = meta['shape']
+            print(f'{region}: {nlat}x{nlon} points x {days} days from {meta["start"]} '
+                  f'in {time.perf_counter() - began:.2f}s')
+        if not args.keep:
+            for path in prune_tiles(date.today(), args.grid_dir):
+                print(f'pruned {path}')
+    elif args.command == 'list':
+        for path in _tile_paths(args.grid_dir):
+            tile = Tile(path)
+            last = tile.start + timedelta(days=tile.days - 1)
+            print(f'{tile.region:<14} {tile.start} .. {last}  {tile.nlat}x{tile.nlon} @ {tile.step} deg  {path}')
+
+
+if __name__ == '__main__':
+    main()